@@ -2,102 +2,50 @@
 import os
 import sys
 import shutil
-import re
-import struct
 
-# Ensure this filepath is correct, default location is SteamLibrary/steamapps/compatdata/348550/pfx/drive_c/users/steamuser/Documents/ARC SYSTEM WORKS/GGXXAC/Replays/
-file_path = os.path.dirname(os.path.realpath(__file__))
+#when run from this repo, replay_header.py and replay_pipeline.py are one folder up.
+#copies kept next to the script (e.g. in your replays folder) are still found first.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 
-#label:[file_offset,num_type]
-metadata_dictionary = {
-"year":[0x1a,16], "month":[0x1c,8], "day":[0x1d,8], "hour":[0x1e,8], "minute":[0x1f,8], "second":[0x20,8], "p1 steam id":[0x22,64], "p2 steam id":[0x2a,64], 
-"p1 name":[0x32,'c'], "p2 name":[0x52,'c'], "p1 char":[0x72,8], "p2 char":[0x73,8], "ex chars?":[0x74,8], "single or team":[0x75,8], "+R or AC":[0x76,8],
-"recording location timezone bias against GMT":[0x77,32], "p1 rounds":[0x7B,8], "p2 rounds":[0x7C,8], "unfinished match, disconnect, desync bitmask":[0x7D,8],
-"ping":[0x7E,8], "match duration in frames":[0x7F,32], "p1 score":[0x83,8], "p2 score":[0x84,8], "p1 rank":[0x85,8], "p2 rank":[0x86,8], "winner side":[0x87,8]
-}
-
-# (1-25, SO KY MA MI AX PO CH ED BA FA TE JA AN JO VE DI SL IN ZA BR RO AB OS KL JU)
-character_array = ['Sol', 'Ky', 'May', 'Millia', 'Axl', 'Potemkin', 'Chipp', 'Eddie', 'Baiken', 'Faust', 'Testament', 'Jam', 'Anji', 'Johnny', 'Venom', 'Dizzy',
- 				   'Slayer', 'I-No', 'Zappa', 'Bridget', 'Robo-Ky', 'Aba', 'Order Sol', 'Kliff', 'Justice']
-
-# small function to create a folder if it doesn't exist.
-def CreatePath(file_path):
-	if not (os.path.exists(file_path)):
-		os.makedirs(file_path)
-
-#made this into a function to handle duplicate file cases.
-def MoveFile(temp_path,file):
-	if not (os.path.exists(temp_path+os.sep+file)):
-		shutil.move(file_path+os.sep+file,temp_path)
-	else:
-		tempIncrement = 1
-		while(True):
-			if not (os.path.exists(temp_path+os.sep+"("+str(tempIncrement)+")"+file)):
-				shutil.move(file_path+os.sep+file,temp_path+os.sep+"("+str(tempIncrement)+")"+file)
-				break;
-			tempIncrement += 1
+from ReplayConfig import LoadConfig
+from replay_header import compile_plan, metadata_dictionary
+from replay_pipeline import apply_moves, decode_headers, read_headers
 
-# parse the replay metadata into a readable format.
-def ParseMetadata(replay_file_path):
-	parsedDict = {}
-	replay = open(replay_file_path, 'rb')
-	for label, data in metadata_dictionary.items():
-		replay.seek(data[0],0)
-		if data[1] != 'c':
-			parsedDict[label] = int.from_bytes((replay.read(int(data[1]/8))),"little")
-		else:
-			try:
-				temp = replay.read(32).decode()
-			except:
-				replay.seek(-32, 1)
-				temp = replay.read(32).decode("utf-16")
-			finally:
-				temp = temp.replace("\x00", "", -1)
-				parsedDict[label] = temp
-	parsedDict['p1 char'] = character_array[(parsedDict['p1 char'] - 1)]
-	parsedDict['p2 char'] = character_array[(parsedDict['p2 char'] - 1)]
-	return parsedDict
-
-# parse only the relevant replay data for efficiency.
-def PartialParseMetadata(replay_file_path):
-	parsedDict = {}
-	replay = open(replay_file_path, 'rb')
-
-	replay.seek(metadata_dictionary['p1 name'][0],0)
-	try:
-		temp = replay.read(32).decode()
-	except:
-		replay.seek(-32, 1)
-		temp = replay.read(32).decode("utf-16")
-	finally:
-		temp = temp.replace("\x00", "", -1)
-		parsedDict['p1 name'] = temp
-
-	replay.seek(metadata_dictionary['p2 name'][0],0)
-	try:
-		temp = replay.read(32).decode()
-	except:
-		replay.seek(-32, 1)
-		temp = replay.read(32).decode("utf-16")
-	finally:
-		temp = temp.replace("\x00", "", -1)
-		parsedDict['p2 name'] = temp
+# Ensure this filepath is correct, default location is SteamLibrary/steamapps/compatdata/348550/pfx/drive_c/users/steamuser/Documents/ARC SYSTEM WORKS/GGXXAC/Replays/
+file_path = os.path.dirname(os.path.realpath(__file__))
 
-	replay.seek(metadata_dictionary['p1 char'][0],0)
-	parsedDict['p1 char'] = int.from_bytes((replay.read(int(metadata_dictionary['p1 char'][1]/8))),"little")
-	parsedDict['p1 char'] = character_array[(parsedDict['p1 char'] - 1)]
+# the fields each parser needs, see replay_header.py for every field and its file offset.
+full_plan = compile_plan(tuple(metadata_dictionary))
+partial_plan = compile_plan(('p1 name','p2 name','p1 char','p2 char','p1 steam id','p2 steam id','p1 rounds','p2 rounds'))
 
-	replay.seek(metadata_dictionary['p2 char'][0],0)
-	parsedDict['p2 char'] = int.from_bytes((replay.read(int(metadata_dictionary['p2 char'][1]/8))),"little")
-	parsedDict['p2 char'] = character_array[(parsedDict['p2 char'] - 1)]
+# every move of the last run is recorded here, so an interrupted run can be undone.
+journal_path = file_path+os.sep+'replayOrganizerJournal.txt'
 
-	replay.seek(metadata_dictionary['p1 steam id'][0],0)
-	parsedDict['p1 steam id'] = int.from_bytes((replay.read(int(metadata_dictionary['p1 steam id'][1]/8))),"little")
+# how many files are read and moved at once, more can help on network drives and OneDrive.
+move_threads = 8
 
-	replay.seek(metadata_dictionary['p2 steam id'][0],0)
-	parsedDict['p2 steam id'] = int.from_bytes((replay.read(int(metadata_dictionary['p2 steam id'][1]/8))),"little")
+#picks a free name in a destination folder, handling duplicate file cases.
+#folder_contents caches the names in each folder, so each folder is only listed once.
+def FreeName(temp_path,file,folder_contents):
+	if temp_path not in folder_contents:
+		try:
+			folder_contents[temp_path] = set(os.listdir(temp_path))
+		except FileNotFoundError:
+			folder_contents[temp_path] = set()
+	names = folder_contents[temp_path]
+	name = file
+	tempIncrement = 1
+	while name in names:
+		name = "("+str(tempIncrement)+")"+file
+		tempIncrement += 1
+	names.add(name)
+	return name
 
-	return parsedDict
+# parse the replay metadata into a readable format.
+def ParseMetadata(replay_file_path):
+	with open(replay_file_path, 'rb') as replay:
+		header = replay.read(full_plan.size)
+	return dict(zip(full_plan.fields, full_plan.decode(header)))
 
 #used for the 'reformat' optional parameter, will just remove all subfolders in the replay directory and move the files up.
 def MoveToRootFolder(root_path, cur_path):
@@ -112,56 +60,12 @@ def MoveToRootFolder(root_path, cur_path):
     if cur_path != root_path:
         os.rmdir(cur_path)
 
-#reads the config file into a list.
-def ReadConfigFile():
-	fileData = []
-	try:
-		with open('replayOrganizerConfig.ini', 'r', encoding='utf-8') as file:
-			fileData = file.read().split("\n")
-	except:
-		print("Config file not found, creating config file.")
-		f = open('replayOrganizerConfig.ini', 'w')
-		f.close()
-	return fileData
-
-#just checks if something is in something else.
-def CheckIfExists(x, ls):
-    if x in ls:
-        return True
-    else:
-        return False
-
-#this functions adds a line to the begining of a file.
-def LinePrepender(filename, line):
-    with open(filename, 'r+') as f:
-        content = f.read()
-        f.seek(0, 0)
-        f.write(line.rstrip('\r\n') + '\n' + content)
-
-#this function will find a steamID that matches a provided name.
-def FindUserSteamID(username):
-	steamID = -1
-	replay_files = os.listdir(file_path) #get a list of replay files
-	for file in replay_files:
-		if 'ggr' in file.lower(): #ensure its a replay file
-			
-			metaData = PartialParseMetadata(file_path+os.sep+file)
-			if metaData['p1 name'] == username:
-				steamID = metaData['p1 steam id']
-				break;
-			elif metaData['p2 name'] == username:
-				steamID = metaData['p2 steam id']
-				break;
-	return steamID
-
 #this function determines which side is the user.
 def DeterminePlayerSide(metaData):
-	if str(metaData['p1 steam id']) in config_dictionary:
-		if config_dictionary[str(metaData['p1 steam id'])] == 'user':
-			return ('p1','p2')
-	if str(metaData['p2 steam id']) in config_dictionary:
-		if config_dictionary[str(metaData['p2 steam id'])] == 'user':
-			return ('p2','p1')
+	if str(metaData['p1 steam id']) == config.user_steam_id:
+		return ('p1','p2')
+	if str(metaData['p2 steam id']) == config.user_steam_id:
+		return ('p2','p1')
 	return('','')
 
 #this function is used to check whether or not a steamID already has a nickname within the config file.
@@ -171,6 +75,63 @@ def CheckConfDict(config_dictionary,steamID):
 	else:
 		return False
 
+#works out where every replay goes in one pass, without moving anything yet.
+#returns a list of (source, destination) paths, and adds any new opponents to the config.
+#only the relevant replay data is read, see replay_pipeline.py for how replays are read and decoded.
+def PlanMoves(replay_files):
+	moves = []
+	folder_contents = {}
+	headers = read_headers([file_path+os.sep+file for file in replay_files], partial_plan.size, move_threads)
+	#replays without a proper +R header are left where they are.
+	for replay_file_path, metaData in decode_headers(headers, partial_plan, lambda replay_file_path: print("skipping corrupt replay: "+os.path.basename(replay_file_path))):
+		file = os.path.basename(replay_file_path)
+		#determine if the user was p1/p2, or a spectator.------------------------------------------------------------------------
+		player, opponent = DeterminePlayerSide(metaData)
+
+		if player == '': #if it was a spectated match, move it into spectated matches.-------------------------------------------
+			temp_path = file_path+os.sep+"Spectated Matches"
+		else:
+			#determine if the opponent is in the config, add them if they aren't-------------------------------------------------
+			if not CheckConfDict(config.nicknames,str(metaData[opponent+' steam id'])):
+				opName = metaData[opponent+' name']
+				invalid = '<>:"/\\|?*. '
+				for char in invalid: #need to remove illegal characters for folder names.
+					opName = opName.replace(char, '')
+				if opName == "":
+					opName = 'blank'
+				config.Add(metaData[opponent+' steam id'],opName)
+
+			#organization--------------------------------------------------------------------------------------------------------
+			temp_path = file_path+os.sep+"As "+metaData[player+' char']+os.sep+"Against "+metaData[opponent+' char']+os.sep+"Against "+config.Nickname(metaData[opponent+' steam id'])
+		moves.append((file_path+os.sep+file, temp_path+os.sep+FreeName(temp_path,file,folder_contents)))
+	return moves
+
+#creates every destination folder once, then moves the files in a batch.
+#the journal is written before anything moves, so an interrupted run can be undone.
+def ApplyMoves(moves):
+	apply_moves(moves, journal_path, move_threads)
+
+#used for the 'undo' optional parameter, will move every file from the last run back to where it was.
+def UndoMoves():
+	try:
+		with open(journal_path, 'r', encoding="utf-8") as journal:
+			moves = [line.split("\t") for line in journal.read().split("\n") if line != ""]
+	except FileNotFoundError:
+		print("no organization to undo.")
+		return
+	undone = 0
+	for source, destination in reversed(moves):
+		if os.path.exists(destination) and not os.path.exists(source):
+			shutil.move(destination, source)
+			undone += 1
+	#remove the folders that are left empty.
+	for folder in sorted({os.path.dirname(destination) for source, destination in moves}, key=len, reverse=True):
+		while folder != file_path and os.path.isdir(folder) and len(os.listdir(folder)) == 0:
+			os.rmdir(folder)
+			folder = os.path.dirname(folder)
+	os.remove(journal_path)
+	print(f"moved {undone} replays back.")
+
 
 
 #this program organizes a replay folder into the following structure.
@@ -181,72 +142,27 @@ def CheckConfDict(config_dictionary,steamID):
 #			Against (Opponents nickname)>
 #	Spectated Matches(matches you did not participate in)
 #------------------------------------------------------------------------------------------------------------------------------------
-if len(sys.argv) == 2: #this statement makes the 'reformat' parameter optional
-	reformat = sys.argv[1]
-	if reformat == 'reformat':
-		MoveToRootFolder(file_path,file_path)#this command will move all replay files to the root folder, and delete the other folders.
+for argument in sys.argv[1:]: #'threads=N' changes how many files are moved at once.
+	if argument.startswith('threads='):
+		move_threads = int(argument.split('=')[1])
+arguments = [argument for argument in sys.argv[1:] if not argument.startswith('threads=')]
+
+if len(arguments) == 1 and arguments[0] == 'reformat': #this statement makes the 'reformat' parameter optional
+	MoveToRootFolder(file_path,file_path)#this command will move all replay files to the root folder, and delete the other folders.
+elif len(arguments) == 1 and arguments[0] == 'undo':
+	UndoMoves()
 else:
-	config_dictionary = {}
-
-	#this loop exists to ensure the program knows who the user is, and creates an entry in the config file for the user if there isn't
-	while(True):
-		fileData = ReadConfigFile()
-		try:
-			tempBool = CheckIfExists('user',fileData[0])
-		except:
-			tempBool = False
-
-		if not tempBool:
-			username = input('running first time set up, enter in your steam username: ')
-			steamID = FindUserSteamID(username)
-
-			if(steamID == -1):
-				print("could not find username in replay files.")
-				steamID = input('please either enter in your steamID manually here, or ensure you entered your username properly and try again.\n')
-				print(f'steamID saved as: {steamID}, if all of your matches are being moved into \'spectated matches\', you may need to edit the config file to correct a mistake.')
+	config = LoadConfig(file_path)
 
-			LinePrepender('replayOrganizerConfig.ini', f"{steamID}=user")
-		else:
-			break;
+	replay_files = [file for file in os.listdir(file_path) if 'ggr' in file.lower()] #get a list of replay files
+	moves = PlanMoves(replay_files)
 
-	#load the config file into a dictionary------------------------------------------------------------------------------------------
-	for entry in fileData:
-		entryList = entry.split("=")
-		try:
-			config_dictionary[entryList[0]]=entryList[1]
-		except:
-			break;
-
-	replay_files = os.listdir(file_path) #get a list of replay files
-	for file in replay_files:
-		if 'ggr' in file.lower(): #ensure its a replay file
-			metaData = PartialParseMetadata(file_path+os.sep+file)
-			#determine if the user was p1/p2, or a spectator.------------------------------------------------------------------------
-			player, opponent = DeterminePlayerSide(metaData)
-
-			if player == '': #if it was a spectated match, move it into spectated matches.-------------------------------------------
-				spectate_path = file_path+os.sep+"Spectated Matches"
-				CreatePath(spectate_path)
-				MoveFile(spectate_path,file)
-			else:
-				#determine if the opponent is in the config_dictionary, add them if they aren't--------------------------------------
-				if not CheckConfDict(config_dictionary,str(metaData[opponent+' steam id'])):
-					opName = metaData[opponent+' name']
-					invalid = '<>:"/\\|?*. '
-					for char in invalid: #need to remove illegal characters for folder names.
-						opName = opName.replace(char, '')
-					if opName == "":
-						opName = 'blank'
-					config_dictionary[str(metaData[opponent+' steam id'])] = opName
-
-				#organization--------------------------------------------------------------------------------------------------------
-				temp_path = file_path+os.sep+"As "+metaData[player+' char']+os.sep+"Against "+metaData[opponent+' char']+os.sep+"Against "+config_dictionary[str(metaData[opponent+' steam id'])]
-				CreatePath(temp_path)
-				MoveFile(temp_path,file)
-
-				#write config_dictionary to the config file--------------------------------------------------------------------------
-				with open('replayOrganizerConfig.ini', 'w', encoding="utf-8") as file:
-					for steamID in config_dictionary:
-						file.write(str(steamID)+"="+config_dictionary[steamID]+"\n")
-			
-	print("Organization Complete!")
+	if len(arguments) == 1 and arguments[0] == 'plan': #'plan' only shows where every replay would go.
+		for source, destination in moves:
+			print(os.path.relpath(source, file_path)+" -> "+os.path.relpath(destination, file_path))
+		print(f"{len(moves)} replays would be moved.")
+	else:
+		ApplyMoves(moves)
+		#write the config file once, after every replay has been moved.-----------------------------------------------------------
+		config.Save()
+		print("Organization Complete!")
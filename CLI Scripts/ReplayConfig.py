@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+import os
+import fnmatch
+import struct
+from replay_header import compile_plan
+
+# this file is shared by the CLI scripts, keep it in the same folder as them.
+config_file = 'replayOrganizerConfig.ini'
+
+#the fields needed to find the user.
+user_plan = compile_plan(('p1 name','p1 steam id','p2 name','p2 steam id'))
+
+#this class keeps replayOrganizerConfig.ini in memory, with lookups both ways.
+#	nicknames: steamID -> nickname, the user's own steamID maps to 'user'.
+#	steam_ids: nickname -> list of steamIDs, since several people can share a nickname.
+class ConfigStore:
+    def __init__(self, config_path=config_file):
+        self.config_path = config_path
+        self.nicknames = {}
+        self.steam_ids = {}
+        self.user_steam_id = None
+        self.changed = False
+        self.Load()
+
+    #reads the config file, creating it if it doesn't exist yet.
+    def Load(self):
+        try:
+            with open(self.config_path, 'r', encoding='utf-8') as file:
+                lines = file.read().split("\n")
+        except FileNotFoundError:
+            print("Config file not found, creating config file.")
+            open(self.config_path, 'w').close()
+            lines = []
+        for line in lines:
+            entry = line.split("=", 1)
+            if len(entry) != 2:
+                continue
+            if entry[1] == 'user':
+                self.user_steam_id = entry[0]
+            self.nicknames[entry[0]] = entry[1]
+            self.steam_ids.setdefault(entry[1], []).append(entry[0])
+
+    #returns the nickname of a steamID, or None if they aren't in the config file.
+    def Nickname(self, steamID):
+        return self.nicknames.get(str(steamID))
+
+    #returns every steamID with a given nickname.
+    def SteamIDs(self, nickname):
+        return self.steam_ids.get(nickname, [])
+
+    #adds or renames someone.
+    def Add(self, steamID, nickname):
+        steamID = str(steamID)
+        old_nickname = self.nicknames.get(steamID)
+        if old_nickname == nickname:
+            return
+        if old_nickname is not None:
+            self.steam_ids[old_nickname].remove(steamID)
+        self.nicknames[steamID] = nickname
+        self.steam_ids.setdefault(nickname, []).append(steamID)
+        self.changed = True
+
+    #sets the user's own steamID, which is always kept at the top of the config file.
+    def SetUser(self, steamID):
+        self.Add(steamID, 'user')
+        self.user_steam_id = str(steamID)
+        self.nicknames = {self.user_steam_id: 'user', **self.nicknames}
+
+    #writes the config file in one go if anything changed, so it can't be left half written.
+    def Save(self):
+        if not self.changed:
+            return
+        with open(self.config_path+'.tmp', 'w', encoding="utf-8") as file:
+            for steamID in self.nicknames:
+                file.write(steamID+"="+self.nicknames[steamID]+"\n")
+        os.replace(self.config_path+'.tmp', self.config_path)
+        self.changed = False
+
+#this function will find a steamID that matches a provided name.
+#only the start of each replay is read, and it stops at the first match, organized or not.
+def FindUserSteamID(folder_path, username):
+    for path,_,files in os.walk(folder_path):
+        for f in fnmatch.filter(files,'*.ggr'):
+            with open(os.path.join(path,f), 'rb') as replay:
+                header = replay.read(user_plan.size)
+            try:
+                p1_name, p1_steam_id, p2_name, p2_steam_id = user_plan.decode(header)
+            except struct.error:
+                continue #skip corrupt replays
+            if p1_name == username:
+                return p1_steam_id
+            if p2_name == username:
+                return p2_steam_id
+    return -1
+
+#loads the config file, running first time set up if it doesn't know who the user is yet.
+def LoadConfig(folder_path):
+    config = ConfigStore()
+    if config.user_steam_id is None:
+        username = input('running first time set up, enter in your steam username: ')
+        steamID = FindUserSteamID(folder_path, username)
+
+        if(steamID == -1):
+            print("could not find username in replay files.")
+            steamID = input('please either enter in your steamID manually here, or ensure you entered your username properly and try again.\n')
+            print(f'steamID saved as: {steamID}, if all of your matches are being moved into \'spectated matches\', you may need to edit the config file to correct a mistake.')
+
+        config.SetUser(steamID)
+        config.Save()
+    return config
@@ -3,26 +3,237 @@ import os
 import sys
 import shutil
 import re
+import json
+import heapq
+import struct
+
+#when run from this repo, replay_header.py and replay_pipeline.py are one folder up.
+#copies kept next to the script (e.g. in your replays folder) are still found first.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from replay_header import compile_plan
+from replay_pipeline import read_headers, valid_headers
 
 #Ensure this filepath is correct.
 file_path = os.path.dirname(os.path.realpath(__file__))
 
+# every replay's header is remembered here, so the folder doesn't have to be read again on every run.
+index_path = file_path+os.sep+'replayIndex.json'
+
+star_folder = "Starred Matches"
+
+#the fields the index needs, see replay_header.py for every field and its file offset.
+index_plan = compile_plan(('year','month','day','hour','minute','second','p1 steam id','p2 steam id','p1 name','p2 name','p1 char','p2 char','p1 rounds','p2 rounds'))
+
+#the index stores each replay as a list in this order.
+TIMESTAMP, P1_ID, P2_ID, P1_NAME, P2_NAME, P1_CHAR, P2_CHAR, P1_ROUNDS, P2_ROUNDS = range(9)
+
+# how many replays are read at once, more can help on network drives and OneDrive.
+read_threads = 8
+
+#reads replay headers into index entries, by path. corrupt replays (not +R replays, or cut short) get None,
+#so they are never picked as the latest replay.
+#the timestamp is kept as a single number (YYYYMMDDhhmmss) so replays can be compared by it.
+def ParseHeaders(replay_file_paths):
+	entries = dict.fromkeys(replay_file_paths)
+	for replay_file_path, header in valid_headers(read_headers(replay_file_paths, index_plan.size, read_threads), size=index_plan.size):
+		try:
+			year, month, day, hour, minute, second, p1_steam_id, p2_steam_id, p1_name, p2_name, p1_char, p2_char, p1_rounds, p2_rounds = index_plan.decode(header)
+		except (struct.error, IndexError):
+			continue
+		timestamp = ((((year*100+month)*100+day)*100+hour)*100+minute)*100+second
+		entries[replay_file_path] = [timestamp, str(p1_steam_id), str(p2_steam_id), p1_name, p2_name, p1_char, p2_char, p1_rounds, p2_rounds]
+	return entries
+
+#reads the index, or starts an empty one.
+#	folders: folder (relative to file_path) -> {"mtime": ..., "dirs": [subfolders], "replays": {file name: entry}, "stats": {file name: [size, mtime]}}
+#	latest: [folder, file name] of the newest replay.
+def ReadIndex():
+	try:
+		with open(index_path, 'r', encoding='utf-8') as file:
+			return json.load(file)
+	except (FileNotFoundError, ValueError):
+		return {"folders":{}, "latest":None}
+
+#writes the index in one go, so it can't be left half written.
+def WriteIndex(index):
+	with open(index_path+'.tmp', 'w', encoding="utf-8") as file:
+		json.dump(index, file)
+	os.replace(index_path+'.tmp', index_path)
 
-#this program organizes places your most recent replay into a seperate folder (Starred Matches)for ease of access later.
+#brings the index up to date, only reading folders that changed since the last run.
+#a folder's modification time changes whenever a file is added, removed or renamed in it.
+#in those, a replay is read again if its size or modification time changed (e.g. it was replaced).
+#replays that were cut short are checked on every run, since the game finishing one doesn't change its folder.
+#returns whether anything changed.
+def UpdateIndex(index):
+	changed = False
+	folders = index["folders"]
+	new_replays = {} #path: (folder, file name) of replays to read
+	seen = set()
+	stack = ['']
+	while stack:
+		folder = stack.pop()
+		try:
+			mtime = os.stat(os.path.join(file_path,folder)).st_mtime_ns
+		except FileNotFoundError:
+			continue
+		seen.add(folder)
+		if folder not in folders or folders[folder]["mtime"] != mtime:
+			old_replays = folders[folder]["replays"] if folder in folders else {}
+			old_stats = folders[folder].get("stats", {}) if folder in folders else {}
+			dirs = []
+			replays = {}
+			stats = {}
+			for entry in os.scandir(os.path.join(file_path,folder)):
+				if entry.is_dir():
+					if not (folder == '' and entry.name == star_folder):
+						dirs.append(entry.name)
+				elif entry.name.lower().endswith('.ggr'):
+					file_stats = FileStats(entry.path)
+					if file_stats is None: #removed while the folder was being read
+						continue
+					stats[entry.name] = file_stats
+					if entry.name in old_replays and old_stats.get(entry.name) == file_stats:
+						replays[entry.name] = old_replays[entry.name]
+					else:
+						replays[entry.name] = None
+						new_replays[entry.path] = (folder, entry.name)
+			folders[folder] = {"mtime":mtime, "dirs":dirs, "replays":replays, "stats":stats}
+			changed = True
+		else:
+			stats = folders[folder].setdefault("stats", {})
+			for name, entry in folders[folder]["replays"].items():
+				if entry is not None:
+					continue
+				replay_file_path = os.path.join(file_path,folder,name)
+				file_stats = FileStats(replay_file_path)
+				if file_stats is not None and stats.get(name) != file_stats:
+					stats[name] = file_stats
+					new_replays[replay_file_path] = (folder, name)
+					changed = True
+		stack.extend(os.path.join(folder,name) for name in folders[folder]["dirs"])
+	find_latest = False
+	for replay_file_path, entry in ParseHeaders(list(new_replays)).items():
+		folder, name = new_replays[replay_file_path]
+		folders[folder]["replays"][name] = entry
+		if index["latest"] == [folder, name]: #the newest replay was replaced, so it may not be the newest anymore.
+			find_latest = True
+		elif entry is not None and (index["latest"] is None or IsNewer(entry, index, index["latest"])):
+			index["latest"] = [folder, name]
+	for folder in [folder for folder in folders if folder not in seen]:
+		del folders[folder]
+		changed = True
+	if find_latest or (changed and not LatestIsValid(index)):
+		FindLatest(index)
+	return changed
 
-replay_list = [] #need to create a storage list to sift through the folders in the file path.
-replay_files = os.listdir(file_path) #get a list of replay files
+#the size and modification time of a file, to tell when it changed. None if it's gone.
+def FileStats(replay_file_path):
+	try:
+		stat = os.stat(replay_file_path)
+	except OSError:
+		return None
+	return [stat.st_size, stat.st_mtime_ns]
 
-for file in replay_files: #do the following to each file
-	if 'ggr' in file.lower(): #ensure its a replay file
-		replay_list.append(file)
+#looks up the entry of a [folder, file name] pair.
+def GetEntry(index, key):
+	folder = index["folders"].get(key[0])
+	if folder is None:
+		return None
+	return folder["replays"].get(key[1])
 
-if (len(replay_list) > 0): #make sure theres a replay to star.
-	star_file_path = file_path+os.sep+"Starred Matches" #ensure the Starred Matches folder exists.
-	if not(os.path.exists(star_file_path)):
-		os.mkdir(star_file_path)
-	shutil.move(file_path+os.sep+replay_list.pop(),star_file_path) #move the most recent replay there. 
+#compares a replay against the one at [folder, file name] by their header timestamps.
+def IsNewer(entry, index, key):
+	latest = GetEntry(index, key)
+	return latest is None or entry[TIMESTAMP] > latest[TIMESTAMP]
 
-	print("Replay Starred!")
+#checks that the latest pointer still points at a replay.
+def LatestIsValid(index):
+	return index["latest"] is not None and GetEntry(index, index["latest"]) is not None
+
+#only needed when the newest replay was moved or deleted.
+def FindLatest(index):
+	index["latest"] = None
+	newest = None
+	for folder, data in index["folders"].items():
+		for name, entry in data["replays"].items():
+			if entry is not None and (newest is None or entry[TIMESTAMP] > newest):
+				newest = entry[TIMESTAMP]
+				index["latest"] = [folder, name]
+
+#parses a query such as "last 5 losses as Sol vs Zappa" into its parts.
+#'vs' can be either a character or an opponent's nickname from the config file.
+def ParseQuery(arguments):
+	match = re.fullmatch(r"last (\d+)(?: (wins|losses))?(?: as (.+?))?(?: vs (.+))?", " ".join(arguments), re.IGNORECASE)
+	if match is None:
+		sys.exit('usage: StarLastReplay.py [last N [wins|losses] [as (character)] [vs (character or nickname)]]')
+	count, result, character, versus = match.groups()
+	return int(count), (result or '').lower(), character, versus
+
+#returns whether a replay matches a query, from the user's side.
+def MatchesQuery(entry, config, result, character, versus):
+	if result == '' and character is None and versus is None:
+		return True
+	if entry[P1_ID] == config.user_steam_id:
+		player, opponent = (P1_ID, P1_NAME, P1_CHAR, P1_ROUNDS), (P2_ID, P2_NAME, P2_CHAR, P2_ROUNDS)
+	elif entry[P2_ID] == config.user_steam_id:
+		player, opponent = (P2_ID, P2_NAME, P2_CHAR, P2_ROUNDS), (P1_ID, P1_NAME, P1_CHAR, P1_ROUNDS)
+	else:
+		return False #skip spectated matches
+	if result == 'wins' and not entry[player[3]] > entry[opponent[3]]:
+		return False
+	if result == 'losses' and not entry[player[3]] < entry[opponent[3]]:
+		return False
+	if character is not None and entry[player[2]].lower() != character.lower():
+		return False
+	if versus is not None:
+		if not (entry[opponent[2]].lower() == versus.lower() or entry[opponent[0]] in config.SteamIDs(versus) or entry[opponent[1]] == versus):
+			return False
+	return True
+
+#moves replays into the Starred Matches folder, without overwriting anything already there.
+def StarReplays(index, keys):
+	star_file_path = file_path+os.sep+star_folder #ensure the Starred Matches folder exists.
+	os.makedirs(star_file_path, exist_ok=True)
+	for folder, name in keys:
+		destination = name
+		tempIncrement = 1
+		while os.path.exists(star_file_path+os.sep+destination):
+			destination = "("+str(tempIncrement)+")"+name
+			tempIncrement += 1
+		shutil.move(os.path.join(file_path,folder,name), star_file_path+os.sep+destination)
+		print("Starred "+os.path.join(folder,name))
+	#the folders' modification times changed, so they are read again on the next run.
+	UpdateIndex(index)
+
+
+
+#this program places your most recent replay into a seperate folder (Starred Matches) for ease of access later.
+#with a query, e.g. 'StarLastReplay.py last 5 losses vs Zappa', it stars every replay that matches instead.
+#------------------------------------------------------------------------------------------------------------------------------------
+index = ReadIndex()
+UpdateIndex(index)
+
+if len(sys.argv) == 1:
+	if LatestIsValid(index): #make sure theres a replay to star.
+		StarReplays(index, [index["latest"]]) #move the most recent replay there.
+		print("Replay Starred!")
+	else:
+		print("you have no replays")
 else:
-	print("you have no replays")
+	count, result, character, versus = ParseQuery(sys.argv[1:])
+	config = None
+	if result != '' or character is not None or versus is not None: #only queries about the user need the config file.
+		from ReplayConfig import LoadConfig
+		config = LoadConfig(file_path)
+	matches = [(entry[TIMESTAMP], folder, name) for folder, data in index["folders"].items() for name, entry in data["replays"].items()
+			   if entry is not None and MatchesQuery(entry, config, result, character, versus)]
+	keys = [(folder, name) for timestamp, folder, name in heapq.nlargest(count, matches)]
+	if len(keys) > 0:
+		StarReplays(index, keys)
+		print(f"{len(keys)} Replays Starred!")
+	else:
+		print("no replays match that query.")
+
+WriteIndex(index)
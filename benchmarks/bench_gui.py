@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+
+"""
+Benchmarks how long the analysis window takes to react to user input.
+
+The analysis figure is built by the same code as in the app, but on the Agg
+backend, so no display is needed. A scripted sequence of slider drags, radio
+button clicks, character changes and view/sort switches is played back, and
+the time from each callback to the end of the canvas redraw is reported as
+p50/p95/p99 per interaction type.
+"""
+
+from argparse import ArgumentParser
+from collections.abc import Callable
+from os import path
+from random import Random
+from statistics import median, quantiles
+from sys import path as sys_path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Any
+
+import matplotlib
+
+_ = matplotlib.use("Agg")
+
+sys_path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+from generate_replays import USER_NAME, generate_replays  # noqa: E402
+from matplotlib.backends.backend_agg import FigureCanvasAgg  # noqa: E402
+
+import replay_analyzer  # noqa: E402
+
+
+class Variable:
+    """
+    Stands in for the Tk variables and widgets the graphs read from.
+    """
+
+    def __init__(self, value: Any) -> None:
+        self.value: Any = value
+        self.options: dict[str, Any] = {}
+
+    def get(self) -> Any:
+        return self.value
+
+    def set(self, value: Any) -> None:
+        self.value = value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self.options[key] = value
+
+
+class TimedCanvas(FigureCanvasAgg):
+    """
+    Agg canvas that records how long every draw takes.
+    """
+
+    draw_times: list[float] = []
+
+    def draw(self) -> None:
+        start: float = perf_counter()
+        super().draw()
+        self.draw_times.append(perf_counter() - start)
+
+
+def load_replays(count: int, seed: int) -> list[dict[str, Any]]:
+    """
+    Generates and parses a synthetic dataset.
+    """
+    replays: list[dict[str, Any]] = []
+    with TemporaryDirectory() as corpus:
+        for file in generate_replays(corpus, count, seed, corrupt_rate=0):
+            replays.append(replay_analyzer.partial_parse_metadata(file, USER_NAME))
+    return replays
+
+
+def make_script(
+    rng: Random,
+    rounds: int,
+    commands: dict[str, Callable[..., None]],
+    character: Variable,
+) -> list[tuple[str, Callable[[], None]]]:
+    """
+    Makes the sequence of interactions to play back.
+    """
+    user_rank, opponent_rank = replay_analyzer.sliders[-2:]
+    radio = replay_analyzer.replay_type_selection
+
+    def drag(slider: Any) -> Callable[[], None]:
+        low: int = rng.randint(0, 19)
+        high: int = rng.randint(low + 1, 20)
+        return lambda: slider.set_val((low, high))
+
+    def pick(name: str) -> Callable[[], None]:
+        def select() -> None:
+            character.set(name)
+            commands["dropdown"](name)
+
+        return select
+
+    script: list[tuple[str, Callable[[], None]]] = []
+    for _ in range(rounds):
+        script.append(("user rank slider", drag(user_rank)))
+        script.append(("opponent rank slider", drag(opponent_rank)))
+        script.append(("radio button", lambda i=rng.randint(0, 2): radio.set_active(i)))
+        script.append(("dropdown", pick(rng.choice(replay_analyzer.character_array))))
+        script.append(("switch view", commands["switch"]))
+        script.append(("toggle sorting", commands["sort"]))
+    return script
+
+
+def percentiles(samples: list[float]) -> tuple[float, float, float]:
+    """
+    Returns p50, p95 and p99 in milliseconds.
+    """
+    if len(samples) == 1:
+        return (samples[0] * 1e3,) * 3
+    cuts: list[float] = quantiles(samples, n=100, method="inclusive")
+    return (median(samples) * 1e3, cuts[94] * 1e3, cuts[98] * 1e3)
+
+
+def main() -> None:
+    """
+    Main functionality.
+    """
+    parser: ArgumentParser = ArgumentParser(description=__doc__)
+    _ = parser.add_argument("--replays", type=int, default=10_000)
+    _ = parser.add_argument("--rounds", type=int, default=50)
+    _ = parser.add_argument("--seed", type=int, default=0)
+    _ = parser.add_argument(
+        "--prefetch",
+        action="store_true",
+        help="prefetch likely next graphs between interactions, as if the user paused",
+    )
+    args = parser.parse_args()
+    rng: Random = Random(args.seed)
+    print(f"Parsing {args.replays} synthetic replays...")
+    replays: list[dict[str, Any]] = load_replays(args.replays, args.seed)
+    replay_analyzer.opponent = Variable("")
+    character: Variable = Variable(replay_analyzer.character_array[0])
+    _, commands = replay_analyzer.build_analysis_figure(
+        replays, USER_NAME, "", character, TimedCanvas, None, Variable(None)
+    )
+
+    filter_times: list[float] = []
+    filter_replays = replay_analyzer.filter_replays
+
+    def timed_filter(*filter_args: Any) -> Any:
+        start: float = perf_counter()
+        data: Any = filter_replays(*filter_args)
+        filter_times.append(perf_counter() - start)
+        return data
+
+    replay_analyzer.filter_replays = timed_filter
+    if args.prefetch:
+        replay_analyzer.prefetch_delay = 0
+    latencies: dict[str, list[float]] = {}
+    filter_latencies: dict[str, list[float]] = {}
+    draw_latencies: dict[str, list[float]] = {}
+    for interaction, event in make_script(rng, args.rounds, commands, character):
+        filter_times.clear()
+        TimedCanvas.draw_times.clear()
+        start: float = perf_counter()
+        event()
+        latencies.setdefault(interaction, []).append(perf_counter() - start)
+        filter_latencies.setdefault(interaction, []).append(sum(filter_times))
+        draw_latencies.setdefault(interaction, []).append(sum(TimedCanvas.draw_times))
+        if args.prefetch:
+            for _ in range(3):  # the next view and both neighbouring characters
+                commands["prefetch"](replay_analyzer.character_array)
+    replay_analyzer.filter_replays = filter_replays
+
+    print(
+        f"{'interaction':<22}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        + f"{'filter p50':>12}{'draw p50':>10}"
+    )
+    for interaction, samples in latencies.items():
+        p50, p95, p99 = percentiles(samples)
+        print(
+            f"{interaction:<22}{p50:>9.1f}{p95:>9.1f}{p99:>9.1f}"
+            + f"{median(filter_latencies[interaction]) * 1e3:>12.1f}"
+            + f"{median(draw_latencies[interaction]) * 1e3:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
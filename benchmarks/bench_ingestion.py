@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+
+"""
+Benchmarks replay ingestion and aggregation on synthetic replay folders.
+
+For every size, a corpus is generated (or reused from --corpus) and each stage
+is timed in a fresh process, so peak RSS numbers are not polluted by earlier
+sizes. Results are printed as a table and can be saved as JSON to compare
+performance changes against each other.
+"""
+
+from argparse import SUPPRESS, ArgumentParser
+from contextlib import nullcontext
+from glob import glob
+from json import dump, dumps, load, loads
+from os import chdir, path
+from subprocess import run
+from sys import executable
+from sys import path as sys_path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Any, Callable
+
+try:
+    from resource import RUSAGE_SELF, getrusage
+except ImportError:  # Windows
+    getrusage = None
+
+sys_path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+from generate_replays import USER_NAME, generate_replays  # noqa: E402
+
+import replay_analyzer  # noqa: E402
+
+default_sizes: list[int] = [1_000, 10_000, 100_000, 1_000_000]
+
+
+def peak_rss_mb() -> float | None:
+    """
+    Returns the peak resident set size of this process in MiB.
+    """
+    if getrusage is None:
+        return None
+    peak: int = getrusage(RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak / (1024 * 1024) if peak > 1 << 32 else peak / 1024
+
+
+def time_stage(
+    results: list[dict[str, Any]],
+    stage: str,
+    files: int | None,
+    function: Callable[[], Any],
+) -> Any:
+    """
+    Runs one stage, recording its latency, throughput and peak RSS.
+    If files is None, the stage counts the files it returns.
+    """
+    start: float = perf_counter()
+    value: Any = function()
+    seconds: float = perf_counter() - start
+    if files is None:
+        files = len(value)
+    results.append(
+        {
+            "stage": stage,
+            "files": files,
+            "seconds": seconds,
+            "filesPerSecond": files / seconds if seconds > 0 else None,
+            "microsecondsPerFile": seconds * 1e6 / files if files > 0 else None,
+            "peakRssMB": peak_rss_mb(),
+        }
+    )
+    return value
+
+
+def parse_all(files: list[str], parse: Callable[[str], dict[str, Any]]) -> list[Any]:
+    """
+    Parses every file, skipping corrupt replays like the GUI does.
+    """
+    parsed: list[dict[str, Any]] = []
+    for file in files:
+        try:
+            parsed.append(parse(file))
+        except ValueError:
+            continue
+    return parsed
+
+
+def run_one(corpus: str) -> list[dict[str, Any]]:
+    """
+    Times every stage on one corpus.
+    """
+    results: list[dict[str, Any]] = []
+    files: list[str] = time_stage(
+        results,
+        "scan",
+        None,
+        lambda: replay_analyzer.scan_folder(corpus)[0],
+    )
+    replays: list[dict[str, Any]] = time_stage(
+        results,
+        "partial_parse_metadata",
+        len(files),
+        lambda: parse_all(
+            files, lambda f: replay_analyzer.partial_parse_metadata(f, USER_NAME)
+        ),
+    )
+    _ = time_stage(
+        results,
+        "parse_metadata",
+        len(files),
+        lambda: parse_all(files, replay_analyzer.parse_metadata),
+    )
+    for replay_type in ("Both Online and Offline", "Offline Only", "Online Only"):
+        _ = time_stage(
+            results,
+            f"filter_replays ({replay_type})",
+            len(replays),
+            lambda replay_type=replay_type: replay_analyzer.filter_replays(
+                replays, replay_analyzer.character_array, USER_NAME, "", replay_type
+            ),
+        )
+    with TemporaryDirectory() as output:
+        chdir(output)
+        _ = time_stage(
+            results,
+            "jsonify_replays",
+            len(files),
+            lambda: replay_analyzer.write_jsons(corpus, USER_NAME, False),
+        )
+        jsons: list[str] = glob(f"{output}/JSONs/**/*.json", recursive=True)
+        _ = time_stage(
+            results,
+            "parse_jsons",
+            len(jsons),
+            lambda: [replay_analyzer.parse_jsons(f, USER_NAME) for f in jsons],
+        )
+        _ = time_stage(
+            results,
+            "load_jsons",
+            len(jsons),
+            lambda: list(replay_analyzer.load_jsons(jsons, USER_NAME, output)),
+        )
+        chdir(path.dirname(output))
+    return results
+
+
+def ensure_corpus(corpus_root: str, size: int, seed: int) -> str:
+    """
+    Generates a corpus of the given size, unless one already exists.
+    """
+    corpus: str = path.join(corpus_root, f"{size}")
+    marker: str = path.join(corpus, "corpus.json")
+    if path.exists(marker):
+        with open(marker) as f:
+            if load(f) == {"count": size, "seed": seed}:
+                return corpus
+    print(f"Generating {size} replays in {corpus}...")
+    _ = generate_replays(corpus, size, seed, subfolders=size // 10_000)
+    with open(marker, "w") as f:
+        dump({"count": size, "seed": seed}, f)
+    return corpus
+
+
+def print_table(size: int, results: list[dict[str, Any]]) -> None:
+    """
+    Prints the results of one corpus size.
+    """
+    print(f"\n{size} replays")
+    print(f"{'stage':<42}{'seconds':>10}{'files/s':>12}{'us/file':>10}{'RSS MB':>9}")
+    for result in results:
+        print(
+            "{:<42}{:>10.3f}{:>12}{:>10}{:>9}".format(
+                result["stage"],
+                result["seconds"],
+                "-"
+                if result["filesPerSecond"] is None
+                else f"{result['filesPerSecond']:.0f}",
+                "-"
+                if result["microsecondsPerFile"] is None
+                else f"{result['microsecondsPerFile']:.1f}",
+                "-" if result["peakRssMB"] is None else f"{result['peakRssMB']:.0f}",
+            )
+        )
+
+
+def main() -> None:
+    """
+    Main functionality.
+    """
+    parser: ArgumentParser = ArgumentParser(description=__doc__)
+    _ = parser.add_argument(
+        "--sizes",
+        default=",".join(str(size) for size in default_sizes),
+        help="comma-separated replay counts",
+    )
+    _ = parser.add_argument(
+        "--corpus", help="folder to generate corpora in and reuse them from"
+    )
+    _ = parser.add_argument("--seed", type=int, default=0)
+    _ = parser.add_argument("--json", help="file to save the results to")
+    _ = parser.add_argument("--run-one", help=SUPPRESS)
+    args = parser.parse_args()
+    if args.run_one is not None:
+        print(dumps(run_one(args.run_one)))
+        return
+    all_results: dict[str, list[dict[str, Any]]] = {}
+    # without --corpus, the generated corpora are removed afterwards
+    with (
+        TemporaryDirectory() if args.corpus is None else nullcontext(args.corpus)
+    ) as corpus_root:
+        for size in (int(size) for size in args.sizes.split(",")):
+            corpus: str = ensure_corpus(corpus_root, size, args.seed)
+            child = run(
+                [executable, path.abspath(__file__), "--run-one", corpus],
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            all_results[str(size)] = loads(child.stdout.splitlines()[-1])
+            print_table(size, all_results[str(size)])
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            dump(all_results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
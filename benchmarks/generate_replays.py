@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+
+"""
+Writes a folder of synthetic +R replays for benchmarking.
+
+Every replay gets the real 12-byte magic and a header laid out following the
+metadata_dictionary in replay_header.py, so the files go through exactly the
+same code paths as replays written by the game.
+"""
+
+from argparse import ArgumentParser
+from os import makedirs, path
+from random import Random
+from sys import path as sys_path
+
+sys_path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+from replay_header import (  # noqa: E402
+    character_array,
+    header_size,
+    magic,
+    metadata_dictionary,
+)
+
+USER_NAME: str = "BenchUser"
+USER_STEAM_ID: int = 76561198000000000
+
+utf8_names: list[str] = [
+    "Zappa Main",
+    "Sol Badguy",
+    "faust_enjoyer",
+    "José",
+    "Ky Kiske",
+    "Order-Sol",
+    "Ñandú",
+    "ACPR",
+    "Beyoncé",
+    "Mr. Potemkin",
+]
+
+utf16_names: list[str] = [
+    "ソル",
+    "カイ",
+    "ファウスト",
+    "ミリア",
+    "ザトー",
+    "鰤",
+    "蛇",
+    "闇慈",
+]
+
+
+def encode_name(name: str, utf16: bool) -> bytes:
+    """
+    Encodes a player name into the 32-byte name field.
+    """
+    raw: bytes = name.encode("utf-16-le" if utf16 else "utf-8")[:32]
+    return raw + b"\x00" * (32 - len(raw))
+
+
+def make_opponents(rng: Random, count: int) -> list[tuple[int, bytes]]:
+    """
+    Makes a pool of opponents, so names repeat like in a real replay folder.
+    """
+    opponents: list[tuple[int, bytes]] = []
+    for i in range(count):
+        utf16: bool = rng.random() < 0.2
+        base: str = rng.choice(utf16_names if utf16 else utf8_names)
+        opponents.append((USER_STEAM_ID + 1 + i, encode_name(f"{base}{i}", utf16)))
+    return opponents
+
+
+def make_header(rng: Random, opponents: list[tuple[int, bytes]]) -> bytes:
+    """
+    Makes a random, valid replay header.
+    """
+    offline: bool = rng.random() < 0.15
+    user_side: int = rng.choice((1, 2))
+    user: tuple[int, bytes] = (USER_STEAM_ID, encode_name(USER_NAME, False))
+    if offline:
+        other: tuple[int, bytes] = (0, encode_name("", False))
+        user_side = 1
+    else:
+        other = rng.choice(opponents)
+    p1, p2 = (user, other) if user_side == 1 else (other, user)
+    p1_rounds: int = rng.randint(0, 2)
+    p2_rounds: int = 2 if p1_rounds < 2 else rng.randint(0, 1)
+    values: dict[str, int | bytes] = {
+        "year": rng.randint(2020, 2025),
+        "month": rng.randint(1, 12),
+        "day": rng.randint(1, 28),
+        "hour": rng.randint(0, 23),
+        "minute": rng.randint(0, 59),
+        "second": rng.randint(0, 59),
+        "p1 steam id": p1[0],
+        "p2 steam id": p2[0],
+        "p1 name": p1[1],
+        "p2 name": p2[1],
+        "p1 char": rng.randint(1, len(character_array)),
+        "p2 char": rng.randint(1, len(character_array)),
+        "ex chars?": int(rng.random() < 0.05),
+        "single or team": 2 if rng.random() < 0.02 else 1,
+        "+R or AC": int(rng.random() < 0.05),
+        "recording location timezone bias against GMT": rng.choice(
+            (-540, -60, 0, 300, 360, 420, 480)
+        ),
+        "p1 rounds": p1_rounds,
+        "p2 rounds": p2_rounds,
+        "unfinished match, disconnect, desync bitmask": rng.choices(
+            range(8), weights=(90, 3, 2, 1, 2, 1, 0.5, 0.5)
+        )[0],
+        "ping": 0 if offline else rng.randint(5, 250),
+        "match duration in frames": rng.randint(60 * 30, 60 * 600),
+        "p1 score": rng.randint(0, 255),
+        "p2 score": rng.randint(0, 255),
+        "p1 rank": 0 if offline else rng.randint(0, 20),
+        "p2 rank": 0 if offline else rng.randint(0, 20),
+        "winner side": 1
+        if p1_rounds > p2_rounds
+        else rng.choices((2, 3), weights=(20, 1))[0],
+    }
+    header: bytearray = bytearray(header_size)
+    header[: len(magic)] = magic
+    for label, (offset, bits) in metadata_dictionary.items():
+        value: int | bytes = values[label]
+        if isinstance(value, bytes):
+            header[offset : offset + len(value)] = value
+        else:
+            header[offset : offset + bits // 8] = value.to_bytes(
+                bits // 8, "little", signed=value < 0
+            )
+    return bytes(header)
+
+
+def make_corrupt(rng: Random, header: bytes) -> bytes:
+    """
+    Damages a header in one of the ways seen in the wild.
+    """
+    match rng.randint(0, 2):
+        case 0:  # wrong magic
+            return rng.randbytes(12) + header[12:]
+        case 1:  # truncated
+            return header[: rng.randint(0, 11)]
+        case _:  # empty file
+            return b""
+
+
+def generate_replays(
+    output_folder: str,
+    count: int,
+    seed: int = 0,
+    corrupt_rate: float = 0.01,
+    opponent_count: int = 300,
+    body_size: int = 256,
+    subfolders: int = 0,
+) -> list[str]:
+    """
+    Writes count synthetic replays into output_folder and returns their paths.
+    """
+    rng: Random = Random(seed)
+    opponents: list[tuple[int, bytes]] = make_opponents(rng, opponent_count)
+    body: bytes = rng.randbytes(body_size)
+    makedirs(output_folder, exist_ok=True)
+    folders: list[str] = [output_folder]
+    for i in range(subfolders):
+        folders.append(path.join(output_folder, f"Folder {i}"))
+        makedirs(folders[-1], exist_ok=True)
+    paths: list[str] = []
+    for i in range(count):
+        header: bytes = make_header(rng, opponents)
+        if rng.random() < corrupt_rate:
+            data: bytes = make_corrupt(rng, header)
+        else:
+            data = header + body
+        replay_path: str = path.join(folders[i % len(folders)], f"{i:07}.ggr")
+        with open(replay_path, "wb") as f:
+            _ = f.write(data)
+        paths.append(replay_path)
+    return paths
+
+
+def main() -> None:
+    """
+    Main functionality.
+    """
+    parser: ArgumentParser = ArgumentParser(description=__doc__)
+    _ = parser.add_argument("output_folder")
+    _ = parser.add_argument("count", type=int)
+    _ = parser.add_argument("--seed", type=int, default=0)
+    _ = parser.add_argument("--corrupt-rate", type=float, default=0.01)
+    _ = parser.add_argument("--opponents", type=int, default=300)
+    _ = parser.add_argument("--body-size", type=int, default=256)
+    _ = parser.add_argument("--subfolders", type=int, default=0)
+    args = parser.parse_args()
+    paths: list[str] = generate_replays(
+        args.output_folder,
+        args.count,
+        args.seed,
+        args.corrupt_rate,
+        args.opponents,
+        args.body_size,
+        args.subfolders,
+    )
+    print(f"Wrote {len(paths)} replays to {args.output_folder} as {USER_NAME}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,50 @@
 #!/usr/bin/env python3
 
+from argparse import ArgumentParser, Namespace
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from cProfile import Profile
 from enum import Enum
+from functools import cache, partial, wraps
+from getpass import getuser
 from glob import glob
-from io import BufferedReader
-from json import dump, load
-from os import getlogin, mkdir, path
+from gzip import compress as compress_gzip
+from gzip import decompress as decompress_gzip
+from heapq import nlargest, nsmallest
+from itertools import compress, pairwise
+from json import dump, dumps, load, loads
+from lzma import LZMAError
+from lzma import compress as compress_lzma
+from lzma import decompress as decompress_lzma
+from math import nan, sqrt
+from operator import itemgetter
+from os import (
+    DirEntry,
+    environ,
+    getlogin,
+    link,
+    makedirs,
+    mkdir,
+    path,
+    remove,
+    replace,
+    scandir,
+    stat,
+)
 from pathlib import Path
 from platform import system
+from random import shuffle
+from re import Pattern
+from re import compile as compile_regex
+from sys import stderr
+from tarfile import TarError
+from time import perf_counter, time_ns
 from tkinter import (
     DISABLED,
+    LEFT,
     NORMAL,
     Button,
     Checkbutton,
@@ -16,24 +52,66 @@ from tkinter import (
     Frame,
     IntVar,
     Label,
+    Misc,
     OptionMenu,
+    Scrollbar,
     StringVar,
     Tk,
     Toplevel,
     filedialog,
     messagebox,
 )
-from typing import Any
+from tkinter.ttk import Treeview
+from typing import IO, Any, ParamSpec, TypeVar
+from weakref import WeakKeyDictionary
+from zipfile import BadZipFile
+
+from replay_header import (
+    character_array,
+    compile_plan,
+    header_size,
+    magic,
+    metadata_dictionary,
+)
+from replay_pipeline import (
+    archive_extensions,
+    bundle_extensions,
+    bundle_index_file,
+    bundle_records,
+    index_records,
+    is_archive,
+    is_inside,
+    is_replay_header,
+    json_extensions,
+    master_records,
+    open_json,
+    parallel_map,
+    read_headers,
+    replay_fingerprint,
+    scan_folder,
+    unique_headers,
+    valid_headers,
+    walk_folder,
+    write_csv,
+    write_json_lines,
+)
+from replay_pipeline import archive_headers as read_archive_headers
+from replay_pipeline import batches as split_batches
 
 try:
+    from matplotlib import colormaps
     from matplotlib.axes import Axes
     from matplotlib.backend_bases import MouseEvent
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
     from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
     from matplotlib.collections import PathCollection
     from matplotlib.container import BarContainer
+    from matplotlib.figure import Figure
+    from matplotlib.image import AxesImage
+    from matplotlib.patches import Rectangle
     from matplotlib.pyplot import subplots
     from matplotlib.text import Annotation
-    from matplotlib.widgets import RadioButtons, RangeSlider
+    from matplotlib.widgets import CheckButtons, RadioButtons, RangeSlider
 except ImportError:
     _ = messagebox.showerror(
         "Matplotlib Missing",
@@ -45,73 +123,20 @@ file: str = ""
 
 sliders: list[RangeSlider] = []
 
-annot: Annotation
-
 replay_type_selection: RadioButtons
 
 one_folder_dump_status: IntVar
 
-sort_button: Button
+json_format_selection: StringVar
 
-opponent: Entry
+bundle_status: IntVar
 
+streaming_status: IntVar
 
-metadata_dictionary: dict[str, tuple[int, int]] = {
-    "year": (0x1A, 16),
-    "month": (0x1C, 8),
-    "day": (0x1D, 8),
-    "hour": (0x1E, 8),
-    "minute": (0x1F, 8),
-    "second": (0x20, 8),
-    "p1 steam id": (0x22, 64),
-    "p2 steam id": (0x2A, 64),
-    "p1 name": (0x32, 256),
-    "p2 name": (0x52, 256),
-    "p1 char": (0x72, 8),
-    "p2 char": (0x73, 8),
-    "ex chars?": (0x74, 8),
-    "single or team": (0x75, 8),
-    "+R or AC": (0x76, 8),
-    "recording location timezone bias against GMT": (0x77, 32),
-    "p1 rounds": (0x7B, 8),
-    "p2 rounds": (0x7C, 8),
-    "unfinished match, disconnect, desync bitmask": (0x7D, 8),
-    "ping": (0x7E, 8),
-    "match duration in frames": (0x7F, 32),
-    "p1 score": (0x83, 8),
-    "p2 score": (0x84, 8),
-    "p1 rank": (0x85, 8),
-    "p2 rank": (0x86, 8),
-    "winner side": (0x87, 8),
-}
+progressive_status: IntVar
+
+opponent: Entry
 
-character_array: list[str] = [
-    "Sol",
-    "Ky",
-    "May",
-    "Millia",
-    "Axl",
-    "Potemkin",
-    "Chipp",
-    "Eddie",
-    "Baiken",
-    "Faust",
-    "Testament",
-    "Jam",
-    "Anji",
-    "Johnny",
-    "Venom",
-    "Dizzy",
-    "Slayer",
-    "I-No",
-    "Zappa",
-    "Bridget",
-    "Robo-Ky",
-    "A.B.A",
-    "Order Sol",
-    "Kliff",
-    "Justice",
-]
 
 colors: dict[str, str] = {
     "Sol": "#b34230",
@@ -142,51 +167,352 @@ colors: dict[str, str] = {
 }
 
 
-def update_replays(
-    _: str | None,
-    replays: list[dict[str, Any]],
-    character_array: list[str],
-    name: str,
-    opponent_name: str,
-    character: str,
-    ax: Axes,
-    canvas: FigureCanvasTkAgg,
-    replay_type: str,
-    user_lower: int,
-    user_higher: int,
-    opponent_lower: int,
-    opponent_higher: int,
-) -> None:
-    data: dict[str, list[tuple[str, float, int]]] = filter_replays(
-        replays,
-        character_array,
-        name,
-        opponent_name,
-        replay_type,
-        user_lower,
-        user_higher,
-        opponent_lower,
-        opponent_higher,
-    )
-    determine_view(character, data, ax, canvas, False, False)
+class Instrumentation:
+    """
+    Opt-in timings and counters for the stages of the analysis pipeline.
+    """
+
+    def __init__(self) -> None:
+        self.enabled: bool = False
+        self.timings: dict[str, list[float]] = {}  # name: [calls, total, max]
+        self.counters: dict[str, int] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Times the code run inside the with block.
+        """
+        if not self.enabled:
+            yield
+            return
+        start: float = perf_counter()
+        try:
+            yield
+        finally:
+            elapsed: float = perf_counter() - start
+            timing: list[float] = self.timings.setdefault(name, [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += elapsed
+            timing[2] = max(timing[2], elapsed)
+
+    def count(self, name: str, amount: int = 1) -> None:
+        """
+        Adds to a counter.
+        """
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def report(self) -> dict[str, Any]:
+        """
+        Summarizes the timings and counters.
+        """
+        return {
+            "stages": {
+                name: {
+                    "calls": int(calls),
+                    "totalSeconds": total,
+                    "meanSeconds": total / calls,
+                    "maxSeconds": longest,
+                }
+                for name, (calls, total, longest) in self.timings.items()
+            },
+            "counters": dict(self.counters),
+        }
+
+    def summary(self) -> str:
+        """
+        Formats the report for the stats panel.
+        """
+        lines: list[str] = [
+            f"{name}: {stage['calls']}× {stage['meanSeconds'] * 1000:.1f} ms avg, {stage['totalSeconds'] * 1000:.0f} ms total"
+            for name, stage in self.report()["stages"].items()
+        ]
+        lines.append(", ".join(f"{name}: {n}" for name, n in self.counters.items()))
+        return "\n".join(lines)
+
+    def dump(self, file_path: str) -> None:
+        """
+        Writes the report as JSON.
+        """
+        with open(file_path, "w") as f:
+            dump(self.report(), f, indent=4)
+
+
+stats: Instrumentation = Instrumentation()
+
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+
+def timed(function: Callable[P, R]) -> Callable[P, R]:
+    """
+    Times every call of a function as a stage named after it.
+    """
+
+    @wraps(function)
+    def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        if not stats.enabled:
+            return function(*args, **kwargs)
+        with stats.stage(function.__name__):
+            return function(*args, **kwargs)
+
+    return wrapper
+
+
+class MatchupTable:
+    """
+    Counts of games and wins for every matchup, offline and by both players'
+    online ranks, in tables of a fixed size. There is one table for every
+    combination of match flags seen, so the flags can still be filtered on.
+    Replays are counted as they are added and then dropped, so the memory used
+    does not grow with the number of replays. It can be filtered like a list of
+    replays.
+    """
+
+    def __init__(self, opponent_name: str = "") -> None:
+        self.opponent_name: str = opponent_name  # only these replays are counted
+        # flags: (games, wins, rows in use), by matchup, and for online replays by
+        # matchup, user rank and opponent rank, where a row is a matchup and user rank
+        self.counts: dict[int, tuple[array[int], array[int], set[int]]] = {}
+        # flags: cell: ping games, ping wins and match lengths, histogram_size
+        # counts, for the same cells as counts, and only for the cells in use
+        self.histogram_counts: dict[int, dict[int, array[int]]] = {}
+        self.played: set[str] = set()  # characters the user played as
+        self.count: int = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self, replay: dict[str, Any]) -> None:
+        """
+        Counts a replay.
+        """
+        if self.opponent_name != "" and replay["opponentName"] != self.opponent_name:
+            return
+        self.count += 1
+        self.played.add(replay["userCharacter"])
+        matchup: int = character_array.index(replay["userCharacter"]) * len(
+            character_array
+        ) + character_array.index(replay["opponentCharacter"])
+        row: int = matchup
+        cell: int = matchup
+        if replay["online"]:
+            if replay["userRank"] >= rank_count or replay["opponentRank"] >= rank_count:
+                return  # outside of every range the sliders can select
+            row = matchup * rank_count + replay["userRank"]
+            cell = row * rank_count + replay["opponentRank"]
+        counts: tuple[array[int], array[int], set[int]] | None = self.counts.get(
+            replay["flags"]
+        )
+        if counts is None:
+            cells: int = len(character_array) ** 2
+            if replay["online"]:
+                cells *= rank_count**2
+            counts = (array("I", [0]) * cells, array("I", [0]) * cells, set())
+            self.counts[replay["flags"]] = counts
+        counts[0][cell] += 1
+        counts[1][cell] += replay["won"] is True
+        counts[2].add(row)
+        if replay["duration"] is None:
+            return
+        histograms: dict[int, array[int]] = self.histogram_counts.setdefault(
+            replay["flags"], {}
+        )
+        histogram: array[int] | None = histograms.get(cell)
+        if histogram is None:
+            histogram = array("I", [0]) * histogram_size
+            histograms[cell] = histogram
+        histogram[
+            2 * len(ping_buckets)
+            + bisect_right(duration_buckets, replay["duration"])
+            - 1
+        ] += 1
+        if replay["online"]:
+            bucket: int = bisect_right(ping_buckets, replay["ping"]) - 1
+            histogram[bucket] += 1
+            histogram[len(ping_buckets) + bucket] += replay["won"] is True
+
+    def extend(self, replays: Iterable[dict[str, Any]]) -> None:
+        """
+        Counts replays one by one, so they can come from a generator.
+        """
+        for replay in replays:
+            self.append(replay)
+
+    def histograms(
+        self,
+        characters: list[str],
+        excluded: int,
+        lower_bound: int,
+        higher_bound: int,
+        opponent_lower_bound: int,
+        opponent_higher_bound: int,
+    ) -> dict[str, list[tuple[list[int], list[int], list[int]]]]:
+        """
+        Sums the ping and match length histograms of the cells filter sums, by
+        matchup.
+        """
+        selected: dict[int, list[array[int]]] = {}  # matchup: histograms to sum
+        user_ranks: range = range(max(lower_bound, 0), min(higher_bound, rank_count))
+        opponent_ranks: range = range(
+            max(opponent_lower_bound, 0), min(opponent_higher_bound, rank_count)
+        )
+        for flags, cells in self.histogram_counts.items():
+            if flags & excluded != 0:
+                continue
+            for cell, histogram in cells.items():
+                matchup: int = cell
+                if not flags & match_flags["offline"]:
+                    matchup, ranks = divmod(cell, rank_count**2)
+                    if (
+                        ranks // rank_count not in user_ranks
+                        or ranks % rank_count not in opponent_ranks
+                    ):
+                        continue
+                selected.setdefault(matchup, []).append(histogram)
+        empty: list[int] = [0] * histogram_size
+        pings: int = len(ping_buckets)
+        histograms: dict[str, list[tuple[list[int], list[int], list[int]]]] = {}
+        for char in characters:
+            histograms[char] = []
+            for char2 in characters:
+                summed: list[array[int]] | None = selected.get(
+                    character_array.index(char) * len(character_array)
+                    + character_array.index(char2)
+                )
+                totals: list[int] = (
+                    empty
+                    if summed is None
+                    else [sum(counts) for counts in zip(*summed)]
+                )
+                histograms[char].append(
+                    (totals[:pings], totals[pings : 2 * pings], totals[2 * pings :])
+                )
+        return histograms
+
+    def filter(
+        self,
+        characters: list[str],
+        excluded: int,
+        lower_bound: int,
+        higher_bound: int,
+        opponent_lower_bound: int,
+        opponent_higher_bound: int,
+    ) -> dict[str, list[tuple[str, float, int]]]:
+        """
+        Sums the counts the same way filter_replays counts replays, only going
+        through the rows in use.
+        """
+        games: list[int] = [0] * len(character_array) ** 2
+        wins: list[int] = [0] * len(character_array) ** 2
+        user_ranks: range = range(max(lower_bound, 0), min(higher_bound, rank_count))
+        opponent_lower_bound = max(opponent_lower_bound, 0)
+        opponent_higher_bound = min(opponent_higher_bound, rank_count)
+        for flags, (table_games, table_wins, rows) in self.counts.items():
+            if flags & excluded != 0:
+                continue
+            if flags & match_flags["offline"]:
+                for matchup in rows:
+                    games[matchup] += table_games[matchup]
+                    wins[matchup] += table_wins[matchup]
+                continue
+            for row in rows:
+                if row % rank_count not in user_ranks:
+                    continue
+                start: int = row * rank_count
+                games[row // rank_count] += sum(
+                    table_games[
+                        start + opponent_lower_bound : start + opponent_higher_bound
+                    ]
+                )
+                wins[row // rank_count] += sum(
+                    table_wins[
+                        start + opponent_lower_bound : start + opponent_higher_bound
+                    ]
+                )
+        data: dict[str, list[tuple[str, float, int]]] = {}
+        for char in characters:
+            data[char] = []
+            for char2 in characters:
+                matchup: int = character_array.index(char) * len(
+                    character_array
+                ) + character_array.index(char2)
+                data[char].append(
+                    (char2, 10 * wins[matchup] / games[matchup], games[matchup])
+                    if games[matchup] != 0
+                    else (char2, 0, 0)
+                )
+        return data
+
+
+class ReplayIndex:
+    """
+    Indexes of a list of replays that make filtering it cheap: its MatchupTable,
+    and a bitset for every match flag, a big int with bit i set if replay i has
+    that flag, so excluding any combination of flags costs a few ANDs per 64
+    replays. Lists of replays are only ever added to, so the replays added since
+    the last update are indexed on top.
+    """
+
+    def __init__(self, replays: list[dict[str, Any]]) -> None:
+        self.replays: list[dict[str, Any]] = replays
+        self.table: MatchupTable = MatchupTable()
+        self.bitsets: dict[int, int] = dict.fromkeys(match_flags.values(), 0)
+        self.indexed: int = 0  # replays indexed so far
+
+    def update(self) -> None:
+        """
+        Indexes the replays added since the last update.
+        """
+        added: list[dict[str, Any]] = self.replays[self.indexed :]
+        if len(added) == 0:
+            return
+        self.table.extend(added)
+        flags: list[int] = [replay["flags"] for replay in reversed(added)]
+        for flag in self.bitsets:  # built as a string, highest bit first, in one go
+            bits: str = "".join("1" if packed & flag else "0" for packed in flags)
+            self.bitsets[flag] |= int(bits, 2) << self.indexed
+        self.indexed += len(added)
+
+    def select(self, excluded: int) -> Iterator[dict[str, Any]]:
+        """
+        Returns an iterator over the indexed replays without any of the excluded
+        flags.
+        """
+        selected: int = (1 << self.indexed) - 1
+        for flag, bitset in self.bitsets.items():
+            if flag & excluded:
+                selected &= ~bitset
+        # a byte of 0 or 1 for every replay, lowest bit first
+        selectors: bytes = bin(selected)[:1:-1].encode().translate(selector_bytes)
+        return compress(self.replays, selectors)
+
+
+def against_opponent() -> str:
+    """
+    The end of a graph's title, naming the opponent the replays are filtered
+    for on a second line, if any.
+    """
+    return "" if opponent.get() == "" else f"\nAgainst {opponent.get()}"
 
 
 def hover(
     event: MouseEvent,
-    canvas: FigureCanvasTkAgg,
+    canvas: FigureCanvasAgg,
     ax: Axes,
     sc: PathCollection,
+    annot: Annotation,
     winrates: list[float],
     games: list[int],
     character: str,
     data: dict[str, list[tuple[str, float, int]]],
 ):
-    global annot
     vis = annot.get_visible()
     if event.inaxes == ax:
         cont, ind = sc.contains(event)
         if cont:
-            update_annot(ind, sc, winrates, games, character, data)
+            update_annot(ind, sc, annot, winrates, games, character, data)
             annot.set_visible(True)
             canvas.draw_idle()
         else:
@@ -198,12 +524,13 @@ def hover(
 def update_annot(
     ind: dict[str, list[int]],
     sc: PathCollection,
+    annot: Annotation,
     winrates: list[float],
     games: list[int],
     character: str,
     data: dict[str, list[tuple[str, float, int]]],
 ):
-    global annot, colors
+    global colors
     pos: tuple[float, float] = sc.get_offsets()[ind["ind"][0]]
     shared_points: list[str] = [
         value[0]
@@ -222,40 +549,247 @@ def update_annot(
     _ = annot.get_bbox_patch().set(alpha=0.6, color=colors[shared_points[0]])
 
 
+def win_rate_error(win_rate: float, games: int) -> float:
+    """
+    The 95% margin of error of a win rate while only a sample of the replays has
+    been read, which shrinks to nothing once every replay has been read.
+    """
+    if sampled is None or games == 0:
+        return 0.0
+    read, total = sampled
+    # adding 2 wins and 2 losses gives win rates of 0 and 10 a margin too
+    estimate: float = (win_rate / 10 * games + 2) / (games + 4)
+    unread: float = 1 - read / total
+    return 10 * 1.96 * sqrt(estimate * (1 - estimate) / (games + 4) * unread)
+
+
+def error_bars(winrates: list[float], errors: list[float]) -> list[list[float]]:
+    """
+    Turns margins of error into error bars that stay between 0 and 10.
+    """
+    return [
+        [min(error, winrate) for winrate, error in zip(winrates, errors)],
+        [min(error, 10 - winrate) for winrate, error in zip(winrates, errors)],
+    ]
+
+
+def note_progress(ax: Axes) -> None:
+    """
+    Marks a graph drawn from a sample of the replays as an estimate.
+    """
+    if sampled is not None:
+        _ = ax.text(
+            1.0,
+            -0.06,
+            f"Estimate from {sampled[0]:,} of {sampled[1]:,} files",
+            transform=ax.transAxes,
+            ha="right",
+            va="top",
+            fontsize=10,
+        )
+
+
 class View(Enum):
     SCATTER = (0,)
     MATCHUPS = (1,)
     MATCHUPS_SORTED = (2,)
     AMOUNTS = (3,)
     AMOUNTS_SORTED = (4,)
+    PING = (5,)
+    DURATIONS = (6,)
+    HEATMAP = (7,)
+
+
+class Drawing(Enum):
+    SHOW = (0,)  # draw the graph on screen
+    RENDER = (1,)  # only render it into the canvas's buffer, to be cached
+    SKIP = (2,)  # leave the buffer alone, a cached frame is shown instead
+
+
+drawing: Drawing = Drawing.SHOW
+
+
+@contextmanager
+def drawing_as(mode: Drawing) -> Iterator[None]:
+    """
+    Changes how the graphs drawn inside the with block are drawn.
+    """
+    global drawing
+    previous: Drawing = drawing
+    drawing = mode
+    try:
+        yield
+    finally:
+        drawing = previous
+
+
+@contextmanager
+def sampling(sample: tuple[int, int] | None) -> Iterator[None]:
+    """
+    Marks the graphs drawn inside the with block as estimates from a sample of
+    (files read, files), or as exact if it is None. Every analysis window keeps
+    its own sample, as they read their replays at their own pace.
+    """
+    global sampled
+    previous: tuple[int, int] | None = sampled
+    sampled = sample
+    try:
+        yield
+    finally:
+        sampled = previous
+
+
+def draw_canvas(canvas: FigureCanvasAgg) -> None:
+    """
+    Draws a finished graph the way it is currently meant to be drawn.
+    """
+    match drawing:
+        case Drawing.SHOW:
+            with stats.stage("canvas.draw"):
+                canvas.draw()
+        case Drawing.RENDER:
+            with stats.stage("prefetch draw"):
+                FigureCanvasAgg.draw(canvas)  # without showing it
+        case Drawing.SKIP:
+            pass
+
+
+class FrameCache:
+    """
+    The most recently drawn frames of an analysis figure, by everything that
+    decides what is drawn, so going back to a graph only has to copy it back
+    onto the canvas. Every frame is kept with the filtered data it was drawn
+    from, so its artists can be made again without filtering the replays.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size: int = size
+        # key: (frame, (win rates, histograms) it was drawn from)
+        self.frames: OrderedDict[tuple[Any, ...], tuple[Any, tuple[Any, Any]]] = (
+            OrderedDict()
+        )
+        self.last_shown: float = perf_counter()  # when the user last changed the graph
+        self.shown: int = 0  # graphs shown so far, to spot outdated deferred work
+
+    def __contains__(self, key: tuple[Any, ...]) -> bool:
+        return key in self.frames
+
+    def get(self, key: tuple[Any, ...]) -> tuple[Any, tuple[Any, Any]] | None:
+        """
+        Returns a cached frame and its data, or None if it is not cached.
+        """
+        cached: tuple[Any, tuple[Any, Any]] | None = self.frames.get(key)
+        if cached is not None:
+            self.frames.move_to_end(key)
+        return cached
+
+    def add(self, key: tuple[Any, ...], frame: Any, data: tuple[Any, Any]) -> None:
+        """
+        Caches a frame, dropping the least recently used one if the cache is full.
+        """
+        self.frames[key] = (frame, data)
+        self.frames.move_to_end(key)
+        if len(self.frames) > self.size:
+            _ = self.frames.popitem(last=False)
 
 
 folder: str = ""
+try:
+    login: str = getlogin()
+except OSError:  # no controlling terminal, e.g. when run from a script
+    login = getuser()
 match system():
     case "Windows":
-        folder = (
-            f"C:\\Users\\{getlogin()}\\Documents\\ARC SYSTEM WORKS\\GGXXAC\\Replays\\"
-        )
+        folder = f"C:\\Users\\{login}\\Documents\\ARC SYSTEM WORKS\\GGXXAC\\Replays\\"
     case "Darwin":  # Mac
-        folder = f"/Users/{getlogin()}/Documents/ARC SYSTEM WORKS/GGXXAC/Replays/"
+        folder = f"/Users/{login}/Documents/ARC SYSTEM WORKS/GGXXAC/Replays/"
     case _:  # Linux, FreeBSD, etc.
-        folder = f"/home/{getlogin()}/Documents/ARC SYSTEM WORKS/GGXXAC/Replays/"
-is_sorted: bool = False
-view_type: View = View.SCATTER
+        folder = f"/home/{login}/Documents/ARC SYSTEM WORKS/GGXXAC/Replays/"
 corrupt_replays: list[str] = []
+known_corrupt_replays: list[str] = []
+duplicate_replays: list[str] = []
+quarantine_file: str = "quarantine.json"
+json_formats: dict[str, str] = {  # format: file extension
+    "Indented": ".json",
+    "Compact": ".json",
+    "Compact, gzip": ".json.gz",
+    "Compact, lzma": ".json.xz",
+}
+json_threads: int = 8  # files opened and read at once when loading JSONs
+json_batch_size: int = 256  # files read by a thread in one go
+header_threads: int = 4  # replay headers read at once
+record_fields: tuple[str, ...] = (  # every field of a replay, in order
+    "userCharacter",
+    "userRank",
+    "opponentName",
+    "opponentCharacter",
+    "opponentRank",
+    "online",
+    "won",
+    "flags",
+    "ping",
+    "duration",
+    "date",
+)
+bundle_block_size: int = 256  # replays per block, the unit of random access
+bundle_shard_size: int = 64 * 1024 * 1024  # bytes per shard file
+quarantine: dict[str, list[int]] | None = None  # path: [size, mtime in ns]
+watch_interval: int = 2000  # ms between checks of a watched folder
+watch_retries: int = 30  # checks a new replay can stay cut short before it is corrupt
+timestamp_slack: int = 2_000_000_000  # ns file times can lag the clock, as on FAT
+rank_count: int = 20  # online ranks the sliders can select, 0-19
+opponent_rows: int = 25  # rows of the opponents table on screen at once
+progressive_sample: int = 500  # files read before a progressive analysis first draws
+progressive_step: int = 500  # most files read at once, between two Tk events
+progressive_batch_size: int = 10_000  # most files read between two refinements
+# (files read, files) of the estimate being drawn, set by sampling
+sampled: tuple[int, int] | None = None
+match_flags: dict[str, int] = {  # bits of a replay's "flags"
+    "offline": 1,
+    "online": 2,
+    "EXchars": 4,
+    "team": 8,
+    "accentCore": 16,
+    "unfinished": 32,
+    "disconnect": 64,
+    "desync": 128,
+}
+ping_buckets: tuple[int, ...] = (0, 50, 100, 150, 200)  # lowest ping of each, in ms
+duration_buckets: tuple[int, ...] = (0, 60, 120, 180, 240, 300)  # in seconds
+histogram_size: int = 2 * len(ping_buckets) + len(duration_buckets)
+# id of a list of replays: its index, least recently filtered first
+replay_indexes: OrderedDict[int, ReplayIndex] = OrderedDict()
+replay_index_cache_size: int = 4  # lists of replays whose indexes are kept
+selector_bytes: bytes = bytes.maketrans(b"01", b"\x00\x01")  # bits to compress bytes
+# axes: the heatmap's image, the selected character's outline, the hover annotation,
+# its connection id and the games of every matchup (by user character and opponent
+# character), only made again once the axes have been cleared
+heatmaps: WeakKeyDictionary[
+    Axes, tuple[AxesImage, Rectangle, Annotation, int, list[list[int]]]
+] = WeakKeyDictionary()
+# axes: connection id of its scatter plot's hover, so each window has its own
+scatter_hovers: WeakKeyDictionary[Axes, int] = WeakKeyDictionary()
+frame_cache_size: int = 16  # frames kept per analysis window, about 3 MB each
+prefetch_delay: int = 500  # ms without input before likely next graphs are drawn
+prefetch_interval: int = 250  # ms between checks for whether to prefetch
+match_filter_labels: tuple[dict[str, str], ...] = (  # label: flag, checked to include
+    {"EX Characters": "EXchars", "Team Battles": "team", "Accent Core": "accentCore"},
+    {"Unfinished": "unfinished", "Disconnects": "disconnect", "Desyncs": "desync"},
+)
 
 
+@timed
 def scatter_plot(
     character: str,
     data: dict[str, list[tuple[str, float, int]]],
     ax: Axes,
-    canvas: FigureCanvasTkAgg,
+    canvas: FigureCanvasAgg,
 ) -> None:
-    global colors, annot, opponent
+    global colors, opponent
     ax.clear()
     _ = ax.set_xlim(0.0, 10.0)
     _ = ax.set_title(
-        f"Matchup Spread for {character if opponent.get() == '' else character + '\nAgainst ' + opponent.get()}",
+        f"Matchup Spread for {character}{against_opponent()}",
         fontsize=26 if opponent.get() == "" else 14,
     )
     _ = ax.set_xlabel("Win Rate", fontsize=18)
@@ -278,7 +812,7 @@ def scatter_plot(
                 fontsize=13,
             )
             colors_visible.append(colors[char_tuple[0]])
-    annot = ax.annotate(
+    annot: Annotation = ax.annotate(
         text="",
         xy=(0, 0),
         xytext=(-70, 20),
@@ -289,72 +823,104 @@ def scatter_plot(
     scatter: PathCollection = ax.scatter(
         x=winrates, y=game_amounts, s=20, color=colors_visible
     )
-    _ = canvas.mpl_connect(
+    if sampled is not None:
+        _ = ax.errorbar(
+            winrates,
+            game_amounts,
+            xerr=error_bars(
+                winrates,
+                [
+                    win_rate_error(winrate, games)
+                    for winrate, games in zip(winrates, game_amounts)
+                ],
+            ),
+            fmt="none",
+            ecolor="gray",
+            capsize=3,
+        )
+        note_progress(ax)
+    if ax in scatter_hovers:
+        canvas.mpl_disconnect(scatter_hovers[ax])
+    scatter_hovers[ax] = canvas.mpl_connect(
         "motion_notify_event",
         lambda e: hover(
             e,
             canvas,
             ax,
             scatter,
+            annot,
             winrates,
             game_amounts,
             character,
             data,
         ),
     )
-    canvas.draw()
+    draw_canvas(canvas)
 
 
+@timed
 def matchups_bar_graph(
     character: str,
     data: dict[str, list[tuple[str, float, int]]],
     ax: Axes,
-    canvas: FigureCanvasTkAgg,
+    canvas: FigureCanvasAgg,
 ) -> None:
     global colors, opponent
     characters: list[str] = []
     winrates: list[float] = []
+    errors: list[float] = []
     colors_visible: list[str] = []
     for i in range(len(data[character])):
         char_tuple: tuple[str, float, int] = data[character][i]
         if char_tuple[2] != 0:
             characters.append(char_tuple[0])
             winrates.append(char_tuple[1])
+            errors.append(win_rate_error(char_tuple[1], char_tuple[2]))
             colors_visible.append(colors[char_tuple[0]])
     if len(winrates) != 0:
         characters.append("Average")
         winrates.append(sum(winrates) / len(winrates))
+        errors.append(0.0)
         colors_visible.append("#1f7bb4")
     ax.clear()
     bars: BarContainer = ax.barh(
-        range(len(characters)), winrates, tick_label=characters, color=colors_visible
+        range(len(characters)),
+        winrates,
+        xerr=error_bars(winrates, errors) if sampled is not None else None,
+        capsize=3,
+        tick_label=characters,
+        color=colors_visible,
     )
+    note_progress(ax)
     _ = ax.set_xlim(0.0, 10.0)
     _ = ax.set_title(
-        f"Matchup Win Rates as {character if opponent.get() == '' else character + '\nAgainst ' + opponent.get()}",
+        f"Matchup Win Rates as {character}{against_opponent()}",
         fontsize=26 if opponent.get() == "" else 14,
     )
     _ = ax.set_ylabel("Character", fontsize=18)
     _ = ax.set_xlabel("Win Rate", fontsize=18)
     _ = ax.bar_label(bars, fmt=lambda x: f"{x:.1f}:{(10-x):.1f}", padding=2)
     ax.invert_yaxis()
-    canvas.draw()
+    draw_canvas(canvas)
 
 
+@timed
 def matchups_bar_graph_sorted(
     character: str,
     data: dict[str, list[tuple[str, float, int]]],
     ax: Axes,
-    canvas: FigureCanvasTkAgg,
+    canvas: FigureCanvasAgg,
 ) -> None:
     global colors, opponent
     pairs: dict[str, float] = {}
     color_pairs: dict[str, str] = {}
+    error_pairs: dict[str, float] = {}
     for i in range(len(data[character])):
         char_tuple: tuple[str, float, int] = data[character][i]
         if char_tuple[2] != 0:
             pairs[char_tuple[0]] = char_tuple[1]
             color_pairs[data[character][i][0]] = colors[data[character][i][0]]
+            error_pairs[char_tuple[0]] = win_rate_error(char_tuple[1], char_tuple[2])
     color_list: list[str] = [
         color_pairs[k]
         for k, _ in sorted(pairs.items(), key=lambda item: item[1], reverse=True)
@@ -362,31 +928,38 @@ def matchups_bar_graph_sorted(
     pairs = dict(sorted(pairs.items(), key=lambda item: item[1], reverse=True))
     if len(pairs) != 0:
         pairs["Average"] = sum(pairs.values()) / len(pairs)
+        error_pairs["Average"] = 0.0
         color_list.append("#1f7bb4")
     ax.clear()
     bars: BarContainer = ax.barh(
         range(len(pairs)),
         list(pairs.values()),
+        xerr=error_bars(list(pairs.values()), [error_pairs[k] for k in pairs])
+        if sampled is not None
+        else None,
+        capsize=3,
         tick_label=list(pairs.keys()),
         color=color_list,
     )
+    note_progress(ax)
     _ = ax.set_xlim(0.0, 10.0)
     _ = ax.set_title(
-        f"Matchup Win Rates as {character if opponent.get() == '' else character + '\nAgainst ' + opponent.get()}",
+        f"Matchup Win Rates as {character}{against_opponent()}",
         fontsize=26 if opponent.get() == "" else 14,
     )
     _ = ax.set_ylabel("Character", fontsize=18)
     _ = ax.set_xlabel("Win Rate", fontsize=18)
     _ = ax.bar_label(bars, fmt=lambda x: f"{x:.1f}:{(10-x):.1f}", padding=2)
     ax.invert_yaxis()
-    canvas.draw()
+    draw_canvas(canvas)
 
 
+@timed
 def no_of_matches_bar_graph(
     character: str,
     data: dict[str, list[tuple[str, float, int]]],
     ax: Axes,
-    canvas: FigureCanvasTkAgg,
+    canvas: FigureCanvasAgg,
 ) -> None:
     global colors, opponent
     characters: list[str] = []
@@ -406,22 +979,24 @@ def no_of_matches_bar_graph(
     bars: BarContainer = ax.barh(
         range(len(characters)), gameAmounts, tick_label=characters, color=colors_visible
     )
+    note_progress(ax)
     _ = ax.set_title(
-        f"Number of Matches as {character if opponent.get() == '' else character + '\nAgainst ' + opponent.get()}",
+        f"Number of Matches as {character}{against_opponent()}",
         fontsize=26 if opponent.get() == "" else 14,
     )
     _ = ax.set_ylabel("Character", fontsize=18)
     _ = ax.set_xlabel("Win Rate", fontsize=18)
     _ = ax.bar_label(bars, padding=2)
     ax.invert_yaxis()
-    canvas.draw()
+    draw_canvas(canvas)
 
 
+@timed
 def no_of_matches_bar_graph_sorted(
     character: str,
     data: dict[str, list[tuple[str, float, int]]],
     ax: Axes,
-    canvas: FigureCanvasTkAgg,
+    canvas: FigureCanvasAgg,
 ) -> None:
     global colors, opponent
     pairs: dict[str, float] = {}
@@ -446,19 +1021,453 @@ def no_of_matches_bar_graph_sorted(
         tick_label=list(pairs.keys()),
         color=color_list,
     )
+    note_progress(ax)
     _ = ax.set_title(
-        f"Number of Matches as {character if opponent.get() == '' else character + '\nAgainst ' + opponent.get()}",
+        f"Number of Matches as {character}{against_opponent()}",
         fontsize=26 if opponent.get() == "" else 14,
     )
     _ = ax.set_ylabel("Character", fontsize=18)
     _ = ax.set_xlabel("Win Rate", fontsize=18)
     _ = ax.bar_label(bars, padding=2)
     ax.invert_yaxis()
-    canvas.draw()
+    draw_canvas(canvas)
+
+
+def bucket_labels(buckets: tuple[int, ...], unit: str, scale: int = 1) -> list[str]:
+    """
+    Labels histogram buckets by the range they cover.
+    """
+    labels: list[str] = [
+        f"{low // scale}-{high // scale} {unit}" for low, high in pairwise(buckets)
+    ]
+    labels.append(f"{buckets[-1] // scale}+ {unit}")
+    return labels
+
+
+@timed
+def ping_graph(
+    character: str,
+    data: dict[str, list[tuple[str, float, int]]],
+    ax: Axes,
+    canvas: FigureCanvasAgg,
+    histograms: dict[str, list[tuple[list[int], list[int], list[int]]]],
+) -> None:
+    global colors, opponent
+    games: list[int] = [0] * len(ping_buckets)
+    wins: list[int] = [0] * len(ping_buckets)
+    for ping_games, ping_wins, _ in histograms[character]:
+        for i in range(len(ping_buckets)):
+            games[i] += ping_games[i]
+            wins[i] += ping_wins[i]
+    winrates: list[float] = [
+        10 * win / game if game != 0 else 0 for win, game in zip(wins, games)
+    ]
+    ax.clear()
+    bars: BarContainer = ax.bar(
+        range(len(ping_buckets)),
+        winrates,
+        tick_label=bucket_labels(ping_buckets, "ms"),
+        color=colors[character],
+    )
+    _ = ax.set_ylim(0.0, 10.0)
+    _ = ax.set_title(
+        f"Win Rate by Ping as {character}{against_opponent()}",
+        fontsize=26 if opponent.get() == "" else 14,
+    )
+    _ = ax.set_ylabel("Win Rate", fontsize=18)
+    _ = ax.set_xlabel("Ping (Online Matches)", fontsize=18)
+    _ = ax.bar_label(
+        bars,
+        labels=[
+            f"{winrate:.1f}:{(10 - winrate):.1f}\n{game} {'Match' if game == 1 else 'Matches'}"
+            if game != 0
+            else ""
+            for winrate, game in zip(winrates, games)
+        ],
+        padding=2,
+    )
+    note_progress(ax)
+    draw_canvas(canvas)
+
+
+@timed
+def durations_graph(
+    character: str,
+    data: dict[str, list[tuple[str, float, int]]],
+    ax: Axes,
+    canvas: FigureCanvasAgg,
+    histograms: dict[str, list[tuple[list[int], list[int], list[int]]]],
+) -> None:
+    global opponent
+    characters: list[str] = []
+    shares: list[list[float]] = []  # per character, per bucket
+    for (char, _, _), (_, _, durations) in zip(data[character], histograms[character]):
+        if sum(durations) != 0:
+            characters.append(char)
+            shares.append([100 * count / sum(durations) for count in durations])
+    ax.clear()
+    left: list[float] = [0.0] * len(characters)
+    labels: list[str] = bucket_labels(duration_buckets, "min", 60)
+    for i, label in enumerate(labels):
+        widths: list[float] = [share[i] for share in shares]
+        _ = ax.barh(
+            range(len(characters)),
+            widths,
+            left=left,
+            tick_label=characters,
+            color=colormaps["viridis"](i / (len(labels) - 1)),
+            label=label,
+        )
+        left = [start + width for start, width in zip(left, widths)]
+    _ = ax.set_xlim(0.0, 130.0)  # the legend goes to the right of the bars
+    _ = ax.set_xticks([0, 25, 50, 75, 100])
+    _ = ax.set_title(
+        f"Match Lengths as {character}{against_opponent()}",
+        fontsize=26 if opponent.get() == "" else 14,
+    )
+    _ = ax.set_ylabel("Character", fontsize=18)
+    _ = ax.set_xlabel("Share of Matches (%)", fontsize=18)
+    if len(characters) != 0:
+        _ = ax.legend(loc="center right", fontsize=10)
+    ax.invert_yaxis()
+    note_progress(ax)
+    draw_canvas(canvas)
+
+
+def heatmap_hover(event: MouseEvent, canvas: FigureCanvasAgg, ax: Axes) -> None:
+    """
+    Shows the matchup under the cursor, with its win rate and number of matches.
+    """
+    global colors
+    heatmap: tuple[AxesImage, Rectangle, Annotation, int, list[list[int]]] | None = (
+        heatmaps.get(ax)
+    )
+    if heatmap is None or heatmap[0].axes is not ax:
+        return
+    image, _, heatmap_annot, _, heatmap_games = heatmap
+    visible: bool = heatmap_annot.get_visible()
+    if event.inaxes == ax and event.xdata is not None and event.ydata is not None:
+        row: int = round(event.ydata)
+        column: int = round(event.xdata)
+        if (
+            0 <= row < len(heatmap_games)
+            and 0 <= column < len(heatmap_games[row])
+            and heatmap_games[row][column] != 0
+        ):
+            winrate: float = image.get_array()[row, column]
+            games: int = heatmap_games[row][column]
+            heatmap_annot.xy = (column, row)
+            _ = heatmap_annot.set(
+                text="{} vs {}\n{}:{}\n{} {}".format(
+                    character_array[row],
+                    character_array[column],
+                    f"{winrate:.1f}",
+                    f"{(10 - winrate):.1f}",
+                    games,
+                    "Match" if games == 1 else "Matches",
+                )
+            )
+            _ = heatmap_annot.get_bbox_patch().set(
+                alpha=0.6, color=colors[character_array[column]]
+            )
+            heatmap_annot.set_visible(True)
+            canvas.draw_idle()
+            return
+    if visible:
+        heatmap_annot.set_visible(False)
+        canvas.draw_idle()
+
+
+@timed
+def heatmap_graph(
+    character: str,
+    data: dict[str, list[tuple[str, float, int]]],
+    ax: Axes,
+    canvas: FigureCanvasAgg,
+) -> None:
+    """
+    Draws the win rates of every matchup as one image. While the image is still
+    on the axes, only its data is swapped, so nothing else has to be made again.
+    """
+    global opponent
+    winrates: list[list[float]] = []
+    heatmap_games: list[list[int]] = []
+    for char in character_array:
+        winrates.append(
+            [winrate if games != 0 else nan for _, winrate, games in data[char]]
+        )
+        heatmap_games.append([games for _, _, games in data[char]])
+    heatmap: tuple[AxesImage, Rectangle, Annotation, int, list[list[int]]] | None = (
+        heatmaps.get(ax)
+    )
+    if heatmap is not None and heatmap[0].axes is ax and sampled is None:
+        image, outline, heatmap_annot, connection, _ = heatmap
+        image.set_data(winrates)
+        heatmap_annot.set_visible(False)  # its matchup may have changed
+        outline.set_y(character_array.index(character) - 0.5)
+        heatmaps[ax] = (image, outline, heatmap_annot, connection, heatmap_games)
+        draw_canvas(canvas)
+        return
+    if heatmap is not None:
+        canvas.mpl_disconnect(heatmap[3])
+    ax.clear()
+    image = ax.imshow(
+        winrates,
+        cmap="RdBu",
+        vmin=0.0,
+        vmax=10.0,
+        aspect="auto",
+        interpolation="nearest",
+    )
+    outline = Rectangle(
+        (-0.5, character_array.index(character) - 0.5),
+        len(character_array),
+        1,
+        fill=False,
+        edgecolor="black",
+        linewidth=1.5,
+    )
+    _ = ax.add_patch(outline)
+    _ = ax.set_xticks(
+        range(len(character_array)), character_array, rotation=90, fontsize=8
+    )
+    _ = ax.set_yticks(range(len(character_array)), character_array, fontsize=8)
+    _ = ax.set_title(
+        f"Every Matchup's Win Rate{against_opponent()}",
+        fontsize=26 if opponent.get() == "" else 14,
+    )
+    # the opponents' names take up the room of an x label, and the filters are below
+    _ = ax.set_ylabel("Your Character", fontsize=18)
+    colorbar_axes: Axes = ax.inset_axes((1.02, 0.0, 0.03, 1.0))
+    _ = ax.figure.colorbar(image, cax=colorbar_axes)
+    heatmap_annot: Annotation = ax.annotate(
+        text="",
+        xy=(0, 0),
+        xytext=(-70, 20),
+        textcoords="offset points",
+        bbox=dict(boxstyle="round", fc="w"),
+        fontsize=15,
+    )
+    heatmap_annot.set_visible(False)
+    heatmaps[ax] = (
+        image,
+        outline,
+        heatmap_annot,
+        canvas.mpl_connect(
+            "motion_notify_event", lambda e: heatmap_hover(e, canvas, ax)
+        ),
+        heatmap_games,
+    )
+    note_progress(ax)
+    draw_canvas(canvas)
+
+
+# name in filters: (key in the replays, kind of value it is compared with)
+query_fields: dict[str, tuple[str, str]] = {
+    "char": ("userCharacter", "character"),
+    "opp_char": ("opponentCharacter", "character"),
+    "opp": ("opponentName", "name"),
+    "rank": ("userRank", "number"),
+    "opp_rank": ("opponentRank", "number"),
+    "ping": ("ping", "number"),
+    "duration": ("duration", "number"),  # in seconds
+    "date": ("date", "date"),
+}
+query_flags: dict[str, str] = {  # name in filters: match flag
+    "online": "online",
+    "offline": "offline",
+    "ex": "EXchars",
+    "team": "team",
+    "ac": "accentCore",
+    "unfinished": "unfinished",
+    "disconnect": "disconnect",
+    "desync": "desync",
+}
+query_operators: dict[str, str] = {
+    "=": "==",
+    "==": "==",
+    "!=": "!=",
+    "<": "<",
+    "<=": "<=",
+    ">": ">",
+    ">=": ">=",
+}
+query_tokens: Pattern[str] = compile_regex(
+    r"""\s*(?:(?P<date>\d{4}-\d{2}-\d{2})|(?P<number>\d+(?:\.\d+)?)(?![\w.-])"""
+    r"""|"(?P<string>[^"]*)"|(?P<operator>[=!<>]=|[=<>(),])|(?P<word>[^\s()",=!<>]+)"""
+    r"""|(?P<error>\S))"""
+)
+
+
+def simplify_name(name: str) -> str:
+    """
+    Leaves out case, spaces and punctuation, so "Order Sol", order_sol and
+    ordersol are all the same character.
+    """
+    return name.lower().translate(str.maketrans("", "", " _.-"))
+
+
+query_characters: dict[str, str] = {
+    simplify_name(char): char for char in character_array
+}
+
+
+class QueryParser:
+    """
+    Turns a filter such as "opp_char in (Zappa, Faust) and ping < 80 and not
+    desync" into the source of one Python expression over a replay, with the
+    values it compares against kept apart as constants.
+    """
+
+    def __init__(self, text: str) -> None:
+        self.tokens: list[tuple[str, str]] = []  # (kind, text)
+        for token in query_tokens.finditer(text):
+            kind: str | None = token.lastgroup
+            if kind is None:
+                continue  # trailing whitespace
+            if kind == "error":
+                raise ValueError(f"Unexpected “{token[kind]}” in the filter.")
+            self.tokens.append((kind, token[kind]))
+        self.position: int = 0
+        self.constants: dict[str, Any] = {}
+
+    def peek(self) -> tuple[str, str]:
+        return (
+            self.tokens[self.position]
+            if self.position < len(self.tokens)
+            else ("end", "")
+        )
+
+    def take(self) -> tuple[str, str]:
+        token: tuple[str, str] = self.peek()
+        if token[0] == "end":
+            raise ValueError("The filter ends too early.")
+        self.position += 1
+        return token
 
+    def keyword(self, word: str) -> bool:
+        """
+        Takes the next token if it is the given keyword.
+        """
+        kind, text = self.peek()
+        if kind == "word" and text.lower() == word:
+            self.position += 1
+            return True
+        return False
 
+    def expect(self, operator: str) -> None:
+        kind, text = self.take()
+        if kind != "operator" or text != operator:
+            raise ValueError(f"Expected “{operator}” but found “{text}”.")
+
+    def constant(self, value: Any) -> str:
+        name: str = f"value{len(self.constants)}"
+        self.constants[name] = value
+        return name
+
+    def parse(self) -> str:
+        expression: str = self.parse_or()
+        if self.peek()[0] != "end":
+            raise ValueError(f"Unexpected “{self.peek()[1]}” in the filter.")
+        return expression
+
+    def parse_or(self) -> str:
+        terms: list[str] = [self.parse_and()]
+        while self.keyword("or"):
+            terms.append(self.parse_and())
+        return terms[0] if len(terms) == 1 else f"({' or '.join(terms)})"
+
+    def parse_and(self) -> str:
+        terms: list[str] = [self.parse_not()]
+        while self.keyword("and"):
+            terms.append(self.parse_not())
+        return terms[0] if len(terms) == 1 else f"({' and '.join(terms)})"
+
+    def parse_not(self) -> str:
+        if self.keyword("not"):
+            return f"(not {self.parse_not()})"
+        return self.parse_term()
+
+    def parse_term(self) -> str:
+        kind, text = self.take()
+        if kind == "operator" and text == "(":
+            expression: str = self.parse_or()
+            self.expect(")")
+            return expression
+        if kind != "word":
+            raise ValueError(f"Expected a field or flag but found “{text}”.")
+        field: str = text.lower()
+        if field == "won":
+            return '(replay["won"] is True)'
+        if field in query_flags:
+            return f'(replay["flags"] & {match_flags[query_flags[field]]} != 0)'
+        if field not in query_fields:
+            raise ValueError(f"There is no field or flag called {text}.")
+        key, value_kind = query_fields[field]
+        value: str = f"replay[{key!r}]"
+        negated: bool = self.keyword("not")
+        if self.keyword("in"):
+            self.expect("(")
+            values: list[Any] = [self.parse_value(value_kind)]
+            while self.peek() == ("operator", ","):
+                self.position += 1
+                values.append(self.parse_value(value_kind))
+            self.expect(")")
+            operator: str = "not in" if negated else "in"
+            return f"({value} is not None and {value} {operator} {self.constant(frozenset(values))})"
+        if negated:
+            raise ValueError(f"Expected “in” after “{text} not”.")
+        kind, text = self.take()
+        if kind != "operator" or text not in query_operators:
+            raise ValueError(f"Expected a comparison after {field} but found “{text}”.")
+        if value_kind in ("character", "name") and text not in ("=", "==", "!="):
+            raise ValueError(f"{field} can only be compared with =, != or in.")
+        return f"({value} is not None and {value} {query_operators[text]} {self.constant(self.parse_value(value_kind))})"
+
+    def parse_value(self, value_kind: str) -> Any:
+        kind, text = self.take()
+        match value_kind:
+            case "number":
+                if kind != "number":
+                    raise ValueError(f"Expected a number but found “{text}”.")
+                return float(text) if "." in text else int(text)
+            case "date":
+                if kind != "date":
+                    raise ValueError(
+                        f"Expected a date (YYYY-MM-DD) but found “{text}”."
+                    )
+                return text
+            case "character":
+                if kind not in ("word", "string"):
+                    raise ValueError(f"Expected a character but found “{text}”.")
+                if simplify_name(text) not in query_characters:
+                    raise ValueError(f"There is no character called {text}.")
+                return query_characters[simplify_name(text)]
+            case _:
+                if kind not in ("word", "string", "number", "date"):
+                    raise ValueError(f"Expected a name but found “{text}”.")
+                return text
+
+
+@cache
+def compile_query(text: str) -> Callable[[dict[str, Any]], bool]:
+    """
+    Compiles a filter into one function that checks a replay against it, only
+    compiling it once. Replays without a value for a field, such as the ranks of
+    offline matches, never match a comparison with it. Raises ValueError if the
+    filter is not valid.
+    """
+    parser: QueryParser = QueryParser(text)
+    expression: str = parser.parse()
+    # every value is a constant, so only field names and operators are in the source
+    return eval(
+        f"lambda replay: {expression}", {"__builtins__": {}, **parser.constants}
+    )
+
+
+@timed
 def filter_replays(
-    replays: list[dict[str, Any]],
+    replays: list[dict[str, Any]] | MatchupTable,
     character_array: list[str],
     name: str,
     opponent_name: str,
@@ -467,75 +1476,182 @@ def filter_replays(
     higher_bound: int = 20,
     opponent_lower_bound: int = 0,
     opponent_higher_bound: int = 20,
+    excluded: int = 0,
 ) -> dict[str, list[tuple[str, float, int]]]:
-    data: dict[str, list[tuple[str, float, int]]] = {}
-    for char in character_array:
-        data[char] = []
-        for char2 in character_array:
-            data[char].append((char2, 0, 0))
-    for replay in replays:
-        if replay_type != "Online Only" and not replay["online"]:
-            if replay["won"]:
-                _, wins, games = data[replay["userCharacter"]][
-                    character_array.index(replay["opponentCharacter"])
-                ]
-                data[replay["userCharacter"]][
-                    character_array.index(replay["opponentCharacter"])
-                ] = (
-                    replay["opponentCharacter"],
-                    wins + 1,
-                    games + 1,
-                )
-            else:
-                _, wins, games = data[replay["userCharacter"]][
-                    character_array.index(replay["opponentCharacter"])
-                ]
-                data[replay["userCharacter"]][
-                    character_array.index(replay["opponentCharacter"])
-                ] = (
-                    replay["opponentCharacter"],
-                    wins,
-                    games + 1,
-                )
-        if (
-            replay_type != "Offline Only"
-            and replay["online"]
-            and (
-                replay["userRank"] not in range(lower_bound, higher_bound)
-                or replay["opponentRank"]
-                not in range(opponent_lower_bound, opponent_higher_bound)
-            )
-        ):
-            continue
-        if replay_type != "Offline Only" and replay["online"]:
-            if replay["won"]:
-                _, wins, games = data[replay["userCharacter"]][
-                    character_array.index(replay["opponentCharacter"])
-                ]
-                data[replay["userCharacter"]][
-                    character_array.index(replay["opponentCharacter"])
-                ] = (
-                    replay["opponentCharacter"],
-                    wins + 1,
-                    games + 1,
-                )
-            else:
-                _, wins, games = data[replay["userCharacter"]][
-                    character_array.index(replay["opponentCharacter"])
-                ]
-                data[replay["userCharacter"]][
-                    character_array.index(replay["opponentCharacter"])
-                ] = (
-                    replay["opponentCharacter"],
-                    wins,
-                    games + 1,
-                )
-    for i in range(len(data)):
-        for j in range(len(data[character_array[i]])):
-            char, wins, games = data[character_array[i]][j]
-            if games != 0:
-                data[character_array[i]][j] = (char, 10 * wins / games, games)
-    return data
+    """
+    Counts the wins and games of every matchup from the replays' MatchupTable.
+    Replays with any of the excluded flags are skipped.
+    """
+    table, excluded = matchup_table(replays, replay_type, excluded)
+    return table.filter(
+        character_array,
+        excluded,
+        lower_bound,
+        higher_bound,
+        opponent_lower_bound,
+        opponent_higher_bound,
+    )
+
+
+@timed
+def filter_histograms(
+    replays: list[dict[str, Any]] | MatchupTable,
+    character_array: list[str],
+    replay_type: str,
+    lower_bound: int = 0,
+    higher_bound: int = 20,
+    opponent_lower_bound: int = 0,
+    opponent_higher_bound: int = 20,
+    excluded: int = 0,
+) -> dict[str, list[tuple[list[int], list[int], list[int]]]]:
+    """
+    Sums the ping and match length histograms of every matchup, for the ping
+    and match length graphs, with the same filters as filter_replays.
+    """
+    table, excluded = matchup_table(replays, replay_type, excluded)
+    return table.histograms(
+        character_array,
+        excluded,
+        lower_bound,
+        higher_bound,
+        opponent_lower_bound,
+        opponent_higher_bound,
+    )
+
+
+def matchup_table(
+    replays: list[dict[str, Any]] | MatchupTable, replay_type: str, excluded: int
+) -> tuple[MatchupTable, int]:
+    """
+    Returns the MatchupTable of some replays, along with the excluded flags
+    plus the ones a replay type leaves out.
+    """
+    if replay_type == "Offline Only":
+        excluded |= match_flags["online"]
+    elif replay_type == "Online Only":
+        excluded |= match_flags["offline"]
+    table: MatchupTable = (
+        replays if isinstance(replays, MatchupTable) else replay_index(replays).table
+    )
+    return table, excluded
+
+
+def replay_index(replays: list[dict[str, Any]]) -> ReplayIndex:
+    """
+    The ReplayIndex of a list of replays, which is kept for the next filter, so
+    a filter change only sums tables and ANDs bitsets instead of going through
+    every replay. Replays added to the list since the last call are indexed on
+    top.
+    """
+    index: ReplayIndex | None = replay_indexes.pop(id(replays), None)
+    if index is None or index.replays is not replays or index.indexed > len(replays):
+        index = ReplayIndex(replays)
+    replay_indexes[id(replays)] = index
+    if len(replay_indexes) > replay_index_cache_size:
+        _ = replay_indexes.popitem(last=False)
+    index.update()
+    return index
+
+
+@timed
+def count_opponents(
+    replays: list[dict[str, Any]],
+    replay_type: str,
+    lower_bound: int = 0,
+    higher_bound: int = 20,
+    opponent_lower_bound: int = 0,
+    opponent_higher_bound: int = 20,
+    excluded: int = 0,
+) -> dict[str, list[int]]:
+    """
+    Counts the games and wins against every opponent and the characters they
+    picked, in one pass over the replays whose flags are not excluded, and
+    with the same filters as filter_replays. Every opponent gets [games, wins,
+    index of their most picked character, picks of every character], where
+    picks start at index 3.
+    """
+    if replay_type == "Offline Only":
+        excluded |= match_flags["online"]
+    elif replay_type == "Online Only":
+        excluded |= match_flags["offline"]
+    user_ranks: range = range(lower_bound, higher_bound)
+    opponent_ranks: range = range(opponent_lower_bound, opponent_higher_bound)
+    picks: dict[str, int] = {char: 3 + i for i, char in enumerate(character_array)}
+    counts: dict[str, list[int]] = {}
+    for replay in replay_index(replays).select(excluded):
+        if replay["online"] and (
+            replay["userRank"] not in user_ranks
+            or replay["opponentRank"] not in opponent_ranks
+        ):
+            continue
+        opponent_counts: list[int] | None = counts.get(replay["opponentName"])
+        if opponent_counts is None:
+            opponent_counts = [0, 0, 3] + [0] * len(character_array)
+            counts[replay["opponentName"]] = opponent_counts
+        opponent_counts[0] += 1
+        if replay["won"]:
+            opponent_counts[1] += 1
+        pick: int = picks[replay["opponentCharacter"]]
+        opponent_counts[pick] += 1
+        if opponent_counts[pick] > opponent_counts[opponent_counts[2]]:
+            opponent_counts[2] = pick
+    return counts
+
+
+class OpponentRanking:
+    """
+    The games, win rate and most picked character of every opponent, ranked by
+    one of them. Only as many opponents as have been asked for are ranked, with
+    a heap, so the top of even a very long list is ready straight away.
+    """
+
+    columns: tuple[str, ...] = ("Opponent", "Games", "Your Win Rate", "Most Picked")
+
+    def __init__(self, counts: dict[str, list[int]]) -> None:
+        self.rows: list[tuple[str, int, float, str]] = [
+            (
+                name,
+                opponent_counts[0],
+                10 * opponent_counts[1] / opponent_counts[0],
+                character_array[opponent_counts[2] - 3],
+            )
+            for name, opponent_counts in counts.items()
+        ]
+        self.column: int = 1  # most games first
+        self.descending: bool = True
+        self.ranked: list[tuple[str, int, float, str]] = []  # the top of the ranking
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def sort(self, column: int) -> None:
+        """
+        Ranks by another column, or the other way around if already ranked by it.
+        Names and characters are ranked alphabetically first, numbers highest first.
+        """
+        if column == self.column:
+            self.descending = not self.descending
+        else:
+            self.column = column
+            self.descending = column in (1, 2)
+        self.ranked = []
+
+    def page(self, start: int, stop: int) -> list[tuple[str, int, float, str]]:
+        """
+        Returns the opponents ranked from start up to stop.
+        """
+        stop = min(stop, len(self.rows))
+        if len(self.ranked) < stop:
+            # ranks further ahead than needed, so scrolling on does not rank again
+            count: int = max(stop, 2 * len(self.ranked), 4 * opponent_rows)
+            key: itemgetter[Any] = itemgetter(self.column)
+            if count >= len(self.rows) // 8:
+                self.ranked = sorted(self.rows, key=key, reverse=self.descending)
+            elif self.descending:
+                self.ranked = nlargest(count, self.rows, key=key)
+            else:
+                self.ranked = nsmallest(count, self.rows, key=key)
+        return self.ranked[start:stop]
 
 
 def analyze_replays(
@@ -543,16 +1659,19 @@ def analyze_replays(
     name: str,
     opponent_name: str,
     root: Tk,
+    streaming: bool = False,
+    progressive: bool = False,
 ) -> None:
     """
-    Opens a new window to graph replays.
+    Opens a new window to graph replays. When streaming, the replays are only
+    counted into a MatchupTable instead of being kept, and a folder is read as
+    it is walked, without listing it or checking for copies of replays first.
+    When progressive (and not streaming), the graph is first drawn from a random
+    sample of a folder's replays and refined as the rest are read.
     """
     global \
-        view_type, \
-        is_sorted, \
         sliders, \
         replay_type_selection, \
-        sort_button, \
         corrupt_replays, \
         character_array, \
         metadata_dictionary
@@ -590,21 +1709,76 @@ def analyze_replays(
             parent=root,
         )
         return
-    replays: list[dict[str, Any]] = []
-    slash: str = "\\" if system() == "Windows" else "/"
-    if Path(replay_path).is_dir():
-        for file in glob(f"{replay_path}{slash}**{slash}*.ggr", recursive=True):
-            try:
-                replays.append(partial_parse_metadata(file, name))
-            except ValueError as corrupt:
-                corrupt_replays.append(str(corrupt))
-                continue
-        for file in glob(f"{replay_path}{slash}**{slash}*.json", recursive=True):
-            try:
-                replays.append(parse_jsons(file))
-            except KeyError:
-                corrupt_replays.append(file[len(replay_path) + 1 :])
-        if len(replays) == 0:
+    replays: list[dict[str, Any]] | MatchupTable = (
+        MatchupTable(opponent_name) if streaming else []
+    )
+    corrupt_replays.clear()
+    known_corrupt_replays.clear()
+    duplicate_replays.clear()
+    # a fingerprint per replay would grow with the folder, so copies of replays
+    # are not looked for when streaming
+    fingerprints: set[bytes] | None = None if streaming else set()
+    watcher: FolderWatcher | None = None
+    batches: Iterator[tuple[list[dict[str, Any]], int]] | None = None
+    total: int = 0
+    sample: tuple[int, int] | None = None  # (files read, files) while still reading
+    if Path(replay_path).is_dir() or is_archive(replay_path):
+        if Path(replay_path).is_dir() and streaming:
+            # the walk records when it listed each folder, for the watcher
+            watcher = FolderWatcher(replay_path, None)
+            headers: Iterator[tuple[str, bytes]] = folder_headers(
+                skip_quarantined(watcher.walk(), replay_path)
+            )
+            json_files: Iterable[str] = folder_files(replay_path, "json")
+            bundle_files: list[str] = [
+                file for kind, file in walk_folder(replay_path) if kind == "bundle"
+            ]
+        elif Path(replay_path).is_dir():
+            with stats.stage("directory scan"):
+                replay_files, json_files, bundle_files = scan_folder(replay_path)
+            stats.count("files", len(replay_files) + len(json_files))
+            watcher = FolderWatcher(replay_path, replay_files)
+            replay_files = list(skip_quarantined(replay_files, replay_path))
+            if progressive:
+                batches = read_in_batches(
+                    replay_files, json_files, replay_path, name, fingerprints
+                )
+                total = len(replay_files) + len(json_files)
+                replay_files = []
+                json_files = []
+            headers = folder_headers(replay_files)
+        else:
+            json_files = []
+            bundle_files = []
+            headers = archive_headers(replay_path)
+        try:
+            with stats.stage("header decode"):
+                ingest_headers(headers, replay_path, name, fingerprints, replays)
+        except (BadZipFile, TarError, EOFError) as e:
+            _ = messagebox.showerror(
+                "Archive Error",
+                f"{replay_path} could not be read: {e}",
+                parent=root,
+            )
+            return
+        save_quarantine()
+        if batches is not None:
+            with stats.stage("progressive batch"):
+                for added, read in batches:
+                    if opponent_name != "":
+                        added = [
+                            replay
+                            for replay in added
+                            if replay["opponentName"] == opponent_name
+                        ]
+                    replays.extend(added)
+                    sample = (read, total) if read < total else None
+                    if len(replays) != 0:
+                        break
+        with stats.stage("JSON load"):
+            replays.extend(load_jsons(json_files, name, replay_path))
+            replays.extend(load_bundles(bundle_files, name))
+        if len(replays) == 0 and total == 0:
             _ = messagebox.showerror(
                 "No Replays Found",
                 "No replays could be found in the selected folder. Please select a different folder and try again.",
@@ -612,15 +1786,17 @@ def analyze_replays(
             )
             return
     else:
-        with open(replay_path) as f:
-            replays = load(f)["data"]
-    if opponent_name != "":
+        replays.extend(load_master(replay_path))
+    if opponent_name != "" and not isinstance(replays, MatchupTable):
         replays = [replay for replay in replays if replay["opponentName"] == opponent_name]
+    played: set[str] = (
+        replays.played
+        if isinstance(replays, MatchupTable)
+        else {replay["userCharacter"] for replay in replays}
+    )
     excluded_characters: list[str] = []
     for i in range(len(character_array_copy) - 1, 0, -1):
-        if not any(
-            replay["userCharacter"] == character_array_copy[i] for replay in replays
-        ):
+        if character_array_copy[i] not in played:
             excluded_characters.append(character_array_copy.pop(i))
     excluded_characters.reverse()
     if name == "":
@@ -637,10 +1813,175 @@ def analyze_replays(
             parent=root,
         )
         return
-    if len(corrupt_replays) != 0:
+    if sample is None:  # a progressive analysis reports once everything is read
+        show_reports(root, name, opponent_name, excluded_characters)
+    analysis: Toplevel = Toplevel(root)
+    analysis.resizable(False, False)
+    character: StringVar = StringVar()
+    character.set(character_array_copy[0])
+    sort_button: Button = Button(analysis, text="Toggle Sorting", state=DISABLED)
+    canvas, commands = build_analysis_figure(
+        replays,
+        name,
+        opponent_name,
+        character,
+        lambda fig: FigureCanvasTkAgg(fig, master=analysis),
+        sample,
+        sort_button,
+    )
+    canvas.get_tk_widget().grid(row=1, column=0, columnspan=4)
+    dropdown: OptionMenu = OptionMenu(
+        analysis,
+        character,
+        *character_array_copy,
+        command=commands["dropdown"],
+    )
+    dropdown.grid(row=0, column=0)
+    switch_button: Button = Button(
+        analysis,
+        text="Switch View",
+        command=commands["switch"],
+    )
+    switch_button.grid(row=0, column=1)
+    sort_button["command"] = commands["sort"]
+    sort_button.grid(row=0, column=2)
+    opponents_button: Button = Button(
+        analysis,
+        text="Opponents",
+        command=commands["opponents"],
+        state=DISABLED if isinstance(replays, MatchupTable) else NORMAL,
+    )
+    opponents_button.grid(row=0, column=3)
+    query_row: Frame = Frame(analysis)
+    query_row.grid(row=2, column=0, columnspan=4, sticky="we", padx=10, pady=5)
+    query_label: Label = Label(query_row, text="Filter:")
+    query_label.pack(side=LEFT)
+    query_entry: Entry = Entry(query_row)
+    query_entry.pack(side=LEFT, fill="x", expand=True, padx=5)
+    query_button: Button = Button(
+        query_row,
+        text="Apply",
+        command=lambda: apply_query(analysis, query_entry.get(), commands["query"]),
+    )
+    query_button.pack(side=LEFT)
+    if isinstance(replays, MatchupTable):  # the replays are not kept to filter
+        query_entry["state"] = DISABLED
+        query_button["state"] = DISABLED
+    else:
+        _ = query_entry.bind(
+            "<Return>",
+            lambda _: apply_query(analysis, query_entry.get(), commands["query"]),
+        )
+    if stats.enabled:
+        stats_panel: Label = Label(analysis, justify=LEFT, font="TkFixedFont")
+        stats_panel.grid(row=3, column=0, columnspan=3, sticky="w", padx=10)
+        save_stats_button: Button = Button(
+            analysis,
+            text="Save Stats",
+            command=lambda: save_stats(analysis),
+        )
+        save_stats_button.grid(row=3, column=3)
+        refresh_stats(stats_panel)
+    if watcher is not None:
+        watching: IntVar = IntVar(analysis)
+        watch_button: Checkbutton = Checkbutton(
+            analysis,
+            text="Watch the folder for new replays",
+            variable=watching,
+            onvalue=1,
+            offvalue=0,
+        )
+        watch_button.grid(row=4, column=0, columnspan=4, pady=(0, 10))
+        _ = analysis.after(
+            watch_interval,
+            watch_folder,
+            analysis,
+            watching,
+            watcher,
+            lambda new_replays: add_watched_replays(
+                new_replays,
+                replays,
+                replay_path,
+                name,
+                opponent_name,
+                fingerprints,
+                character,
+                character_array_copy,
+                dropdown,
+                commands,
+            ),
+        )
+    _ = analysis.after(
+        prefetch_interval,
+        prefetch_frames,
+        analysis,
+        commands["prefetch"],
+        character_array_copy,
+    )
+    if sample is not None and batches is not None:
+        _ = analysis.after(
+            1,
+            continue_reading,
+            analysis,
+            batches,
+            total,
+            sample[0],
+            [],
+            lambda added, sample: (
+                commands["sample"](sample),
+                add_replays(
+                    added,
+                    replays,
+                    opponent_name,
+                    character,
+                    character_array_copy,
+                    dropdown,
+                    commands,
+                ),
+            ),
+            lambda: show_reports(
+                root,
+                name,
+                opponent_name,
+                [
+                    char
+                    for char in character_array[1:]
+                    if char not in character_array_copy
+                ],
+            ),
+        )
+    analysis.protocol("WM_DELETE_WINDOW", analysis.destroy)
+
+
+def apply_query(analysis: Toplevel, text: str, query: Callable[[str], None]) -> None:
+    """
+    Filters the analysis with the query typed in, explaining what is wrong with
+    it if it is not valid.
+    """
+    try:
+        query(text)
+    except ValueError as e:
+        _ = messagebox.showerror("Invalid Filter", str(e), parent=analysis)
+
+
+def show_reports(
+    root: Tk, name: str, opponent_name: str, excluded_characters: list[str]
+) -> None:
+    """
+    Tells the user which replays were skipped and which characters have no replays.
+    """
+    if len(corrupt_replays) != 0 or len(known_corrupt_replays) != 0:
         _ = messagebox.showwarning(
             "Corrupt Replays",
-            f"The following replays are corrupt:\n{'\n'.join(corrupt_replays)}\nThe non-corrupt replays have successfully been analyzed.",
+            corrupt_report("analyzed"),
+            parent=root,
+        )
+    if len(duplicate_replays) != 0:
+        _ = messagebox.showinfo(
+            "Duplicate Replays",
+            "The following replays are copies of other replays and have been skipped:\n"
+            + "\n".join(duplicate_replays)
+            + "\nThe rest of the replays have been successfully analyzed.",
             parent=root,
         )
     if len(excluded_characters) != 0:
@@ -656,20 +1997,142 @@ def analyze_replays(
                 f"No replays with {name} as the following characters against {opponent_name} could be found:\n{', '.join(character for character in excluded_characters)}\nThe rest of the replays have been successfully analyzed.",
                 parent=root,
             )
-    analysis: Toplevel = Toplevel(root)
-    analysis.resizable(False, False)
-    character: StringVar = StringVar()
-    character.set(character_array_copy[0])
+
+
+def refresh_stats(stats_panel: Label) -> None:
+    """
+    Keeps the stats panel of an analysis window up to date.
+    """
+    if not stats_panel.winfo_exists():
+        return
+    stats_panel["text"] = stats.summary()
+    _ = stats_panel.after(500, refresh_stats, stats_panel)
+
+
+def save_stats(analysis: Toplevel) -> None:
+    """
+    Saves the stats as JSON.
+    """
+    stats_file: str = filedialog.asksaveasfilename(
+        title="Save stats as",
+        initialfile="stats.json",
+        defaultextension=".json",
+        parent=analysis,
+    )
+    if stats_file != "" and stats_file != ():
+        stats.dump(stats_file)
+
+
+def show_opponents(parent: Misc, ranking: OpponentRanking) -> None:
+    """
+    Opens a table of every opponent, sorted by clicking on a column. Only the
+    rows on screen are made, and they are filled in again as the table is
+    scrolled, so it scrolls just as fast with any number of opponents.
+    """
+    window: Toplevel = Toplevel(parent)
+    window.title(f"Opponents ({len(ranking):,})")
+    table: Treeview = Treeview(
+        window,
+        columns=ranking.columns,
+        show="headings",
+        height=opponent_rows,
+        selectmode="none",
+    )
+    scrollbar: Scrollbar = Scrollbar(window, orient="vertical")
+    for i, width in enumerate((200, 70, 110, 110)):
+        _ = table.column(ranking.columns[i], width=width, anchor="w" if i == 0 else "e")
+    for i in range(opponent_rows):
+        _ = table.insert("", "end", iid=str(i))
+    first: int = 0
+
+    def fill() -> None:
+        rows: list[tuple[str, int, float, str]] = ranking.page(
+            first, first + opponent_rows
+        )
+        for i in range(opponent_rows):
+            if i < len(rows):
+                opponent_name, games, winrate, most_picked = rows[i]
+                _ = table.item(
+                    str(i),
+                    values=(
+                        opponent_name,
+                        games,
+                        f"{winrate:.1f}:{(10 - winrate):.1f}",
+                        most_picked,
+                    ),
+                )
+            else:
+                _ = table.item(str(i), values=())
+        for i, column in enumerate(ranking.columns):
+            arrow: str = ""
+            if i == ranking.column:
+                arrow = " ▼" if ranking.descending else " ▲"
+            _ = table.heading(column, text=column + arrow)
+        if len(ranking) > opponent_rows:
+            scrollbar.set(first / len(ranking), (first + opponent_rows) / len(ranking))
+        else:
+            scrollbar.set(0, 1)
+
+    def scroll_to(row: int) -> None:
+        nonlocal first
+        first = max(0, min(row, len(ranking) - opponent_rows))
+        fill()
+
+    def scroll(*args: str) -> None:
+        if args[0] == "moveto":
+            scroll_to(round(float(args[1]) * len(ranking)))
+        elif args[0] == "scroll":
+            scroll_to(
+                first + int(args[1]) * (opponent_rows - 1 if args[2] == "pages" else 1)
+            )
+
+    def sort(column: int) -> None:
+        ranking.sort(column)
+        scroll_to(0)
+
+    for i, column in enumerate(ranking.columns):
+        _ = table.heading(column, command=lambda i=i: sort(i))
+    _ = scrollbar.configure(command=scroll)
+    # Windows and macOS send MouseWheel, Linux sends Button-4 and Button-5
+    _ = table.bind(
+        "<MouseWheel>",
+        lambda e: scroll_to(first - 3 * (e.delta > 0) + 3 * (e.delta < 0)),
+    )
+    _ = table.bind("<Button-4>", lambda _: scroll_to(first - 3))
+    _ = table.bind("<Button-5>", lambda _: scroll_to(first + 3))
+    table.grid(row=0, column=0)
+    scrollbar.grid(row=0, column=1, sticky="ns")
+    fill()
+
+
+C = TypeVar("C", bound=FigureCanvasAgg)
+
+
+def build_analysis_figure(
+    replays: list[dict[str, Any]] | MatchupTable,
+    name: str,
+    opponent_name: str,
+    character: StringVar,
+    make_canvas: Callable[[Figure], C],
+    sample: tuple[int, int] | None = None,
+    sort_button: Button | None = None,
+) -> tuple[C, dict[str, Callable[..., None]]]:
+    """
+    Draws the analysis figure and makes the commands for its buttons. sample is
+    (files read, files) if the replays are only a sample so far, and sort_button
+    is the Toggle Sorting button to enable for the views it sorts.
+    """
+    global sliders, replay_type_selection, character_array
     fig, ax = subplots()
     ax.clear()
     fig.set_figwidth(9)
     fig.set_figheight(9)
+    fig.subplots_adjust(bottom=0.15)  # room for the filters below the graph
     _ = ax.set_xlim(0.0, 10.0)
     _ = ax.set_label(f"Matchup Spread for {character}")
     _ = ax.set_xlabel("Win Rate", fontsize=18)
     _ = ax.set_ylabel("Number of Matches", fontsize=18)
-    canvas: FigureCanvasTkAgg = FigureCanvasTkAgg(fig, master=analysis)
-    canvas.get_tk_widget().grid(row=1, column=0, columnspan=3)
+    canvas: C = make_canvas(fig)
     user_rank_axes: Axes = fig.add_axes([0.2, 0.96, 0.6, 0.03])
     user_rank: RangeSlider = RangeSlider(
         user_rank_axes,
@@ -695,216 +2158,327 @@ def analyze_replays(
         replay_type_selection_axes,
         ["Both Online and Offline", "Offline Only", "Online Only"],
     )
-    _ = user_rank.on_changed(
-        lambda user: update_replays(
-            "",
-            replays,
-            character_array,
-            name,
-            opponent_name,
-            character.get(),
-            ax,
-            canvas,
-            replay_type_selection.value_selected,
-            int(user[0]),
-            int(user[1]),
-            int(opponent_rank.val[0]),
-            int(opponent_rank.val[1]),
+    match_filters: list[CheckButtons] = []
+    for i, labels in enumerate(match_filter_labels):
+        match_filter_axes: Axes = fig.add_axes([0.36 + 0.31 * i, 0.005, 0.28, 0.075])
+        match_filters.append(
+            CheckButtons(match_filter_axes, list(labels), [True] * len(labels))
         )
-    )
-    _ = opponent_rank.on_changed(
-        lambda opponent: update_replays(
-            "",
-            replays,
-            character_array,
-            name,
-            opponent_name,
-            character.get(),
-            ax,
-            canvas,
+    frames: FrameCache = FrameCache(frame_cache_size)
+    view_type: View = View.SCATTER
+    is_sorted: bool = False  # whether Switch View goes to the sorted bar graphs
+    query: str = ""  # the filter typed in below the graph, if any
+    queried: list[dict[str, Any]] = []  # the replays matching it
+    queried_from: int = 0  # how many replays have been checked against it
+
+    def matching() -> list[dict[str, Any]] | MatchupTable:
+        """
+        The replays matching the filter. Replays are only ever added, so only
+        the ones added since the last call are checked.
+        """
+        nonlocal queried_from
+        if query == "" or isinstance(replays, MatchupTable):
+            return replays
+        matches: Callable[[dict[str, Any]], bool] = compile_query(query)
+        with stats.stage("query"):
+            queried.extend(filter(matches, replays[queried_from:]))
+        queried_from = len(replays)
+        return queried
+
+    def set_query(text: str) -> None:
+        """
+        Filters the replays with a query, or stops filtering them if it is
+        empty. Raises ValueError if the query is not valid.
+        """
+        nonlocal query, queried, queried_from
+        text = text.strip()
+        if text != "":
+            _ = compile_query(text)  # before anything changes
+        query = text
+        queried = []  # a new list, so it gets a ReplayIndex of its own
+        queried_from = 0
+        show(character.get(), False, False)
+
+    def frame_key(char: str, view: View) -> tuple[Any, ...]:
+        """
+        Everything that decides what the figure shows.
+        """
+        return (
+            char,
+            view,
             replay_type_selection.value_selected,
-            int(user_rank.val[0]),
-            int(user_rank.val[1]),
-            int(opponent[0]),
-            int(opponent[1]),
+            tuple(int(rank) for rank in user_rank.val),
+            tuple(int(rank) for rank in opponent_rank.val),
+            excluded_flags(match_filters),
+            len(replays),  # grows as replays are watched for or read
+            query,
+            sample,
+            fig.bbox.bounds,
         )
-    )
-    _ = replay_type_selection.on_clicked(
-        lambda s: update_replays(
-            s,
-            replays,
-            character_array,
-            name,
-            opponent_name,
-            character.get(),
-            ax,
-            canvas,
-            replay_type_selection.value_selected,
+
+    def current_data() -> tuple[
+        dict[str, list[tuple[str, float, int]]],
+        dict[str, list[tuple[list[int], list[int], list[int]]]],
+    ]:
+        """
+        Filters the replays, returning the win rates along with the histograms
+        of their pings and match lengths.
+        """
+        chosen: list[dict[str, Any]] | MatchupTable = matching()
+        bounds: tuple[int, int, int, int] = (
             int(user_rank.val[0]),
             int(user_rank.val[1]),
             int(opponent_rank.val[0]),
             int(opponent_rank.val[1]),
         )
-    )
-    scatter_plot(
-        character_array_copy[0],
-        filter_replays(
-            replays,
+        data: dict[str, list[tuple[str, float, int]]] = filter_replays(
+            chosen,
             character_array,
             name,
             opponent_name,
             replay_type_selection.value_selected,
-            int(user_rank.val[0]),
-            int(user_rank.val[1]),
-            int(opponent_rank.val[0]),
-            int(opponent_rank.val[1]),
-        ),
-        ax,
-        canvas,
-    )
-    dropdown: OptionMenu = OptionMenu(
-        analysis,
-        character,
-        *character_array_copy,
-        command=lambda x: determine_view(
-            x,
-            filter_replays(
-                replays,
-                character_array,
-                name,
-                opponent_name,
-                replay_type_selection.value_selected,
-                int(user_rank.val[0]),
-                int(user_rank.val[1]),
-                int(opponent_rank.val[0]),
-                int(opponent_rank.val[1]),
-            ),
-            ax,
-            canvas,
-            False,
-            False,
-        ),
-    )
-    dropdown.grid(row=0, column=0)
-    switch_button: Button = Button(
-        analysis,
-        text="Switch View",
-        command=lambda: determine_view(
-            character.get(),
-            filter_replays(
-                replays,
-                character_array,
-                name,
-                opponent_name,
-                replay_type_selection.value_selected,
-                int(user_rank.val[0]),
-                int(user_rank.val[1]),
-                int(opponent_rank.val[0]),
-                int(opponent_rank.val[1]),
-            ),
-            ax,
-            canvas,
-            True,
-            False,
-        ),
-    )
-    switch_button.grid(row=0, column=1)
-    sort_button = Button(
-        analysis,
-        text="Toggle Sorting",
-        command=lambda: determine_view(
-            character.get(),
-            filter_replays(
-                replays,
-                character_array,
-                name,
-                opponent_name,
-                replay_type_selection.value_selected,
-                int(user_rank.val[0]),
-                int(user_rank.val[1]),
-                int(opponent_rank.val[0]),
-                int(opponent_rank.val[1]),
-            ),
-            ax,
-            canvas,
-            False,
-            True,
-        ),
-    )
-    sort_button.grid(row=0, column=2)
-    sort_button["state"] = DISABLED
-    analysis.protocol("WM_DELETE_WINDOW", analysis.destroy)
+            *bounds,
+            excluded_flags(match_filters),
+        )
+        return data, filter_histograms(
+            chosen,
+            character_array,
+            replay_type_selection.value_selected,
+            *bounds,
+            excluded_flags(match_filters),
+        )
 
+    def draw(view: View, char: str, filtered: tuple[Any, Any]) -> None:
+        """
+        Draws a graph from data returned by current_data, which may be cached.
+        """
+        data, histograms = filtered
+        with sampling(sample):
+            draw_view(view, char, data, ax, canvas, histograms)
 
-def determine_view(
-    character: str,
-    data: dict[str, list[tuple[str, float, int]]],
-    ax: Axes,
-    canvas: FigureCanvasTkAgg,
-    switch: bool,
-    sort: bool,
-) -> None:
-    global view_type, is_sorted, sort_button
-    if switch:
-        sort_button["state"] = (
-            DISABLED
-            if view_type == View.AMOUNTS or view_type == View.AMOUNTS_SORTED
-            else NORMAL
+    def remake_artists(char: str, shown: int, filtered: tuple[Any, Any]) -> None:
+        """
+        Makes the artists of a graph shown from the cache, for hovering and later
+        redraws, unless another graph has been shown since.
+        """
+        if shown == frames.shown:
+            with drawing_as(Drawing.SKIP):
+                draw(view_type, char, filtered)
+
+    def show(char: str, switch: bool, sort: bool, deferred: bool = False) -> None:
+        """
+        Redraws the figure after the user changed something, copying the frame
+        back from the cache if it was drawn before. Widgets on the figure redraw
+        it themselves, so only the buttons outside of it can defer making the
+        artists of a cached graph until Tk is idle.
+        """
+        nonlocal view_type, is_sorted
+        frames.last_shown = perf_counter()
+        frames.shown += 1
+        view: View
+        view, is_sorted = advance_view(view_type, is_sorted, switch, sort)
+        if sort and view == view_type:  # only bar graphs can be sorted
+            return
+        view_type = view
+        if sort_button is not None:
+            sort_button["state"] = NORMAL if view_type in sorted_views else DISABLED
+        key: tuple[Any, ...] = frame_key(char, view_type)
+        cached: tuple[Any, tuple[Any, Any]] | None = frames.get(key)
+        if cached is None:
+            filtered: tuple[Any, Any] = current_data()
+            draw(view_type, char, filtered)
+            frames.add(key, canvas.copy_from_bbox(fig.bbox), filtered)
+            return
+        stats.count("cached frames")
+        frame, filtered = cached
+        if not deferred or not isinstance(canvas, FigureCanvasTkAgg):
+            remake_artists(char, frames.shown, filtered)
+        canvas.restore_region(frame)
+        canvas.blit()
+        if deferred and isinstance(canvas, FigureCanvasTkAgg):
+            _ = canvas.get_tk_widget().after_idle(
+                remake_artists, char, frames.shown, filtered
+            )
+
+    def prefetch(characters: list[str]) -> None:
+        """
+        Draws one of the graphs the user is likely to look at next into the
+        cache, once they have not changed anything for a while: the next view,
+        and the characters before and after the selected one.
+        """
+        if (
+            sample is not None
+            or perf_counter() - frames.last_shown < prefetch_delay / 1000
+        ):
+            return
+        char: str = character.get()
+        current: tuple[Any, tuple[Any, Any]] | None = frames.get(
+            frame_key(char, view_type)
         )
-        match view_type:
-            case View.SCATTER:
-                if is_sorted:
-                    view_type = View.MATCHUPS_SORTED
-                    matchups_bar_graph_sorted(character, data, ax, canvas)
-                else:
-                    view_type = View.MATCHUPS
-                    matchups_bar_graph(character, data, ax, canvas)
-            case View.MATCHUPS:
-                view_type = View.AMOUNTS
-                no_of_matches_bar_graph(character, data, ax, canvas)
-            case View.MATCHUPS_SORTED:
-                view_type = View.AMOUNTS_SORTED
-                no_of_matches_bar_graph_sorted(character, data, ax, canvas)
-            case View.AMOUNTS | View.AMOUNTS_SORTED:
-                view_type = View.SCATTER
-                scatter_plot(character, data, ax, canvas)
-    elif sort:
-        is_sorted = not is_sorted
-        match view_type:
-            case View.SCATTER:
-                return
-            case View.MATCHUPS:
-                view_type = View.MATCHUPS_SORTED
-                matchups_bar_graph_sorted(character, data, ax, canvas)
-            case View.MATCHUPS_SORTED:
-                view_type = View.MATCHUPS
-                matchups_bar_graph(character, data, ax, canvas)
-            case View.AMOUNTS:
-                view_type = View.AMOUNTS_SORTED
-                no_of_matches_bar_graph_sorted(character, data, ax, canvas)
-            case View.AMOUNTS_SORTED:
-                view_type = View.AMOUNTS
-                no_of_matches_bar_graph(character, data, ax, canvas)
-    else:
-        sort_button["state"] = DISABLED if view_type == View.SCATTER else NORMAL
-        match view_type:
-            case View.SCATTER:
-                scatter_plot(character, data, ax, canvas)
-            case View.MATCHUPS:
-                matchups_bar_graph(character, data, ax, canvas)
-            case View.MATCHUPS_SORTED:
-                matchups_bar_graph_sorted(character, data, ax, canvas)
-            case View.AMOUNTS:
-                no_of_matches_bar_graph(character, data, ax, canvas)
-            case View.AMOUNTS_SORTED:
-                no_of_matches_bar_graph_sorted(character, data, ax, canvas)
+        if current is None or char not in characters:
+            return
+        # the graphs differ only in character and view, so they share its data
+        frame, filtered = current
+        index: int = characters.index(char)
+        for next_char, view in (
+            (char, switched_view(view_type, is_sorted)),
+            (characters[(index + 1) % len(characters)], view_type),
+            (characters[index - 1], view_type),
+        ):
+            key: tuple[Any, ...] = frame_key(next_char, view)
+            if key in frames:
+                continue
+            with drawing_as(Drawing.RENDER):
+                draw(view, next_char, filtered)
+            frames.add(key, canvas.copy_from_bbox(fig.bbox), filtered)
+            # put the shown graph back, without drawing it again
+            with drawing_as(Drawing.SKIP):
+                draw(view_type, char, filtered)
+            canvas.restore_region(frame)
+            return
 
+    def set_sample(new_sample: tuple[int, int] | None) -> None:
+        """
+        Sets how many of the files the replays are a sample of, before they are
+        refreshed with more.
+        """
+        nonlocal sample
+        sample = new_sample
 
-def jsonify_replays(replay_folder_path: str, root: Tk, name: str) -> None:
+    def opponents() -> None:
+        """
+        Opens the opponents table with the filters currently selected.
+        """
+        chosen: list[dict[str, Any]] | MatchupTable = matching()
+        if isinstance(chosen, MatchupTable):
+            return  # only the counts of matchups are kept
+        show_opponents(
+            canvas.get_tk_widget(),
+            OpponentRanking(
+                count_opponents(
+                    chosen,
+                    replay_type_selection.value_selected,
+                    int(user_rank.val[0]),
+                    int(user_rank.val[1]),
+                    int(opponent_rank.val[0]),
+                    int(opponent_rank.val[1]),
+                    excluded_flags(match_filters),
+                )
+            ),
+        )
+
+    _ = user_rank.on_changed(lambda _: show(character.get(), False, False))
+    _ = opponent_rank.on_changed(lambda _: show(character.get(), False, False))
+    _ = replay_type_selection.on_clicked(lambda _: show(character.get(), False, False))
+    for match_filter in match_filters:
+        _ = match_filter.on_clicked(lambda _: show(character.get(), False, False))
+    filtered: tuple[Any, Any] = current_data()
+    draw(View.SCATTER, character.get(), filtered)
+    frames.add(
+        frame_key(character.get(), View.SCATTER),
+        canvas.copy_from_bbox(fig.bbox),
+        filtered,
+    )
+    commands: dict[str, Callable[..., None]] = {
+        "dropdown": lambda x: show(x, False, False, deferred=True),
+        "switch": lambda: show(character.get(), True, False, deferred=True),
+        "sort": lambda: show(character.get(), False, True, deferred=True),
+        "refresh": lambda: show(character.get(), False, False),
+        "prefetch": prefetch,
+        "opponents": opponents,
+        "query": set_query,
+        "sample": set_sample,
+    }
+    return canvas, commands
+
+
+def excluded_flags(match_filters: list[CheckButtons]) -> int:
+    """
+    Combines the match flags that are unchecked into one mask.
+    """
+    excluded: int = 0
+    for match_filter, labels in zip(match_filters, match_filter_labels):
+        for label, checked in zip(labels, match_filter.get_status()):
+            if not checked:
+                excluded |= match_flags[labels[label]]
+    return excluded
+
+
+sorted_views: dict[View, View] = {  # what Toggle Sorting switches between
+    View.MATCHUPS: View.MATCHUPS_SORTED,
+    View.MATCHUPS_SORTED: View.MATCHUPS,
+    View.AMOUNTS: View.AMOUNTS_SORTED,
+    View.AMOUNTS_SORTED: View.AMOUNTS,
+}
+
+
+def switched_view(view: View, sort: bool) -> View:
+    """
+    Returns the view Switch View goes to from the given view.
+    """
+    match view:
+        case View.SCATTER:
+            return View.MATCHUPS_SORTED if sort else View.MATCHUPS
+        case View.MATCHUPS:
+            return View.AMOUNTS
+        case View.MATCHUPS_SORTED:
+            return View.AMOUNTS_SORTED
+        case View.AMOUNTS | View.AMOUNTS_SORTED:
+            return View.PING
+        case View.PING:
+            return View.DURATIONS
+        case View.DURATIONS:
+            return View.HEATMAP
+        case View.HEATMAP:
+            return View.SCATTER
+
+
+def advance_view(
+    view: View, is_sorted: bool, switch: bool, sort: bool
+) -> tuple[View, bool]:
+    """
+    Returns the view and whether bar graphs are sorted after Switch View (switch)
+    or Toggle Sorting (sort) was clicked.
+    """
+    if switch:
+        return switched_view(view, is_sorted), is_sorted
+    if sort:
+        return sorted_views.get(view, view), not is_sorted
+    return view, is_sorted
+
+
+def draw_view(
+    view: View,
+    character: str,
+    data: dict[str, list[tuple[str, float, int]]],
+    ax: Axes,
+    canvas: FigureCanvasAgg,
+    histograms: dict[str, list[tuple[list[int], list[int], list[int]]]],
+) -> None:
+    match view:
+        case View.SCATTER:
+            scatter_plot(character, data, ax, canvas)
+        case View.MATCHUPS:
+            matchups_bar_graph(character, data, ax, canvas)
+        case View.MATCHUPS_SORTED:
+            matchups_bar_graph_sorted(character, data, ax, canvas)
+        case View.AMOUNTS:
+            no_of_matches_bar_graph(character, data, ax, canvas)
+        case View.AMOUNTS_SORTED:
+            no_of_matches_bar_graph_sorted(character, data, ax, canvas)
+        case View.PING:
+            ping_graph(character, data, ax, canvas, histograms)
+        case View.DURATIONS:
+            durations_graph(character, data, ax, canvas, histograms)
+        case View.HEATMAP:
+            heatmap_graph(character, data, ax, canvas)
+
+
+def jsonify_replays(replay_folder_path: str, root: Tk, name: str) -> None:
     """
     Makes JSONs out of replays.
     """
-    global corrupt_replays, one_folder_dump_status, character_array, metadata_dictionary
+    global corrupt_replays, one_folder_dump_status, json_format_selection, bundle_status
     if replay_folder_path == "":
         _ = messagebox.showerror(
             "Select Folder",
@@ -912,46 +2486,366 @@ def jsonify_replays(replay_folder_path: str, root: Tk, name: str) -> None:
             parent=root,
         )
         return
+    try:
+        write_jsons(
+            replay_folder_path,
+            name,
+            one_folder_dump_status.get() == 1,
+            json_format_selection.get(),
+            bundle_status.get() == 1,
+        )
+    except (BadZipFile, TarError, EOFError) as e:
+        _ = messagebox.showerror(
+            "Archive Error",
+            f"{replay_folder_path} could not be read: {e}",
+            parent=root,
+        )
+        return
+    if len(corrupt_replays) != 0 or len(known_corrupt_replays) != 0:
+        _ = messagebox.showwarning(
+            "Corrupt Replays",
+            corrupt_report("made into JSONs"),
+            parent=root,
+        )
+    if len(duplicate_replays) != 0:
+        _ = messagebox.showinfo(
+            "Duplicate Replays",
+            "The following replays are copies of other replays and have been skipped:\n"
+            + "\n".join(duplicate_replays)
+            + "\nThe rest of the replays have successfully been made into JSONs.",
+            parent=root,
+        )
+
+
+def write_jsons(
+    replay_folder_path: str,
+    name: str,
+    one_folder_dump: bool,
+    json_format: str = "Indented",
+    bundle: bool = False,
+) -> None:
+    """
+    Writes a JSON for every replay in a folder or archive, plus master.json,
+    in one of json_formats. With bundle, the replays are written into a few
+    shard files in the JSONs folder instead (see BundleWriter). Either way, what
+    was written the other way before is removed, so no replay is read twice.
+    """
+    extension: str = json_formats[json_format]
+    global corrupt_replays, character_array, metadata_dictionary
     slash: str = "\\" if system() == "Windows" else "/"
+    corrupt_replays.clear()
+    known_corrupt_replays.clear()
+    duplicate_replays.clear()
     if not path.exists(f"JSONs{slash}"):
         mkdir("JSONs")
     all_replays: list[dict[str, Any]] = []
     all_replays_partial: list[dict[str, Any]] = []
-    for file in glob(f"{replay_folder_path}{slash}**{slash}*.ggr", recursive=True):
+    if is_archive(replay_folder_path):
+        headers: Iterator[tuple[str, bytes]] = archive_headers(replay_folder_path)
+    else:
+        with stats.stage("directory scan"):
+            replay_files: list[str] = scan_folder(replay_folder_path)[0]
+        stats.count("files", len(replay_files))
+        headers = folder_headers(skip_quarantined(replay_files, replay_folder_path))
+    fingerprints: set[bytes] = set()
+    bundle_writer: BundleWriter | None = (
+        BundleWriter("JSONs", json_format) if bundle else None
+    )
+    if not bundle:  # its replays would be read along with the new JSONs
+        remove_bundle("JSONs")
+    folders: set[str] = set()
+    for file, header in unique_headers(
+        valid_headers(headers, partial(note_corrupt, replay_folder_path)),
+        fingerprints,
+        partial(note_duplicate, replay_folder_path),
+    ):
+        with stats.stage("header decode"):
+            data = parse_metadata(file, header)
+            data_partial = partial_parse_metadata(file, name, header)
+        subdirectory: str = file[len(replay_folder_path) + 1 : file.rfind(slash)]
+        json_path: str = (
+            f"JSONs{slash}{file[len(replay_folder_path) + 1:-4]}{extension}"
+            if not one_folder_dump
+            else f"JSONs{slash}{file[len(replay_folder_path) + len(subdirectory) + 1:-4]}{extension}"
+        )
+        if not is_inside(json_path, "JSONs"):  # never write outside of JSONs
+            corrupt_replays.append(file[len(replay_folder_path) + 1 :])
+            stats.count("corrupt replays")
+            continue
+        all_replays.append(data)
+        all_replays_partial.append(data_partial)
+        if bundle_writer is not None:
+            bundle_writer.add(file[len(replay_folder_path) + 1 :], data)
+            continue
+        if not one_folder_dump and subdirectory not in folders:
+            makedirs("JSONs" + slash + subdirectory, exist_ok=True)
+            folders.add(subdirectory)
+        with open_json(json_path, "w") as f:
+            dump_json(data, f, json_format)
+    if bundle_writer is not None:
+        bundle_writer.close()
+    with open_json(f"master{extension}", "w") as f:
+        dump_json(master_json(all_replays_partial, name), f, json_format)
+    save_quarantine()
+
+
+class BundleWriter:
+    """
+    Writes replays into a few append-only shard files instead of one file each.
+    Shards are JSON Lines, written in blocks of bundle_block_size replays, which
+    are compressed separately for the compressed formats. The index records the
+    shard, block offset, block length and line of every replay, so any replay
+    can be read without reading the rest of its shard.
+    """
+
+    def __init__(self, bundle_folder: str, json_format: str) -> None:
+        self.bundle_folder: str = bundle_folder
+        self.extension: str = bundle_extensions[
+            json_extensions.index(json_formats[json_format])
+        ]
+        self.compress: Callable[[bytes], bytes] | None = {
+            ".jsonl.gz": compress_gzip,
+            ".jsonl.xz": compress_lzma,
+        }.get(self.extension)
+        self.shards: list[str] = []
+        self.index: dict[str, list[int]] = {}
+        self.block: list[tuple[str, str]] = []
+        self.shard: IO[bytes] | None = None
+        remove_bundle(bundle_folder)
+        for kind, file in list(walk_folder(bundle_folder)):  # one JSON per replay
+            if kind == "json":
+                remove(file)
+
+    def add(self, replay: str, data: dict[str, Any]) -> None:
+        """
+        Adds a replay under its path relative to the replay folder.
+        """
+        self.block.append(
+            (replay, dumps(data, ensure_ascii=False, separators=(",", ":")))
+        )
+        if len(self.block) == bundle_block_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Appends the current block to the current shard, starting a new shard
+        once it is bundle_shard_size bytes long.
+        """
+        if len(self.block) == 0:
+            return
+        if self.shard is None or self.shard.tell() >= bundle_shard_size:
+            if self.shard is not None:
+                self.shard.close()
+            self.shards.append(f"replays-{len(self.shards):03}{self.extension}")
+            self.shard = open(path.join(self.bundle_folder, self.shards[-1]), "wb")
+        raw: bytes = "".join(f"{line}\n" for _, line in self.block).encode("utf-8")
+        if self.compress is not None:
+            raw = self.compress(raw)
+        offset: int = self.shard.tell()
+        _ = self.shard.write(raw)
+        for line, (replay, _) in enumerate(self.block):
+            self.index[replay] = [len(self.shards) - 1, offset, len(raw), line]
+        self.block.clear()
+
+    def close(self) -> None:
+        """
+        Writes the last block and the index.
+        """
+        self.flush()
+        if self.shard is not None:
+            self.shard.close()
+        with open(
+            path.join(self.bundle_folder, bundle_index_file), "w", encoding="utf-8"
+        ) as f:
+            dump({"shards": self.shards, "replays": self.index}, f, ensure_ascii=False)
+
+
+def remove_bundle(bundle_folder: str) -> None:
+    """
+    Removes the shards and index of an earlier bundle, if there is one.
+    """
+    for extension in bundle_extensions:
+        for old_shard in glob(path.join(bundle_folder, f"replays-*{extension}")):
+            remove(old_shard)
+    if path.isfile(path.join(bundle_folder, bundle_index_file)):
+        remove(path.join(bundle_folder, bundle_index_file))
+
+
+def load_bundles(bundle_files: list[str], user_name: str) -> Iterator[dict[str, Any]]:
+    """
+    Reads every replay of the given shards, one line at a time.
+    """
+    for bundle_file in bundle_files:
+        for file_dict in bundle_records([bundle_file]):
+            yield json_perspective(file_dict, user_name)
+        stats.count("files")
+        stats.count("bytes read", path.getsize(bundle_file))
+
+
+def dump_json(data: Any, f: IO[str], json_format: str) -> None:
+    """
+    Writes JSON indented for reading, or without any whitespace.
+    """
+    if json_format == "Indented":
+        dump(data, f, ensure_ascii=False, indent=4)
+    else:
+        dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+
+def load_quarantine() -> dict[str, list[int]]:
+    """
+    Loads the record of replays known to be corrupt.
+    """
+    global quarantine
+    if quarantine is None:
         try:
-            data = parse_metadata(file)
-            data_partial = partial_parse_metadata(file, name)
-        except ValueError as corrupt:
-            corrupt_replays.append(str(corrupt))
+            with open(quarantine_file, encoding="utf-8") as f:
+                quarantine = load(f)
+        except (OSError, ValueError):
+            quarantine = {}
+    return quarantine
+
+
+def save_quarantine() -> None:
+    """
+    Saves the record of replays known to be corrupt.
+    """
+    if quarantine is None:
+        return
+    with open(f"{quarantine_file}.tmp", "w", encoding="utf-8") as f:
+        dump(quarantine, f, ensure_ascii=False)
+    replace(f"{quarantine_file}.tmp", quarantine_file)
+
+
+def quarantine_replay(replay_file_path: str) -> None:
+    """
+    Records a corrupt replay, so it is skipped until it changes.
+    """
+    try:
+        status = stat(replay_file_path)
+    except OSError:
+        return
+    load_quarantine()[replay_file_path] = [status.st_size, status.st_mtime_ns]
+
+
+def skip_quarantined(
+    replay_files: Iterable[str], replay_folder_path: str
+) -> Iterator[str]:
+    """
+    Leaves out replays that are known to be corrupt and have not changed since,
+    adding them to known_corrupt_replays.
+    """
+    quarantined: dict[str, list[int]] = load_quarantine()
+    if len(quarantined) == 0:
+        yield from replay_files
+        return
+    for file in replay_files:
+        record: list[int] | None = quarantined.get(file)
+        if record is not None:
+            try:
+                status = stat(file)
+                unchanged: bool = record == [status.st_size, status.st_mtime_ns]
+            except OSError:
+                unchanged = False
+            if unchanged:
+                known_corrupt_replays.append(file[len(replay_folder_path) + 1 :])
+                stats.count("known corrupt replays")
+                continue
+            del quarantined[file]  # changed since, so it is read again
+        yield file
+
+
+def find_duplicates(replay_folder_path: str) -> list[list[str]]:
+    """
+    Groups the replays in a folder that are copies of each other.
+    """
+    groups: dict[bytes, list[str]] = {}
+    for file in scan_folder(replay_folder_path)[0]:
+        try:
+            header: bytes = read_header(file)
+        except ValueError:
             continue
-        else:
-            all_replays.append(data)
-            all_replays_partial.append(data_partial)
-            subdirectory: str = file[len(replay_folder_path) + 1 : file.rfind(slash)]
-            if one_folder_dump_status.get() == 0:
-                if not path.exists("JSONs" + slash + subdirectory + slash):
-                    mkdir("JSONs" + slash + subdirectory)
-                with open(
-                    f"JSONs{slash}{file[len(replay_folder_path) + 1:-4]}.json",
-                    "w",
-                    encoding="utf-8",
-                ) as f:
-                    dump(data, f, ensure_ascii=False, indent=4)
-            else:
-                with open(
-                    f"JSONs{slash}{file[len(replay_folder_path) + len(subdirectory) + 1:-4]}.json",
-                    "w",
-                    encoding="utf-8",
-                ) as f:
-                    dump(data, f, ensure_ascii=False, indent=4)
-    with open("master.json", "w") as f:
-        dump(master_json(all_replays_partial, name), f, ensure_ascii=False, indent=4)
-    if len(corrupt_replays) != 0:
-        _ = messagebox.showwarning(
-            "Corrupt Replays",
-            f"The following replays are corrupt:\n{'\n'.join(corrupt_replays)}\nThe non-corrupt replays have successfully been made into JSONs.",
+        groups.setdefault(replay_fingerprint(header), []).append(file)
+    duplicates: list[list[str]] = []
+    for files in groups.values():
+        if len(files) > 1:
+            copies: list[str] = [
+                file for file in files[1:] if not path.samefile(files[0], file)
+            ]  # copies that are already hard links take no extra space
+            if len(copies) != 0:
+                duplicates.append([files[0], *copies])
+    return duplicates
+
+
+def hardlink_duplicates(duplicates: list[list[str]]) -> int:
+    """
+    Replaces every copy of a replay with a hard link to the first one,
+    returning how many copies were replaced.
+    """
+    linked: int = 0
+    for original, *copies in duplicates:
+        for copy in copies:
+            try:
+                link(original, f"{copy}.tmp")
+                replace(f"{copy}.tmp", copy)
+            except OSError:  # e.g. a different drive, or no hard link support
+                continue
+            linked += 1
+    return linked
+
+
+def report_duplicates(replay_folder_path: str, root: Tk) -> None:
+    """
+    Lists duplicate replays, and optionally hard links them to free up space.
+    """
+    if replay_folder_path == "":
+        _ = messagebox.showerror(
+            "Select Folder",
+            "Please select a folder.",
+            parent=root,
+        )
+        return
+    duplicates: list[list[str]] = find_duplicates(replay_folder_path)
+    if len(duplicates) == 0:
+        _ = messagebox.showinfo(
+            "No Duplicate Replays",
+            "No duplicate replays could be found in the selected folder.",
             parent=root,
         )
+        return
+    with open("duplicates.txt", "w", encoding="utf-8") as f:
+        for files in duplicates:
+            _ = f.write("\n".join(files) + "\n\n")
+    copies: int = sum(len(files) - 1 for files in duplicates)
+    if messagebox.askyesno(
+        "Duplicate Replays",
+        f"{copies} replays are copies of other replays, the full list has been saved to duplicates.txt.\nWould you like to replace the copies with hard links to the original replays? This frees up their space while keeping every file where it is.",
+        parent=root,
+    ):
+        linked: int = hardlink_duplicates(duplicates)
+        _ = messagebox.showinfo(
+            "Duplicate Replays",
+            f"{linked} of {copies} copies have been replaced with hard links.",
+            parent=root,
+        )
+
+
+def corrupt_report(action: str) -> str:
+    """
+    Lists new and previously known corrupt replays.
+    """
+    report: str = ""
+    if len(corrupt_replays) != 0:
+        report += (
+            "The following replays are corrupt:\n" + "\n".join(corrupt_replays) + "\n"
+        )
+    if len(known_corrupt_replays) != 0:
+        report += (
+            "The following replays were already known to be corrupt and have been skipped:\n"
+            + "\n".join(known_corrupt_replays)
+            + "\n"
+        )
+    return report + f"The non-corrupt replays have successfully been {action}."
 
 
 def select_folder() -> None:
@@ -966,6 +2860,23 @@ def select_folder() -> None:
     )
 
 
+def select_archive() -> None:
+    """
+    Selects a .zip or .tar archive of replays instead of a folder.
+    """
+    global folder
+    archive: str = filedialog.askopenfilename(
+        title="Please select the archive with the replays.",
+        initialdir=folder,
+        filetypes=[
+            ("Replay archives", " ".join(f"*{e}" for e in archive_extensions)),
+            ("All files", "*"),
+        ],
+    )
+    if archive != "" and archive != ():
+        folder = archive
+
+
 def select_master_file(name: str, opponent: str, root: Tk) -> None:
     """
     Selects the master.json file.
@@ -973,7 +2884,7 @@ def select_master_file(name: str, opponent: str, root: Tk) -> None:
     global file
     file = filedialog.askopenfilename(
         title="Please select the master.json file.",
-        filetypes=[("master.json", "master.json")],
+        filetypes=[("master.json", [f"master{e}" for e in json_extensions])],
     )
     if file != "" and file != ():
         try:
@@ -996,293 +2907,852 @@ def master_json(all_replays: list[dict[str, Any]], username: str) -> dict[str, A
     return master
 
 
+def load_master(master_file_path: str) -> list[dict[str, Any]]:
+    """
+    Loads the replays of a master.json, filling in what older versions of the
+    app did not record.
+    """
+    with stats.stage("JSON load"):
+        master_replays: list[dict[str, Any]] = master_records(master_file_path)
+    for replay in master_replays:
+        if "flags" not in replay:  # made before flags were recorded
+            replay["flags"] = pack_flags(replay["online"])
+        if "ping" not in replay:  # or ping and match lengths
+            replay["ping"] = None
+            replay["duration"] = None
+        elif not replay["online"]:  # kept as 0 by older versions
+            replay["ping"] = None
+        if "date" not in replay:  # or dates
+            replay["date"] = None
+    stats.count("files")
+    return master_replays
+
+
 def parse_jsons(replay_file_path: str, user_name: str) -> dict[str, Any]:
     """
     Parses the replay metadata from the generated JSONs.
     """
-    parsedDict: dict[str, Any] = {
-        "userCharacter": "Sol",
-        "userRank": None,
-        "opponentName": None,
-        "opponentCharacter": "Sol",
-        "opponentRank": None,
-        "online": False,
-        "won": None,
-    }
-    with open(replay_file_path) as f:
+    with open_json(replay_file_path) as f:
         file_dict: dict[str, Any] = load(f)
-    player_1: bool = file_dict["player1"]["name"] == user_name
-    parsedDict["userCharacter"] = (
-        file_dict["player1"]["character"]
-        if player_1
-        else file_dict["player2"]["character"]
-    )
-    parsedDict["userRank"] = (
-        file_dict["player1"]["rank"] if player_1 else file_dict["player2"]["rank"]
-    )
-    parsedDict["opponentName"] = (
-        file_dict["player2"]["name"] if player_1 else file_dict["player1"]["name"]
-    )
-    parsedDict["opponentCharacter"] = (
-        file_dict["player2"]["character"]
-        if player_1
-        else file_dict["player1"]["character"]
+    stats.count("bytes read", path.getsize(replay_file_path))
+    return json_perspective(file_dict, user_name)
+
+
+def read_json_bytes(json_files: tuple[str, ...]) -> list[tuple[int, bytes]]:
+    """
+    Reads generated JSONs, decompressing them if needed, and returns their size
+    on disk along with their contents.
+    """
+    contents: list[tuple[int, bytes]] = []
+    for json_file in json_files:
+        with open(json_file, "rb") as f:
+            raw: bytes = f.read()
+        size: int = len(raw)
+        try:
+            if json_file.endswith(".gz"):
+                raw = decompress_gzip(raw)
+            elif json_file.endswith(".xz"):
+                raw = decompress_lzma(raw)
+        except (EOFError, LZMAError, OSError):  # damaged, reported as corrupt
+            raw = b""
+        contents.append((size, raw))
+    return contents
+
+
+def load_jsons(
+    json_files: Iterable[str], user_name: str, replay_folder_path: str
+) -> Iterator[dict[str, Any]]:
+    """
+    Loads generated JSONs in bulk. Batches of json_batch_size files are opened,
+    read and decompressed on json_threads threads, while the batches already
+    read are turned into the user's point of view, in order. Only a few batches
+    are read ahead, so the replays can be counted as they come without holding
+    every JSON in memory. master JSONs are skipped, since the JSONs next to them
+    take priority.
+    """
+    master_files: list[str] = [f"master{e}" for e in json_extensions]
+    for batch, contents in parallel_map(
+        lambda batch: (batch, read_json_bytes(batch)),
+        split_batches(
+            (file for file in json_files if path.basename(file) not in master_files),
+            json_batch_size,
+        ),
+        json_threads,
+    ):
+        yield from parse_json_batch(batch, contents, user_name, replay_folder_path)
+
+
+def parse_json_batch(
+    batch: tuple[str, ...],
+    contents: list[tuple[int, bytes]],
+    user_name: str,
+    replay_folder_path: str,
+) -> list[dict[str, Any]]:
+    """
+    Parses a batch of JSONs read by read_json_bytes.
+    """
+    stats.count("bytes read", sum(size for size, _ in contents))
+    try:  # one JSON array per batch is faster to parse than one per file
+        file_dicts: list[Any] = loads(
+            b"[" + b",".join(raw for _, raw in contents) + b"]"
+        )
+        if len(file_dicts) == len(batch):
+            return [json_perspective(file_dict, user_name) for file_dict in file_dicts]
+    except (KeyError, TypeError, ValueError):
+        pass  # a corrupt JSON in the batch, so every file is parsed alone
+    replays: list[dict[str, Any]] = []
+    for file, (_, raw) in zip(batch, contents):
+        try:
+            replays.append(json_perspective(loads(raw), user_name))
+        except (KeyError, TypeError, ValueError):
+            corrupt_replays.append(file[len(replay_folder_path) + 1 :])
+            stats.count("corrupt replays")
+    return replays
+
+
+def json_perspective(file_dict: dict[str, Any], user_name: str) -> dict[str, Any]:
+    """
+    Turns a generated JSON's replay into the user's point of view.
+    """
+    player1: dict[str, Any] = file_dict["player1"]
+    player2: dict[str, Any] = file_dict["player2"]
+    player_1: bool = player1["name"] == user_name
+    user, opponent = (player1, player2) if player_1 else (player2, player1)
+    winner: str | None = file_dict["winner"]
+    return {
+        "userCharacter": user["character"],
+        "userRank": user["rank"],
+        "opponentName": opponent["name"],
+        "opponentCharacter": opponent["character"],
+        "opponentRank": opponent["rank"],
+        "online": player2["name"] is not None,
+        "won": None
+        if winner is None
+        else winner == ("player1" if player_1 else "player2"),
+        "flags": pack_flags(
+            online=player2["name"] is not None,
+            EXchars=file_dict["EXchars"],
+            team=file_dict["team"],
+            accentCore=file_dict["accentCore"],
+            unfinished=file_dict["unfinished"],
+            disconnect=file_dict["disconnect"],
+            desync=file_dict["desync"],
+        ),
+        "ping": file_dict["ping"] if player2["name"] is not None else None,
+        "duration": file_dict["duration"],
+        "date": file_dict["date"][:10],  # without the time
+    }
+
+
+def read_header(replay_file_path: str) -> bytes:
+    """
+    Reads the metadata header of a replay.
+    """
+    global folder
+    with open(replay_file_path, "rb") as replay:
+        header: bytes = replay.read(header_size)
+    stats.count("bytes read", len(header))
+    check_header(header, replay_file_path[len(folder) + 1 :])
+    return header
+
+
+def check_header(header: bytes, replay_name: str) -> None:
+    """
+    Raises ValueError(replay_name) if a header is not a complete +R header.
+    """
+    if not is_replay_header(header):  # the correct, complete header
+        raise ValueError(replay_name)
+
+
+def folder_files(replay_folder_path: str, kind: str) -> Iterator[str]:
+    """
+    Yields the files of a kind found by walk_folder, counting them as they are
+    found, so a folder can be read without listing it first.
+    """
+    for file_kind, file in walk_folder(replay_folder_path):
+        if file_kind == kind:
+            stats.count("files")
+            yield file
+
+
+def folder_headers(replay_files: Iterable[str]) -> Iterator[tuple[str, bytes]]:
+    """
+    Yields the path and the first header_size bytes of every replay file, read
+    on header_threads threads.
+    """
+    for file, header in read_headers(replay_files, header_size, header_threads):
+        stats.count("bytes read", len(header))
+        yield file, header
+
+
+def archive_headers(archive_path: str) -> Iterator[tuple[str, bytes]]:
+    """
+    Yields the path and the first header_size bytes of every replay in an archive,
+    without extracting anything.
+    """
+    for file, header in read_archive_headers(archive_path):
+        stats.count("files")
+        stats.count("bytes read", len(header))
+        yield file, header
+
+
+class FolderWatcher:
+    """
+    Finds replays added to a folder after it was analyzed. A folder's modification
+    time changes whenever a file is added to it, so only folders whose modification
+    time changed are listed again, and a check costs one stat per folder. Without
+    the analyzed replay files (in low memory mode), the folder is walked by walk,
+    and replays changed since their folder was last listed are the new ones, so
+    only the paths of replays changed while their folder was listed are kept.
+    """
+
+    def __init__(self, replay_folder_path: str, replay_files: list[str] | None) -> None:
+        self.replay_folder_path: str = replay_folder_path
+        self.known: set[str] = set() if replay_files is None else set(replay_files)
+        self.by_time: bool = replay_files is None
+        # folder: (mtime, when it was listed, less timestamp_slack, subfolders), in
+        # ns, filled in by walk or the first check
+        self.folders: dict[str, tuple[int, int, list[str]]] = {}
+        # new replays that are still being written: checks they were read in
+        self.pending: dict[str, int] = {}
+
+    def walk(self) -> Iterator[str]:
+        """
+        Yields every replay in the folder and its subfolders, counting them as
+        they are found, and records when each folder was listed for the checks.
+        """
+        stack: list[str] = [self.replay_folder_path]
+        while len(stack) != 0:
+            current: str = stack.pop()
+            listed_at: int = time_ns() - timestamp_slack
+            try:
+                mtime: int = stat(current).st_mtime_ns
+            except OSError:
+                continue
+            listed: tuple[list[str], list[DirEntry[str]]] | None = list_folder(current)
+            if listed is None:
+                continue
+            for entry in listed[1]:
+                changed: int | None = changed_at(entry)
+                if changed is not None and changed >= listed_at:  # would look new
+                    self.known.add(entry.path)
+                stats.count("files")
+                yield entry.path
+            self.folders[current] = (mtime, listed_at, listed[0])
+            stack.extend(reversed(listed[0]))
+
+    def poll(self) -> list[tuple[str, bytes]]:
+        """
+        Returns the path and header of every replay added since the last check.
+        """
+        folders: dict[str, tuple[int, int, list[str]]] = {}
+        stack: list[str] = [self.replay_folder_path]
+        while len(stack) != 0:
+            current: str = stack.pop()
+            listed_at: int = time_ns() - timestamp_slack
+            try:
+                mtime: int = stat(current).st_mtime_ns
+            except OSError:
+                continue
+            listing: tuple[int, int, list[str]] | None = self.folders.get(current)
+            if listing is None or listing[0] != mtime:
+                listed = list_folder(current)
+                if listed is None:
+                    continue
+                for entry in listed[1]:
+                    if self.is_new_replay(
+                        entry, None if listing is None else listing[1]
+                    ):
+                        self.pending[entry.path] = 0
+                listing = (mtime, listed_at, listed[0])
+            folders[current] = listing
+            stack.extend(listing[2])
+        self.folders = folders
+        new_replays: list[tuple[str, bytes]] = []
+        for file in sorted(self.pending):
+            try:
+                with open(file, "rb") as replay:
+                    header: bytes = replay.read(header_size)
+            except FileNotFoundError:  # removed or renamed since it was found
+                del self.pending[file]
+                continue
+            except OSError:  # locked, by the game or something else
+                header = b""
+            stats.count("bytes read", len(header))
+            self.pending[file] += 1
+            # the game may still be writing it, so it is read again on the next check,
+            # until it has been cut short for watch_retries checks and counts as corrupt
+            if (
+                len(header) < header_size
+                and header[:12] == magic[: len(header)]
+                and self.pending[file] < watch_retries
+            ):
+                continue
+            del self.pending[file]
+            self.known.add(file)
+            new_replays.append((file, header))
+        return new_replays
+
+    def is_new_replay(self, entry: DirEntry[str], listed_at: int | None) -> bool:
+        """
+        Checks if a replay was added since its folder was last listed (at listed_at).
+        """
+        if entry.path in self.known or entry.path in self.pending:
+            return False
+        if not self.by_time or listed_at is None:
+            return True
+        changed: int | None = changed_at(entry)
+        return changed is not None and changed >= listed_at
+
+
+def changed_at(entry: DirEntry[str]) -> int | None:
+    """
+    Returns when a file was last written, copied or moved, in ns, or None if it
+    is gone. A copy keeps its modification time, but not its change time.
+    """
+    try:
+        status = entry.stat()
+    except OSError:
+        return None
+    return max(status.st_mtime_ns, status.st_ctime_ns)
+
+
+def list_folder(folder: str) -> tuple[list[str], list[DirEntry[str]]] | None:
+    """
+    Lists the subfolders and replays (.ggr in any case) of a folder, leaving
+    out hidden ones. Returns None if the folder cannot be listed.
+    """
+    subfolders: list[str] = []
+    replay_files: list[DirEntry[str]] = []
+    try:
+        with scandir(folder) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):  # hidden, as with glob
+                    continue
+                if entry.is_dir():
+                    subfolders.append(entry.path)
+                elif entry.name.lower().endswith(".ggr"):
+                    replay_files.append(entry)
+    except OSError:
+        return None
+    return subfolders, replay_files
+
+
+def ingest_headers(
+    headers: Iterable[tuple[str, bytes]],
+    replay_folder_path: str,
+    name: str,
+    fingerprints: set[bytes] | None,
+    replays: list[dict[str, Any]] | MatchupTable,
+) -> None:
+    """
+    Parses replay headers into replays, skipping corrupt replays and copies of
+    replays that were already seen (unless fingerprints is None).
+    """
+    replays.extend(decode_replays(headers, replay_folder_path, name, fingerprints))
+
+
+def decode_replays(
+    headers: Iterable[tuple[str, bytes]],
+    replay_folder_path: str,
+    name: str,
+    fingerprints: set[bytes] | None,
+) -> Iterator[dict[str, Any]]:
+    """
+    Yields the replay of every header, from the user's point of view, skipping
+    corrupt replays and, unless fingerprints is None, copies of replays that
+    were already seen.
+    """
+    headers = valid_headers(headers, partial(note_corrupt, replay_folder_path))
+    if fingerprints is not None:
+        headers = unique_headers(
+            headers, fingerprints, partial(note_duplicate, replay_folder_path)
+        )
+    for file, header in headers:
+        yield partial_parse_metadata(file, name, header)
+
+
+def note_corrupt(replay_folder_path: str, file: str) -> None:
+    """
+    Records a corrupt replay for the warning and the quarantine.
+    """
+    corrupt_replays.append(file[len(replay_folder_path) + 1 :])
+    quarantine_replay(file)
+    stats.count("corrupt replays")
+
+
+def note_duplicate(replay_folder_path: str, file: str) -> None:
+    """
+    Records a copy of a replay that was already read, for the warning.
+    """
+    duplicate_replays.append(file[len(replay_folder_path) + 1 :])
+    stats.count("duplicate replays")
+
+
+def watch_folder(
+    analysis: Toplevel,
+    watching: IntVar,
+    watcher: FolderWatcher,
+    add_replays: Callable[[list[tuple[str, bytes]]], None],
+) -> None:
+    """
+    Checks a watched folder for new replays while the analysis window is open.
+    """
+    if not analysis.winfo_exists():
+        return
+    try:
+        if watching.get():
+            with stats.stage("folder watch"):
+                new_replays: list[tuple[str, bytes]] = watcher.poll()
+            if len(new_replays) != 0:
+                add_replays(new_replays)
+    finally:  # an error is reported by Tk, and the folder is still watched
+        _ = analysis.after(
+            watch_interval, watch_folder, analysis, watching, watcher, add_replays
+        )
+
+
+def prefetch_frames(
+    analysis: Toplevel,
+    prefetch: Callable[[list[str]], None],
+    characters: list[str],
+) -> None:
+    """
+    Draws the graphs the user is likely to look at next into the frame cache
+    while the analysis window is open and nothing else is happening.
+    """
+    if not analysis.winfo_exists():
+        return
+    prefetch(characters)
+    _ = analysis.after(
+        prefetch_interval, prefetch_frames, analysis, prefetch, characters
     )
-    parsedDict["opponentRank"] = (
-        file_dict["player2"]["rank"] if player_1 else file_dict["player1"]["rank"]
+
+
+def continue_reading(
+    analysis: Toplevel,
+    batches: Iterator[tuple[list[dict[str, Any]], int]],
+    total: int,
+    refined: int,
+    pending: list[dict[str, Any]],
+    refine: Callable[[list[dict[str, Any]], tuple[int, int] | None], None],
+    finish: Callable[[], None],
+) -> None:
+    """
+    Reads the next step of a progressive analysis, letting Tk handle events
+    before the one after. Once as many files again as when the graph was last
+    refined have been read (at most progressive_batch_size), the replays read
+    since are passed to refine with the new sample, and once every replay has
+    been read, with None, as the graph is exact.
+    """
+    if not analysis.winfo_exists():
+        return
+    with stats.stage("progressive batch"):
+        batch: tuple[list[dict[str, Any]], int] | None = next(batches, None)
+    if batch is None:
+        refine(pending, None)
+        finish()
+        return
+    added, read = batch
+    pending.extend(added)
+    if read - refined >= min(refined, progressive_batch_size):
+        refine(pending, (read, total))
+        pending = []
+        refined = read
+    _ = analysis.after(
+        1, continue_reading, analysis, batches, total, refined, pending, refine, finish
     )
-    parsedDict["online"] = file_dict["player2"]["name"] is not None
-    parsedDict["won"] = (
-        None
-        if file_dict["winner"] is None
-        else (file_dict["winner"] == "player1" and player_1)
-        or (file_dict["winner"] == "player2" and not player_1)
+
+
+def add_watched_replays(
+    new_replays: list[tuple[str, bytes]],
+    replays: list[dict[str, Any]] | MatchupTable,
+    replay_folder_path: str,
+    name: str,
+    opponent_name: str,
+    fingerprints: set[bytes] | None,
+    character: StringVar,
+    character_array_copy: list[str],
+    dropdown: OptionMenu,
+    commands: dict[str, Callable[..., None]],
+) -> None:
+    """
+    Adds replays found by the folder watcher to an open analysis.
+    """
+    added: list[dict[str, Any]] = []
+    ingest_headers(new_replays, replay_folder_path, name, fingerprints, added)
+    save_quarantine()
+    if len(added) == 0:
+        return
+    stats.count("watched replays", len(added))
+    add_replays(
+        added,
+        replays,
+        opponent_name,
+        character,
+        character_array_copy,
+        dropdown,
+        commands,
     )
-    return parsedDict
 
 
-def partial_parse_metadata(replay_file_path: str, user_name: str) -> dict[str, Any]:
+def add_replays(
+    added: list[dict[str, Any]],
+    replays: list[dict[str, Any]] | MatchupTable,
+    opponent_name: str,
+    character: StringVar,
+    character_array_copy: list[str],
+    dropdown: OptionMenu,
+    commands: dict[str, Callable[..., None]],
+) -> None:
     """
-    Parses only the important replay metadata.
+    Adds replays to an open analysis, along with any new characters to its
+    dropdown, and redraws it.
+    """
+    if opponent_name != "":
+        added = [replay for replay in added if replay["opponentName"] == opponent_name]
+    replays.extend(added)
+    if any(replay["userCharacter"] not in character_array_copy for replay in added):
+        played: set[str] = {replay["userCharacter"] for replay in added}
+        character_array_copy[:] = [
+            char
+            for char in character_array
+            if char in played or char in character_array_copy
+        ]
+        menu = dropdown["menu"]
+        menu.delete(0, "end")
+        for char in character_array_copy:
+            menu.add_command(
+                label=char,
+                command=lambda char=char: (
+                    character.set(char),
+                    commands["dropdown"](char),
+                ),
+            )
+    commands["refresh"]()
+
+
+def read_in_batches(
+    replay_files: list[str],
+    json_files: list[str],
+    replay_folder_path: str,
+    name: str,
+    fingerprints: set[bytes],
+) -> Iterator[tuple[list[dict[str, Any]], int]]:
+    """
+    Reads replays and JSONs in a random order, so that every batch is a random
+    sample of them. The first batch is progressive_sample files and the rest
+    progressive_step files, so that reading one never holds up Tk for long.
+    Yields the replays of each batch and how many files have been read so far.
     """
-    global folder, character_array, metadata_dictionary
+    files: list[tuple[str, bool]] = [(file, False) for file in replay_files] + [
+        (file, True) for file in json_files
+    ]
+    shuffle(files)
+    read: int = 0
+    size: int = progressive_sample
+    while read < len(files):
+        batch: list[tuple[str, bool]] = files[read : read + size]
+        added: list[dict[str, Any]] = []
+        ingest_headers(
+            folder_headers([file for file, is_json in batch if not is_json]),
+            replay_folder_path,
+            name,
+            fingerprints,
+            added,
+        )
+        added.extend(
+            load_jsons(
+                [file for file, is_json in batch if is_json], name, replay_folder_path
+            )
+        )
+        read += len(batch)
+        size = progressive_step
+        yield added, read
+    save_quarantine()
 
-    parsedDict: dict[str, Any] = {
-        "userCharacter": "Sol",
-        "userRank": None,
-        "opponentName": None,
-        "opponentCharacter": "Sol",
-        "opponentRank": None,
-        "online": False,
-        "won": None,
+
+def partial_parse_metadata(
+    replay_file_path: str, user_name: str, header: bytes | None = None
+) -> dict[str, Any]:
+    """
+    Parses only the important replay metadata.
+    """
+    (
+        year,
+        month,
+        day,
+        p1_name,
+        p2_name,
+        p1_char,
+        p2_char,
+        ex_chars,
+        single_or_team,
+        r_or_ac,
+        bitmask,
+        ping,
+        duration,
+        p1_rank,
+        p2_rank,
+        winner,
+    ) = compile_plan(
+        (
+            "year",
+            "month",
+            "day",
+            "p1 name",
+            "p2 name",
+            "p1 char",
+            "p2 char",
+            "ex chars?",
+            "single or team",
+            "+R or AC",
+            "unfinished match, disconnect, desync bitmask",
+            "ping",
+            "match duration in frames",
+            "p1 rank",
+            "p2 rank",
+            "winner side",
+        )
+    ).decode(read_header(replay_file_path) if header is None else header)
+    player_1: bool = p1_name == user_name
+    opponent_name: str | None = (
+        None if p2_name == "" else p2_name if player_1 else p1_name
+    )
+    online: bool = opponent_name is not None
+    return {
+        "userCharacter": p1_char if player_1 else p2_char,
+        "userRank": (p1_rank if player_1 else p2_rank) if online else None,
+        "opponentName": opponent_name,
+        "opponentCharacter": p2_char if player_1 else p1_char,
+        "opponentRank": (p2_rank if player_1 else p1_rank) if online else None,
+        "online": online,
+        "won": None
+        if winner == 3
+        else (winner == 1 and player_1) or (winner == 2 and not player_1),
+        "flags": pack_flags(
+            online=online,
+            EXchars=ex_chars == 1,
+            team=single_or_team == 2,
+            accentCore=r_or_ac == 1,
+            unfinished=bitmask % 2 == 1,
+            disconnect=bitmask in [2, 3, 6, 7],
+            desync=bitmask >= 4,
+        ),
+        "ping": ping if online else None,
+        "duration": duration / 60,
+        "date": f"{year:02}-{month:02}-{day:02}",
     }
-    replay: BufferedReader = open(replay_file_path, "rb")
-    _ = replay.seek(0, 0)
-    if (
-        replay.read(12) != b"\x47\x47\x52\x02\x51\xad\xee\x77\x45\xd7\x48\xcd"
-    ):  # Check if .ggr file has the correct header (GGR[\x02]Q[\xAD]îwE×HÍ)
-        raise ValueError(replay_file_path[len(folder) + 1 :])
-    player_1: bool = False
-    for label, data in metadata_dictionary.items():
-        _ = replay.seek(data[0], 0)
-        if data[1] == 256:
-            number: int = 0
-        else:
-            number = int.from_bytes((replay.read(int(data[1] / 8))), "little")
-        match label:
-            case "p1 rank":
-                if parsedDict["opponentName"] is None:  # check if the match was offline
-                    if player_1:
-                        parsedDict["userRank"] = None
-                    else:
-                        parsedDict["opponentRank"] = None
-                else:
-                    if player_1:
-                        parsedDict["userRank"] = number
-                    else:
-                        parsedDict["opponentRank"] = number
-            case "p2 rank":
-                if parsedDict["opponentName"] is None:
-                    if player_1:
-                        parsedDict["opponentRank"] = None
-                    else:
-                        parsedDict["userRank"] = None
-                else:
-                    if player_1:
-                        parsedDict["opponentRank"] = number
-                    else:
-                        parsedDict["userRank"] = number
-            case "winner side":
-                if number == 3:
-                    parsedDict["won"] = None
-                else:
-                    parsedDict["won"] = (number == 1 and player_1) or (
-                        number == 2 and not player_1
-                    )
-            case "p1 name":
-                try:
-                    temp = replay.read(32).decode()
-                except UnicodeDecodeError:
-                    _ = replay.seek(-32, 1)
-                    temp = replay.read(32).decode("utf-16")
-                finally:
-                    name = temp.replace("\x00", "", -1)
-                    player_1 = name == user_name
-                    if not player_1:
-                        parsedDict["opponentName"] = name
-            case "p2 name":
-                try:
-                    temp = replay.read(32).decode()
-                except UnicodeDecodeError:
-                    _ = replay.seek(-32, 1)
-                    temp = replay.read(32).decode("utf-16")
-                finally:
-                    name = temp.replace("\x00", "", -1)
-                    if name == "":
-                        parsedDict["opponentName"] = None
-                    elif player_1:
-                        parsedDict["opponentName"] = name
-            case "p1 char":
-                if player_1:
-                    parsedDict["userCharacter"] = character_array[number - 1]
-                else:
-                    parsedDict["opponentCharacter"] = character_array[number - 1]
-            case "p2 char":
-                if player_1:
-                    parsedDict["opponentCharacter"] = character_array[number - 1]
-                else:
-                    parsedDict["userCharacter"] = character_array[number - 1]
-            case _:
-                continue
-    replay.close()
-    parsedDict["online"] = parsedDict["opponentName"] is not None
-    return parsedDict
+
+
+def pack_flags(online: bool, **flags: bool) -> int:
+    """
+    Packs a replay's match flags into the bits of match_flags.
+    """
+    packed: int = match_flags["online" if online else "offline"]
+    for flag, value in flags.items():
+        if value:
+            packed |= match_flags[flag]
+    return packed
 
 
 def parse_metadata(
     replay_file_path: str,
+    header: bytes | None = None,
 ) -> dict[str, Any]:
     """
     Parses the replay metadata into a readable format.
     """
-    global folder, character_array, metadata_dictionary
-
-    parsed_dict: dict[str, Any] = {
-        "date": "",
+    (
+        year,
+        month,
+        day,
+        hour,
+        minute,
+        second,
+        p1_steam_id,
+        p2_steam_id,
+        p1_name,
+        p2_name,
+        p1_char,
+        p2_char,
+        ex_chars,
+        single_or_team,
+        r_or_ac,
+        timezone_bias,
+        p1_rounds,
+        p2_rounds,
+        bitmask,
+        ping,
+        duration,
+        p1_score,
+        p2_score,
+        p1_rank,
+        p2_rank,
+        winner,
+    ) = compile_plan(tuple(metadata_dictionary)).decode(
+        read_header(replay_file_path) if header is None else header
+    )
+    date: str = f"{year:02}-{month:02}-{day:02}T{hour:02}:{minute:02}:{second:02}"
+    time_offset: int = int(int(timezone_bias) / -60)
+    if time_offset == 0:
+        date += "Z"
+    elif time_offset > 0:
+        date += f"+{(int(time_offset/60)):02}:{(time_offset%60):02}"
+    else:
+        date += f"{(int(time_offset/60)):03}:{((-1*time_offset)%60):02}"
+    offline: bool = p2_steam_id == 0
+    return {
+        "date": date,
         "player1": {
-            "steamID": None,
-            "name": "",
-            "character": "",
-            "rounds": 0,
-            "score": 0,
-            "rank": None,
+            "steamID": p1_steam_id,
+            "name": p1_name,
+            "character": p1_char,
+            "rounds": p1_rounds,
+            "score": p1_score,
+            "rank": None if offline else p1_rank,
         },
         "player2": {
-            "steamID": None,
-            "name": None,
-            "character": "",
-            "rounds": 0,
-            "score": 0,
-            "rank": None,
+            "steamID": None if offline else p2_steam_id,
+            "name": None if offline else p2_name,
+            "character": p2_char,
+            "rounds": p2_rounds,
+            "score": p2_score,
+            "rank": None if offline else p2_rank,
         },
-        "EXchars": False,
-        "team": False,
-        "accentCore": False,
-        "unfinished": False,
-        "disconnect": False,
-        "desync": False,
-        "ping": 0,
-        "duration": 0.0,
-        "winner": "",
+        "EXchars": ex_chars == 1,
+        "team": single_or_team == 2,
+        "accentCore": r_or_ac == 1,
+        "unfinished": bitmask % 2 == 1,
+        "disconnect": bitmask in [2, 3, 6, 7],
+        "desync": bitmask >= 4,
+        "ping": None if offline else ping,
+        "duration": duration / 60,
+        "winner": "player1" if winner == 1 else "player2" if winner == 2 else None,
     }
-    replay: BufferedReader = open(replay_file_path, "rb")
-    date: str = ""
-    _ = replay.seek(0, 0)
-    if (
-        replay.read(12) != b"\x47\x47\x52\x02\x51\xad\xee\x77\x45\xd7\x48\xcd"
-    ):  # Check if .ggr file has the correct header (GGR[\x02]Q[\xAD]îwE×HÍ)
-        raise ValueError(replay_file_path[len(folder) + 1 :])
-    for label, data in metadata_dictionary.items():
-        _ = replay.seek(data[0], 0)
-        if data[1] == 256:
-            number: int = 0
-        else:
-            number = int.from_bytes((replay.read(int(data[1] / 8))), "little")
-        match label:
-            case "year" | "month":
-                date += f"{number:02}-"
-            case "day":
-                date += f"{number:02}T"
-            case "hour" | "minute":
-                date += f"{number:02}:"
-            case "second":
-                date += f"{number:02}"
-            case "recording location timezone bias against GMT":
-                time_offset: int = int(int(number) / -60)
-                if time_offset == 0:
-                    date += "Z"
-                elif time_offset > 0:
-                    date += f"+{(int(time_offset/60)):02}:{(time_offset%60):02}"
-                else:
-                    date += f"{(int(time_offset/60)):03}:{((-1*time_offset)%60):02}"
-                parsed_dict["date"] = date
-            case "p1 rank":
-                if (
-                    parsed_dict["player2"]["name"] is None
-                ):  # check if the match was offline
-                    parsed_dict["player1"]["rank"] = None
-                else:
-                    parsed_dict["player1"]["rank"] = number
-            case "p2 rank":
-                if (
-                    parsed_dict["player2"]["name"] is None
-                ):  # same as above, both should be player 2
-                    parsed_dict["player2"]["rank"] = None
-                else:
-                    parsed_dict["player2"]["rank"] = number
-            case "ex chars?":
-                parsed_dict["EXchars"] = number == 1
-            case "single or team":
-                parsed_dict["team"] = number == 2
-            case "+R or AC":
-                parsed_dict["accentCore"] = number == 1
-            case "ping":
-                parsed_dict["ping"] = number
-            case "match duration in frames":
-                parsed_dict["duration"] = number / 60
-            case "p1 rounds":
-                parsed_dict["player1"]["rounds"] = number
-            case "p2 rounds":
-                parsed_dict["player2"]["rounds"] = number
-            case "p1 score":
-                parsed_dict["player1"]["score"] = number
-            case "p2 score":
-                parsed_dict["player2"]["score"] = number
-            case "winner side":
-                if number == 1:
-                    parsed_dict["winner"] = "player1"
-                elif number == 2:
-                    parsed_dict["winner"] = "player2"
-                else:
-                    parsed_dict["winner"] = None
-            case "p1 steam id":
-                parsed_dict["player1"]["steamID"] = number
-            case "p2 steam id":
-                if number == 0:
-                    parsed_dict["player2"]["steamID"] = None
-                else:
-                    parsed_dict["player2"]["steamID"] = number
-            case "p1 name":
-                try:
-                    temp = replay.read(32).decode()
-                except UnicodeDecodeError:
-                    _ = replay.seek(-32, 1)
-                    temp = replay.read(32).decode("utf-16")
-                finally:
-                    parsed_dict["player1"]["name"] = temp.replace("\x00", "", -1)
-            case "p2 name":
-                if parsed_dict["player2"]["steamID"] is None:
-                    parsed_dict["player2"]["name"] = None
-                else:
-                    try:
-                        temp = replay.read(32).decode()
-                    except UnicodeDecodeError:
-                        _ = replay.seek(-32, 1)
-                        temp = replay.read(32).decode("utf-16")
-                    finally:
-                        parsed_dict["player2"]["name"] = temp.replace("\x00", "", -1)
-            case "unfinished match, disconnect, desync bitmask":
-                parsed_dict["unfinished"] = number % 2 == 1
-                parsed_dict["disconnect"] = number in [2, 3, 6, 7]
-                parsed_dict["desync"] = number >= 4
-            case "p1 char":
-                parsed_dict["player1"]["character"] = character_array[number - 1]
-            case "p2 char":
-                parsed_dict["player2"]["character"] = character_array[number - 1]
-            case _:
-                continue
-    replay.close()
-    return parsed_dict
+
+
+def stream_replays(replay_path: str, name: str) -> Iterator[dict[str, Any]]:
+    """
+    Yields the replays of a folder, archive, master.json or bundle index
+    (replays.index) one at a time, without any windows, skipping corrupt and
+    duplicate replays like the analysis window does. An archive that cannot be
+    read is skipped from where it breaks, with a warning on stderr.
+    """
+    fingerprints: set[bytes] = set()
+    if Path(replay_path).is_dir():
+        replay_path = path.normpath(replay_path)
+        with stats.stage("directory scan"):
+            replay_files, json_files, bundle_files = scan_folder(replay_path)
+        stats.count("files", len(replay_files) + len(json_files))
+        yield from decode_replays(
+            folder_headers(skip_quarantined(replay_files, replay_path)),
+            replay_path,
+            name,
+            fingerprints,
+        )
+        save_quarantine()
+        yield from load_jsons(json_files, name, replay_path)
+        yield from load_bundles(bundle_files, name)
+    elif is_archive(replay_path):
+        try:
+            yield from decode_replays(
+                archive_headers(replay_path), replay_path, name, fingerprints
+            )
+        except (BadZipFile, TarError, EOFError) as e:
+            print(
+                f"Skipped the rest of {replay_path}, which is broken: {e}",
+                file=stderr,
+            )
+        save_quarantine()
+    elif path.basename(replay_path) == bundle_index_file:
+        for _, file_dict in index_records(path.dirname(replay_path)):
+            yield json_perspective(file_dict, name)
+    else:
+        yield from load_master(replay_path)
+
+
+def print_analysis(
+    replay_path: str, name: str, query: str, output: str | None = None
+) -> None:
+    """
+    Prints the win rate and number of matches of every matchup, optionally only
+    counting the replays matching a query, and saves the replays counted to
+    output as CSV (.csv) or JSON Lines (.jsonl, .jsonl.gz or .jsonl.xz). Raises
+    ValueError if the query is not valid.
+    """
+    matches: Callable[[dict[str, Any]], bool] | None = (
+        compile_query(query) if query != "" else None
+    )
+    with stats.stage("read replays"):
+        replays: list[dict[str, Any]] = list(
+            stream_replays(replay_path, name)
+            if matches is None
+            else filter(matches, stream_replays(replay_path, name))
+        )
+    if output is not None:
+        with stats.stage("save replays"):
+            if output.lower().endswith(".csv"):
+                _ = write_csv(replays, output, record_fields)
+            else:
+                _ = write_json_lines(replays, output)
+    data: dict[str, list[tuple[str, float, int]]] = filter_replays(
+        replays, character_array, name, "", "Both Online and Offline"
+    )
+    print(f"{len(replays)} replays")
+    for char in character_array:
+        played: list[tuple[str, float, int]] = [
+            matchup for matchup in data[char] if matchup[2] != 0
+        ]
+        if len(played) == 0:
+            continue
+        print(f"\n{char} ({sum(games for _, _, games in played)} matches)")
+        for opponent_char, win_rate, games in played:
+            print(
+                f"  vs {opponent_char:<10} {win_rate:4.1f}:{10 - win_rate:<4.1f} {games:>6} Matches"
+            )
+
+
+def parse_arguments() -> Namespace:
+    """
+    Parses the command line options, which default to environment variables.
+    """
+    parser: ArgumentParser = ArgumentParser(description="Analyzes +R replays.")
+    _ = parser.add_argument(
+        "--stats",
+        action="store_true",
+        default=environ.get("GGR_STATS", "0") != "0",
+        help="time the analysis stages and show the timings in the analysis window (GGR_STATS=1)",
+    )
+    _ = parser.add_argument(
+        "--stats-json",
+        default=environ.get("GGR_STATS_JSON"),
+        help="write the timings to this file on exit, implies --stats (GGR_STATS_JSON)",
+    )
+    _ = parser.add_argument(
+        "--replays",
+        help="print the matchups of this folder, archive or master.json without opening any windows",
+    )
+    _ = parser.add_argument(
+        "--user",
+        default="",
+        help="your username, for --replays",
+    )
+    _ = parser.add_argument(
+        "--query",
+        default="",
+        help='only count replays matching this filter, for --replays (e.g. "online and opp_rank >= 10")',
+    )
+    _ = parser.add_argument(
+        "--output",
+        help="save the replays counted to this .csv or .jsonl(.gz/.xz) file, for --replays",
+    )
+    _ = parser.add_argument(
+        "--profile",
+        default=environ.get("GGR_PROFILE"),
+        help="profile the whole run with cProfile and write a .prof file here (GGR_PROFILE)",
+    )
+    return parser.parse_args()
 
 
 def main() -> None:
@@ -1293,10 +3763,26 @@ def main() -> None:
         folder, \
         sliders, \
         one_folder_dump_status, \
+        json_format_selection, \
+        bundle_status, \
+        streaming_status, \
+        progressive_status, \
         opponent, \
         file, \
         metadata_dictionary, \
         character_array
+    arguments: Namespace = parse_arguments()
+    stats.enabled = arguments.stats or arguments.stats_json is not None
+    if arguments.replays is not None:
+        try:
+            print_analysis(
+                arguments.replays, arguments.user, arguments.query, arguments.output
+            )
+        except ValueError as e:
+            raise SystemExit(f"Invalid filter: {e}") from None
+        if arguments.stats_json is not None:
+            stats.dump(arguments.stats_json)
+        return
     root: Tk = Tk()
     root.title("GGXXACPR Replay Analyzer")
     root.resizable(False, False)
@@ -1310,10 +3796,14 @@ def main() -> None:
     opponent_text.grid(row=1, column=0, sticky="we")
     opponent = Entry(root)
     opponent.grid(row=1, column=1, sticky="we", padx=(0, 15), pady=(15, 0))
-    folder_text: Label = Label(root, text="Please select a folder.")
+    folder_text: Label = Label(
+        root, text="Please select a folder\nor a .zip/.tar archive."
+    )
     folder_text.grid(row=2, column=0, sticky="we")
     folder_button: Button = Button(root, text="Select Folder", command=select_folder)
     folder_button.grid(row=2, column=1, sticky="we", padx=(0, 15), pady=(15, 0))
+    archive_button: Button = Button(root, text="Select Archive", command=select_archive)
+    archive_button.grid(row=3, column=1, sticky="we", padx=(0, 15), pady=(5, 0))
     one_folder_dump_status = IntVar()
     one_folder_dump: Checkbutton = Checkbutton(
         root,
@@ -1322,9 +3812,41 @@ def main() -> None:
         onvalue=1,
         offvalue=0,
     )
-    one_folder_dump.grid(row=3, column=0, columnspan=2, pady=15)
+    one_folder_dump.grid(row=4, column=0, pady=15)
+    json_format_selection = StringVar(root, "Indented")
+    json_format_menu: OptionMenu = OptionMenu(
+        root, json_format_selection, *json_formats
+    )
+    json_format_menu.grid(row=4, column=1, sticky="we", padx=(0, 15), pady=15)
+    bundle_status = IntVar()
+    bundle: Checkbutton = Checkbutton(
+        root,
+        text="Bundle JSONs into a few large files",
+        variable=bundle_status,
+        onvalue=1,
+        offvalue=0,
+    )
+    bundle.grid(row=5, column=0, columnspan=2, pady=(0, 15))
+    streaming_status = IntVar()
+    streaming: Checkbutton = Checkbutton(
+        root,
+        text="Low memory analysis (for very large folders and archives)",
+        variable=streaming_status,
+        onvalue=1,
+        offvalue=0,
+    )
+    streaming.grid(row=6, column=0, columnspan=2, pady=(0, 15))
+    progressive_status = IntVar()
+    progressive: Checkbutton = Checkbutton(
+        root,
+        text="Show estimates while reading (for very large folders)",
+        variable=progressive_status,
+        onvalue=1,
+        offvalue=0,
+    )
+    progressive.grid(row=7, column=0, columnspan=2, pady=(0, 15))
     button_frame: Frame = Frame(root)
-    button_frame.grid(row=4, column=0, columnspan=2)
+    button_frame.grid(row=8, column=0, columnspan=2)
     jsonify_button: Button = Button(
         button_frame,
         text="JSON-ify Replays",
@@ -1334,7 +3856,14 @@ def main() -> None:
     analyze_button: Button = Button(
         button_frame,
         text="Analyze Replays",
-        command=lambda: analyze_replays(folder, username.get(), opponent.get(), root),
+        command=lambda: analyze_replays(
+            folder,
+            username.get(),
+            opponent.get(),
+            root,
+            streaming_status.get() == 1,
+            progressive_status.get() == 1,
+        ),
     )
     analyze_button.grid(row=0, column=1, padx=(20, 20), pady=(0, 10))
     analyze_master_button: Button = Button(
@@ -1343,8 +3872,25 @@ def main() -> None:
         command=lambda: select_master_file(username.get(), opponent.get(), root),
     )
     analyze_master_button.grid(row=0, column=2, padx=(20, 20), pady=(0, 10))
+    duplicates_button: Button = Button(
+        button_frame,
+        text="Find Duplicates",
+        command=lambda: report_duplicates(folder, root),
+    )
+    duplicates_button.grid(row=0, column=3, padx=(20, 20), pady=(0, 10))
     root.protocol("WM_DELETE_WINDOW", exit)
-    root.mainloop()
+    profiler: Profile | None = None
+    if arguments.profile is not None:
+        profiler = Profile()
+        profiler.enable()
+    try:
+        root.mainloop()
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(arguments.profile)
+        if arguments.stats_json is not None:
+            stats.dump(arguments.stats_json)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,162 @@
+"""
+Decodes the metadata header of +R replays, shared by the app and the CLI scripts.
+
+Callers ask for the fields they need with compile_plan, which works out the
+smallest span of the header covering them and a single struct format to unpack
+it, skipping the bytes in between. HeaderPlan.decode then returns the fields as
+a tuple, in the order they were asked for, with names decoded and characters
+turned into their names.
+"""
+
+from collections.abc import Callable
+from functools import cache, lru_cache
+from re import Pattern, compile
+from struct import Struct
+from sys import intern
+from typing import Any
+
+metadata_dictionary: dict[str, tuple[int, int]] = {
+    "year": (0x1A, 16),
+    "month": (0x1C, 8),
+    "day": (0x1D, 8),
+    "hour": (0x1E, 8),
+    "minute": (0x1F, 8),
+    "second": (0x20, 8),
+    "p1 steam id": (0x22, 64),
+    "p2 steam id": (0x2A, 64),
+    "p1 name": (0x32, 256),
+    "p2 name": (0x52, 256),
+    "p1 char": (0x72, 8),
+    "p2 char": (0x73, 8),
+    "ex chars?": (0x74, 8),
+    "single or team": (0x75, 8),
+    "+R or AC": (0x76, 8),
+    "recording location timezone bias against GMT": (0x77, 32),
+    "p1 rounds": (0x7B, 8),
+    "p2 rounds": (0x7C, 8),
+    "unfinished match, disconnect, desync bitmask": (0x7D, 8),
+    "ping": (0x7E, 8),
+    "match duration in frames": (0x7F, 32),
+    "p1 score": (0x83, 8),
+    "p2 score": (0x84, 8),
+    "p1 rank": (0x85, 8),
+    "p2 rank": (0x86, 8),
+    "winner side": (0x87, 8),
+}
+
+header_size: int = 0x88
+
+# GGR[\x02]Q[\xAD]îwE×HÍ
+magic: bytes = b"\x47\x47\x52\x02\x51\xad\xee\x77\x45\xd7\x48\xcd"
+
+# (1-25, SO KY MA MI AX PO CH ED BA FA TE JA AN JO VE DI SL IN ZA BR RO AB OS KL JU)
+character_array: list[str] = [
+    "Sol",
+    "Ky",
+    "May",
+    "Millia",
+    "Axl",
+    "Potemkin",
+    "Chipp",
+    "Eddie",
+    "Baiken",
+    "Faust",
+    "Testament",
+    "Jam",
+    "Anji",
+    "Johnny",
+    "Venom",
+    "Dizzy",
+    "Slayer",
+    "I-No",
+    "Zappa",
+    "Bridget",
+    "Robo-Ky",
+    "A.B.A",
+    "Order Sol",
+    "Kliff",
+    "Justice",
+]
+
+struct_codes: dict[int, str] = {8: "B", 16: "H", 32: "I", 64: "Q", 256: "32s"}
+
+
+# valid UTF-8 never decodes to these with surrogateescape, invalid bytes always do
+invalid_utf8: Pattern[str] = compile("[\udc80-\udcff]")
+
+
+@lru_cache(maxsize=1 << 16)
+def decode_name(raw: bytes) -> str:
+    """
+    Decodes a 32-byte name field, which is UTF-8 or, failing that, UTF-16.
+    The same names show up in replay after replay, so they are only decoded once
+    and every copy is the same interned string.
+    """
+    if raw.isascii():
+        name: str = raw.decode("ascii")
+    else:
+        name = raw.decode("utf-8", "surrogateescape")
+        if invalid_utf8.search(name) is not None:
+            name = raw.decode("utf-16")
+    return intern(name.replace("\x00", ""))
+
+
+def decode_character(number: int) -> str:
+    """
+    Turns a character number (1-25) into the character's name.
+    """
+    return character_array[number - 1]
+
+
+converters: dict[str, Callable[[Any], Any]] = {
+    "p1 name": decode_name,
+    "p2 name": decode_name,
+    "p1 char": decode_character,
+    "p2 char": decode_character,
+}
+
+
+class HeaderPlan:
+    """
+    A precompiled way to read a set of fields out of a replay header.
+    """
+
+    def __init__(self, fields: tuple[str, ...]) -> None:
+        self.fields: tuple[str, ...] = fields
+        by_offset: list[str] = sorted(
+            set(fields), key=lambda label: metadata_dictionary[label][0]
+        )
+        self.start: int = metadata_dictionary[by_offset[0]][0]
+        position: int = self.start
+        struct_format: str = "<"
+        for label in by_offset:
+            offset, bits = metadata_dictionary[label]
+            if offset > position:
+                struct_format += f"{offset - position}x"
+            struct_format += struct_codes[bits]
+            position = offset + bits // 8
+        self.struct: Struct = Struct(struct_format)
+        self.size: int = position  # bytes that have to be read from the file
+        self.order: tuple[int, ...] = tuple(by_offset.index(label) for label in fields)
+        self.converters: tuple[Callable[[Any], Any] | None, ...] = tuple(
+            converters.get(label) for label in fields
+        )
+
+    def decode(self, header: bytes) -> tuple[Any, ...]:
+        """
+        Returns the fields of the plan, in the order they were asked for.
+        Raises struct.error if the header is too short.
+        """
+        values: tuple[Any, ...] = self.struct.unpack_from(header, self.start)
+        return tuple(
+            values[i] if convert is None else convert(values[i])
+            for i, convert in zip(self.order, self.converters)
+        )
+
+
+@cache
+def compile_plan(fields: tuple[str, ...]) -> HeaderPlan:
+    """
+    Returns the plan for reading the given fields, only compiling it once.
+    """
+    return HeaderPlan(fields)
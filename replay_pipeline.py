@@ -0,0 +1,469 @@
+"""
+Streams replays from wherever they are kept to whatever is made of them, shared
+by the app, the CLI scripts and the benchmarks.
+
+A pipeline is a chain of generators, so replays are handled one at a time and
+never all held in memory unless a stage collects them:
+
+    sources     walk_folder, scan_folder, read_headers, archive_headers,
+                master_records, bundle_records, index_records
+    decoders    decode_headers (or any function mapped over the replays, such
+                as the app's partial_parse_metadata)
+    filters     valid_headers, unique_headers (or any predicate)
+    aggregators tally
+    sinks       write_csv, write_json_lines, apply_moves
+
+Sources yield (path, header) pairs or the dicts of generated JSONs. Slow stages
+that wait on the disk can run on threads with parallel_map, which keeps the
+replays in order and only reads a few batches ahead.
+"""
+
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from csv import DictWriter
+from gzip import decompress as decompress_gzip
+from gzip import open as open_gzip
+from hashlib import blake2b
+from itertools import chain, islice
+from json import dumps, load, loads
+from lzma import decompress as decompress_lzma
+from lzma import open as open_lzma
+from ntpath import splitdrive
+from os import DirEntry, makedirs, path, scandir, sep
+from posixpath import normpath
+from shutil import move
+from struct import error as struct_error
+from tarfile import open as open_tar
+from typing import IO, Any, TypeAlias, TypeVar
+from zipfile import ZipFile, is_zipfile
+
+from replay_header import HeaderPlan, header_size, magic
+
+json_extensions: tuple[str, ...] = (".json", ".json.gz", ".json.xz")
+bundle_extensions: tuple[str, ...] = (".jsonl", ".jsonl.gz", ".jsonl.xz")
+bundle_index_file: str = "replays.index"
+archive_extensions: tuple[str, ...] = (
+    ".zip",
+    ".tar",
+    ".tar.gz",
+    ".tgz",
+    ".tar.bz2",
+    ".tbz2",
+    ".tar.xz",
+    ".txz",
+)
+read_batch_size: int = 256  # files read by a thread in one go
+
+Header: TypeAlias = tuple[str, bytes]  # where a replay is, and the start of it
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def batches(items: Iterable[T], size: int) -> Iterator[tuple[T, ...]]:
+    """
+    Splits items into tuples of size items, the last one possibly shorter.
+    """
+    iterator: Iterator[T] = iter(items)
+    while batch := tuple(islice(iterator, size)):
+        yield batch
+
+
+def parallel_map(
+    function: Callable[[T], R], items: Iterable[T], threads: int
+) -> Iterator[R]:
+    """
+    Maps a function over items on a pool of threads, yielding the results in
+    order. Only a few items are worked on ahead of the one being yielded, so
+    the results can be used as they come. With one thread, nothing is started.
+    """
+    if threads <= 1:
+        yield from map(function, items)
+        return
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        working: deque[Future[R]] = deque()
+        for item in items:
+            working.append(executor.submit(function, item))
+            if len(working) > threads:
+                yield working.popleft().result()
+        while len(working) != 0:
+            yield working.popleft().result()
+
+
+def walk_folder(folder: str) -> Iterator[tuple[str, str]]:
+    """
+    Yields the kind ("replay", "json" or "bundle") and path of every replay,
+    generated JSON and bundle shard in a folder and its subfolders, as they are
+    found. Hidden files and folders are left out, and files come before the
+    subfolders next to them.
+    """
+    folders: list[str] = [folder]
+    while len(folders) != 0:
+        subfolders: list[str] = []
+        try:
+            with scandir(folders.pop()) as entries:
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    if is_folder(entry):
+                        subfolders.append(entry.path)
+                        continue
+                    name: str = entry.name.lower()
+                    if name.endswith(".ggr"):
+                        yield "replay", entry.path
+                    elif name.endswith(json_extensions):
+                        yield "json", entry.path
+                    elif name.startswith("replays-") and name.endswith(
+                        bundle_extensions
+                    ):
+                        yield "bundle", entry.path
+        except OSError:
+            continue
+        folders.extend(reversed(subfolders))
+
+
+def scan_folder(folder: str) -> tuple[list[str], list[str], list[str]]:
+    """
+    Lists the replays, generated JSONs and bundle shards found by walk_folder.
+    """
+    files: dict[str, list[str]] = {"replay": [], "json": [], "bundle": []}
+    for kind, file in walk_folder(folder):
+        files[kind].append(file)
+    return files["replay"], files["json"], files["bundle"]
+
+
+def is_folder(entry: DirEntry[str]) -> bool:
+    """
+    Checks if a folder entry is a folder, or a link to one.
+    """
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+
+def is_archive(replay_path: str) -> bool:
+    """
+    Checks if a path is a .zip or .tar(.gz/.bz2/.xz) archive of replays.
+    """
+    return path.isfile(replay_path) and replay_path.lower().endswith(archive_extensions)
+
+
+def read_header_batch(replay_files: tuple[str, ...], size: int) -> list[Header]:
+    """
+    Reads the first size bytes of a batch of replays.
+    """
+    headers: list[Header] = []
+    for file in replay_files:
+        with open(file, "rb") as replay:
+            headers.append((file, replay.read(size)))
+    return headers
+
+
+def read_headers(
+    replay_files: Iterable[str], size: int = header_size, threads: int = 1
+) -> Iterator[Header]:
+    """
+    Yields the path and the first size bytes of every replay file, reading
+    batches of read_batch_size files on threads if there is more than one.
+    """
+    if threads <= 1:
+        for file in replay_files:
+            with open(file, "rb") as replay:
+                yield file, replay.read(size)
+        return
+    yield from chain.from_iterable(
+        parallel_map(
+            lambda batch: read_header_batch(batch, size),
+            batches(replay_files, read_batch_size),
+            threads,
+        )
+    )
+
+
+def member_path(archive_path: str, name: str) -> str | None:
+    """
+    Returns the path of an archive member, which is the archive's path followed
+    by the member's normalized name. Returns None if the name is absolute or
+    climbs out of the archive (such as ../x.ggr), so that nothing made from
+    the member can end up outside the folder it is written to.
+    """
+    normalized: str = normpath(name.replace("\\", "/"))
+    if (
+        normalized.startswith(("/", "../"))
+        or normalized in ("", ".", "..")
+        or splitdrive(normalized)[0] != ""
+    ):
+        return None
+    return f"{archive_path}{sep}{normalized.replace('/', sep)}"
+
+
+def is_inside(file_path: str, folder: str) -> bool:
+    """
+    Checks if a path is inside a folder once it is resolved.
+    """
+    folder = path.abspath(folder)
+    try:
+        return path.commonpath([folder, path.abspath(file_path)]) == folder
+    except ValueError:  # on another drive
+        return False
+
+
+def archive_headers(archive_path: str, size: int = header_size) -> Iterator[Header]:
+    """
+    Yields the path and the first size bytes of every replay in an archive,
+    without extracting anything. Paths are made by member_path, and members
+    with absolute names or names leaving the archive are skipped.
+    """
+    if is_zipfile(archive_path):
+        with ZipFile(archive_path) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(".ggr"):
+                    continue
+                file: str | None = member_path(archive_path, info.filename)
+                if file is None:
+                    continue
+                with archive.open(info) as replay:
+                    header: bytes = replay.read(size)
+                yield file, header
+    else:
+        # stream mode reads compressed tars front to back, without seeking
+        with open_tar(archive_path, "r|*") as archive:
+            for member in archive:
+                if not member.isfile() or not member.name.lower().endswith(".ggr"):
+                    continue
+                file = member_path(archive_path, member.name)
+                if file is None:
+                    continue
+                replay = archive.extractfile(member)
+                header = b"" if replay is None else replay.read(size)
+                yield file, header
+
+
+def open_json(file_path: str, mode: str = "r") -> IO[str]:
+    """
+    Opens a JSON file as UTF-8 text, compressing or decompressing .json.gz and
+    .json.xz files on the fly.
+    """
+    if file_path.endswith(".gz"):
+        return open_gzip(file_path, f"{mode}t", encoding="utf-8")
+    if file_path.endswith(".xz"):
+        return open_lzma(file_path, f"{mode}t", encoding="utf-8")
+    return open(file_path, mode, encoding="utf-8")
+
+
+def master_records(master_file_path: str) -> list[dict[str, Any]]:
+    """
+    Loads the replays of a master.json, as they were written.
+    """
+    with open_json(master_file_path) as f:
+        return load(f)["data"]
+
+
+def bundle_records(bundle_files: Iterable[str]) -> Iterator[dict[str, Any]]:
+    """
+    Yields every replay of the given shards, one line at a time.
+    """
+    for bundle_file in bundle_files:
+        with open_json(bundle_file) as f:
+            for line in f:
+                yield loads(line)
+
+
+def load_bundle_index(bundle_folder: str) -> dict[str, Any]:
+    """
+    Loads the index of a bundle.
+    """
+    with open(path.join(bundle_folder, bundle_index_file), encoding="utf-8") as f:
+        return load(f)
+
+
+def read_block(
+    bundle_folder: str, shard_file: str, offset: int, length: int
+) -> list[str]:
+    """
+    Reads one block of a shard, decompressing it if needed, and returns its lines.
+    """
+    with open(path.join(bundle_folder, shard_file), "rb") as f:
+        _ = f.seek(offset)
+        raw: bytes = f.read(length)
+    if shard_file.endswith(".gz"):
+        raw = decompress_gzip(raw)
+    elif shard_file.endswith(".xz"):
+        raw = decompress_lzma(raw)
+    return raw.decode("utf-8").split("\n")
+
+
+def read_bundled_replay(
+    bundle_folder: str, index: dict[str, Any], replay: str
+) -> dict[str, Any]:
+    """
+    Reads one replay out of a bundle, only reading and decompressing its block.
+    """
+    shard, offset, length, line = index["replays"][replay]
+    return loads(
+        read_block(bundle_folder, index["shards"][shard], offset, length)[line]
+    )
+
+
+def index_records(
+    bundle_folder: str, replays: Iterable[str] | None = None
+) -> Iterator[tuple[str, dict[str, Any]]]:
+    """
+    Yields the path and data of the given replays of a bundle, or of every
+    replay in it, in the order they are stored. Every block holding any of them
+    is read and decompressed once, however many of its replays are asked for.
+    Raises KeyError if a replay is not in the bundle.
+    """
+    index: dict[str, Any] = load_bundle_index(bundle_folder)
+    blocks: dict[tuple[int, int, int], list[tuple[str, int]]] = {}
+    for replay in index["replays"] if replays is None else replays:
+        shard, offset, length, line = index["replays"][replay]
+        blocks.setdefault((shard, offset, length), []).append((replay, line))
+    for (shard, offset, length), wanted in sorted(blocks.items()):
+        lines: list[str] = read_block(
+            bundle_folder, index["shards"][shard], offset, length
+        )
+        for replay, line in wanted:
+            yield replay, loads(lines[line])
+
+
+def is_replay_header(header: bytes, size: int = header_size) -> bool:
+    """
+    Checks if a header starts like a +R replay and is at least size bytes long.
+    """
+    return header[:12] == magic and len(header) >= size
+
+
+def valid_headers(
+    headers: Iterable[Header],
+    corrupt: Callable[[str], None] | None = None,
+    size: int = header_size,
+) -> Iterator[Header]:
+    """
+    Leaves out replays without a complete +R header, passing their paths to
+    corrupt.
+    """
+    for file, header in headers:
+        if is_replay_header(header, size):
+            yield file, header
+        elif corrupt is not None:
+            corrupt(file)
+
+
+def replay_fingerprint(header: bytes) -> bytes:
+    """
+    Identifies a match by its header, which is the same in every copy of a replay.
+    """
+    return blake2b(header, digest_size=16).digest()
+
+
+def unique_headers(
+    headers: Iterable[Header],
+    fingerprints: set[bytes],
+    duplicate: Callable[[str], None] | None = None,
+) -> Iterator[Header]:
+    """
+    Leaves out copies of replays that were already seen, passing their paths
+    to duplicate. fingerprints is kept between calls by the caller, so replays
+    read later (e.g. from a watched folder) are checked against earlier ones.
+    """
+    for file, header in headers:
+        fingerprint: bytes = replay_fingerprint(header)
+        if fingerprint in fingerprints:
+            if duplicate is not None:
+                duplicate(file)
+            continue
+        fingerprints.add(fingerprint)
+        yield file, header
+
+
+def decode_headers(
+    headers: Iterable[Header],
+    plan: HeaderPlan,
+    corrupt: Callable[[str], None] | None = None,
+) -> Iterator[tuple[str, dict[str, Any]]]:
+    """
+    Decodes the fields of a plan out of every header, as a dict of field: value.
+    Replays that are not +R replays or are too short are passed to corrupt.
+    """
+    for file, header in headers:
+        if not is_replay_header(header, plan.size):
+            if corrupt is not None:
+                corrupt(file)
+            continue
+        try:
+            values: tuple[Any, ...] = plan.decode(header)
+        except (struct_error, IndexError):  # characters out of range
+            if corrupt is not None:
+                corrupt(file)
+            continue
+        yield file, dict(zip(plan.fields, values))
+
+
+def tally(
+    records: Iterable[T], key: Callable[[T], Any], won: Callable[[T], bool]
+) -> dict[Any, list[int]]:
+    """
+    Counts [wins, games] for every key, e.g. every matchup.
+    """
+    counts: dict[Any, list[int]] = {}
+    for record in records:
+        counted: Any = key(record)
+        count: list[int] | None = counts.get(counted)
+        if count is None:
+            count = counts[counted] = [0, 0]
+        if won(record):
+            count[0] += 1
+        count[1] += 1
+    return counts
+
+
+def write_csv(
+    records: Iterable[dict[str, Any]], file_path: str, fields: Iterable[str]
+) -> int:
+    """
+    Writes the given fields of every record as a CSV file, and returns how many
+    records were written. Missing values are left empty.
+    """
+    written: int = 0
+    with open(file_path, "w", encoding="utf-8", newline="") as f:
+        writer: DictWriter[str] = DictWriter(
+            f, fieldnames=list(fields), extrasaction="ignore"
+        )
+        writer.writeheader()
+        for record in records:
+            writer.writerow(record)
+            written += 1
+    return written
+
+
+def write_json_lines(records: Iterable[dict[str, Any]], file_path: str) -> int:
+    """
+    Writes every record as one line of JSON, compressed if the file ends in .gz
+    or .xz, and returns how many records were written.
+    """
+    written: int = 0
+    with open_json(file_path, "w") as f:
+        for record in records:
+            _ = f.write(dumps(record, ensure_ascii=False, separators=(",", ":")))
+            _ = f.write("\n")
+            written += 1
+    return written
+
+
+def apply_moves(
+    moves: list[tuple[str, str]], journal_path: str, threads: int = 1
+) -> None:
+    """
+    Moves files from the first path of every pair to the second. The journal is
+    written before anything moves, so an interrupted run can be undone, and
+    every destination folder is only created once.
+    """
+    with open(journal_path, "w", encoding="utf-8") as journal:
+        for source, destination in moves:
+            _ = journal.write(f"{source}\t{destination}\n")
+    for folder in {path.dirname(destination) for _, destination in moves}:
+        makedirs(folder, exist_ok=True)
+    for _ in parallel_map(lambda pair: move(*pair), moves, threads):
+        pass
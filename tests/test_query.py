@@ -0,0 +1,51 @@
+"""
+Checks filters against replays read from synthetic headers.
+"""
+
+from os import path
+from random import Random
+from sys import path as sys_path
+
+root: str = path.dirname(path.dirname(path.abspath(__file__)))
+sys_path.insert(0, root)
+sys_path.insert(0, path.join(root, "benchmarks"))
+
+from generate_replays import USER_NAME, make_header, make_opponents  # noqa: E402
+from replay_analyzer import (  # noqa: E402
+    compile_query,
+    json_perspective,
+    parse_metadata,
+    partial_parse_metadata,
+)
+
+
+def headers(online: bool) -> list[bytes]:
+    """
+    Makes a few random headers of online or offline matches.
+    """
+    rng: Random = Random(1)
+    opponents: list[tuple[int, bytes]] = make_opponents(rng, 10)
+    found: list[bytes] = []
+    while len(found) < 5:
+        header: bytes = make_header(rng, opponents)
+        if partial_parse_metadata("test.ggr", USER_NAME, header)["online"] == online:
+            found.append(header)
+    return found
+
+
+def test_offline_ping_never_matches() -> None:
+    for header in headers(online=False):
+        for replay in (
+            partial_parse_metadata("test.ggr", USER_NAME, header),
+            json_perspective(parse_metadata("test.ggr", header), USER_NAME),
+        ):
+            assert replay["ping"] is None
+            assert not compile_query("ping < 80")(replay)
+            assert not compile_query("ping >= 80")(replay)
+            assert compile_query("ping < 80 or offline")(replay)
+
+
+def test_online_ping_matches() -> None:
+    for header in headers(online=True):
+        replay = partial_parse_metadata("test.ggr", USER_NAME, header)
+        assert compile_query("ping < 80")(replay) == (replay["ping"] < 80)